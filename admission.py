@@ -0,0 +1,118 @@
+"""
+Admission control для дорогих операций бота.
+
+    TokenBucket       - ведро токенов на пользователя (сколько запросов подряд
+                        и как быстро восстанавливается лимит)
+    ConcurrencyLimit  - общий предел одновременно выполняемых тяжёлых операций
+    SingleFlight      - одинаковые операции в работе выполняются один раз,
+                        остальные ждут тот же результат (и видят ETA)
+
+Всё рассчитано на один event loop: блокировок нет, состояние меняется
+только между await.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class Overloaded(Exception):
+    """Нет свободного места для тяжёлой операции за отведённое ожидание."""
+
+
+class TokenBucket:
+    """
+    Ведро на ключ (id пользователя): capacity токенов, пополняется со
+    скоростью rate токенов в секунду. Ключей не больше max_keys - давно
+    не обращавшиеся вытесняются (их ведро к тому времени и так полное).
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[Hashable, Tuple[float, float]]' = OrderedDict()
+
+    def take(self, key: Hashable, cost: float = 1.0) -> float:
+        """Списывает cost токенов. 0.0 - допущено, иначе через сколько секунд их хватит."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit:
+    """
+    Не больше limit операций одновременно. Ждать места можно не дольше
+    wait секунд, дальше - Overloaded: лучше быстро отказать, чем копить очередь.
+
+        async with HEAVY_SLOTS:
+            ...
+    """
+
+    def __init__(self, limit: int, wait: float = 2.0):
+        self.limit = limit
+        self.wait = wait
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self) -> None:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait)
+        except asyncio.TimeoutError:
+            raise Overloaded(f"{self.limit} heavy operations already running") from None
+
+    async def __aexit__(self, *exc) -> None:
+        self._semaphore.release()
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых операций: пока операция с ключом выполняется,
+    run() возвращает ту же задачу. Длительность последнего выполнения
+    запоминается (для max_keys последних ключей) - из неё оценивается,
+    сколько осталось ждать.
+    """
+
+    def __init__(self, max_keys: int = 256):
+        self.max_keys = max_keys
+        self._running: Dict[Hashable, Tuple[asyncio.Future, float]] = {}
+        self._durations: 'OrderedDict[Hashable, float]' = OrderedDict()
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._running
+
+    def eta(self, key: Hashable) -> Optional[float]:
+        """Секунд до конца выполняющейся операции (по прошлому разу) или None."""
+        if key not in self._running or key not in self._durations:
+            return None
+        _, started = self._running[key]
+        return max(self._durations[key] - (time.monotonic() - started), 0.0)
+
+    def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Future, bool]:
+        """
+        (задача, запущена ли она этим вызовом). Ожидающие оборачивают
+        задачу в asyncio.shield, чтобы отмена одного не отменяла остальных.
+        """
+        if key in self._running:
+            return self._running[key][0], False
+        task = asyncio.ensure_future(factory())
+        self._running[key] = (task, time.monotonic())
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task, True
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        _, started = self._running.pop(key)
+        if not task.cancelled() and task.exception() is None:
+            self._durations[key] = time.monotonic() - started
+            self._durations.move_to_end(key)
+            while len(self._durations) > self.max_keys:
+                self._durations.popitem(last=False)
@@ -0,0 +1,272 @@
+"""
+Локальный HTTP API только для чтения поверх rentals.db (JSON).
+
+    GET /rentals?district=&rooms=&min_price=&max_price=&keyword=
+                &near=lat,lon&radius_km=&bbox=a,b,c,d&limit=&after=
+    GET /rentals/<id>
+    GET /stats?scope=all|district|rooms&key=
+
+Фильтры - как в search_rentals_advanced. Пагинация keyset: в ответе
+"next" - непрозрачный курсор для параметра after. ETag выводится из
+опубликованного поколения снапшота и версии данных: пока они не
+изменились, запрос с If-None-Match получает 304 без выполнения поиска.
+Ответы больше GZIP_MIN_BYTES сжимаются, если клиент принимает gzip.
+
+Запуск: python api.py (API_HOST, API_PORT, API_POOL_SIZE из окружения).
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import asdict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import database
+from export import EXPORT_COLUMNS
+from geo import distance_km
+from models import RENTAL_COLUMNS, Rental
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+API_HOST = os.environ.get('API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('API_PORT', '8080'))
+API_POOL_SIZE = int(os.environ.get('API_POOL_SIZE', '4'))
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+GZIP_MIN_BYTES = 1024
+
+_RENTAL_PATH_RE = re.compile(r'^/rentals/(\d+)$')
+
+
+class ApiError(Exception):
+    """Ошибка запроса: отдаётся клиенту как {"error": ...} с кодом status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    Общий пул соединений SQLite только для чтения (mode=ro) на все потоки
+    сервера: соединение не открывается на каждый запрос, WAL-файл БД не
+    пересоздаётся. Соединения создаются лениво, не больше size.
+    """
+
+    def __init__(self, db_path: Path, size: int = API_POOL_SIZE):
+        self.db_path = db_path
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.create_function('geo_distance', 4, distance_km, deterministic=True)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        self._slots.get()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+            self._slots.put(None)
+
+
+def encode_cursor(sort_key, rental_id: int) -> str:
+    raw = json.dumps([sort_key, rental_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple:
+    try:
+        sort_key, rental_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "invalid cursor") from e
+    return sort_key, int(rental_id)
+
+
+def _floats(value: str, count: int, name: str) -> Tuple[float, ...]:
+    try:
+        numbers = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        numbers = ()
+    if len(numbers) != count:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name}: expected {count} comma-separated numbers")
+    return numbers
+
+
+def parse_filters(params: Dict[str, str]) -> Dict:
+    """Параметры запроса -> filters для search_rentals_advanced."""
+    filters = {}
+    try:
+        for name in ('min_price', 'max_price'):
+            if name in params:
+                filters[name] = int(params[name])
+        if 'radius_km' in params:
+            filters['radius_km'] = float(params['radius_km'])
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"invalid number: {e}") from e
+    for name in ('district', 'rooms', 'keyword'):
+        if params.get(name):
+            filters[name] = params[name]
+    if 'near' in params:
+        filters['near'] = _floats(params['near'], 2, 'near')
+    if 'bbox' in params:
+        filters['bbox'] = _floats(params['bbox'], 4, 'bbox')
+    return filters
+
+
+class RentalsApi:
+    """Обработчики эндпоинтов: (путь, параметры) -> JSON-совместимый dict."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def etag(self) -> str:
+        with self.pool.connection() as conn:
+            meta = dict(conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('published_generation', 'snapshot_version')"
+            ).fetchall())
+        return f'"g{meta.get("published_generation", 0)}v{meta.get("snapshot_version", 0)}"'
+
+    def handle(self, path: str, params: Dict[str, str]) -> Dict:
+        if path == '/rentals':
+            return self.rentals(params)
+        match = _RENTAL_PATH_RE.match(path)
+        if match:
+            return self.rental(int(match.group(1)))
+        if path == '/stats':
+            return self.stats(params)
+        raise ApiError(HTTPStatus.NOT_FOUND, "not found")
+
+    def rentals(self, params: Dict[str, str]) -> Dict:
+        filters = parse_filters(params)
+        try:
+            limit = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "invalid limit") from e
+        after = decode_cursor(params['after']) if params.get('after') else None
+
+        columns = ', '.join(f'rentals.{c}' for c in EXPORT_COLUMNS)
+        query, query_params = database.advanced_query(filters, columns, after=after, with_sort_key=True)
+        with self.pool.connection() as conn:
+            # На строку больше - чтобы знать, есть ли следующая страница
+            rows = conn.execute(query + ' LIMIT ?', query_params + [limit + 1]).fetchall()
+
+        items = [dict(zip(EXPORT_COLUMNS, row[:-1])) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[-1], last[0])
+        return {'items': items, 'next': next_cursor}
+
+    def rental(self, rental_id: int) -> Dict:
+        with self.pool.connection() as conn:
+            row = conn.execute(f'SELECT {RENTAL_COLUMNS} FROM rentals WHERE id = ?', (rental_id,)).fetchone()
+        if row is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"rental {rental_id} not found")
+        return asdict(Rental(*row))
+
+    def stats(self, params: Dict[str, str]) -> Dict:
+        query = 'SELECT * FROM market_stats'
+        query_params = []
+        if params.get('scope'):
+            query += ' WHERE scope = ?'
+            query_params.append(params['scope'])
+            if 'key' in params:
+                query += ' AND key = ?'
+                query_params.append(params['key'])
+        with self.pool.connection() as conn:
+            cursor = conn.execute(query + ' ORDER BY scope, key', query_params)
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        return {'stats': rows}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 с keep-alive; api задаётся в make_server."""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными write: без TCP_NODELAY keep-alive
+    # ответ ждёт delayed ACK клиента (~40 мс на запрос)
+    disable_nagle_algorithm = True
+    api: RentalsApi = None
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            etag = self.api.etag()
+            if etag in (self.headers.get('If-None-Match') or ''):
+                self._send(HTTPStatus.NOT_MODIFIED, b'', etag)
+                return
+            body = self.api.handle(url.path.rstrip('/') or '/', params)
+            status = HTTPStatus.OK
+        except ApiError as e:
+            etag, status, body = None, e.status, {'error': str(e)}
+        except sqlite3.Error as e:
+            logger.error(f"API query failed: {e}")
+            etag, status, body = None, HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'database unavailable'}
+        self._send(status, json.dumps(body, ensure_ascii=False).encode('utf-8'), etag)
+
+    def _send(self, status: HTTPStatus, payload: bytes, etag: Optional[str]) -> None:
+        gzipped = (len(payload) >= GZIP_MIN_BYTES
+                   and 'gzip' in (self.headers.get('Accept-Encoding') or ''))
+        if gzipped:
+            payload = gzip.compress(payload, compresslevel=5)
+        self.send_response(status)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(host: str = API_HOST, port: int = API_PORT,
+                db_path: Optional[Path] = None, pool_size: int = API_POOL_SIZE) -> ThreadingHTTPServer:
+    """Сервер API (ещё не запущен); port=0 - свободный порт."""
+    pool = ConnectionPool(Path(db_path or database.DB_PATH), pool_size)
+    handler = type('Handler', (ApiRequestHandler,), {'api': RentalsApi(pool)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    database.init_db()
+    server = make_server()
+    logger.info(f"🌐 Rentals API on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,60 @@
+"""Локальная подмена Bot API для нагрузочных тестов (Telegram не нужен)."""
+import json
+import time
+from collections import defaultdict
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'}
+
+
+class LocalBotApi(BaseRequest):
+    """Отвечает на вызовы Bot API локально и записывает время ответов бота по chat_id."""
+
+    def __init__(self):
+        self.replies = defaultdict(list)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        result = True
+
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint in ('sendMessage', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            self.replies[chat_id].append(time.perf_counter())
+            result = {
+                'message_id': 1, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', ''),
+            }
+
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def make_update(update_id: int, user_id: int, kind: str) -> dict:
+    """Синтетическое обновление: 'start', 'browse' (кнопка) или любая другая /команда."""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+    chat = {'id': user_id, 'type': 'private'}
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': user}
+
+    if kind == 'browse':
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': 'browse',
+            'message': {**message, 'text': 'menu', 'from': BOT_USER},
+        }}
+    command = f'/{kind}'
+    return {'update_id': update_id, 'message': {
+        **message, 'text': command,
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+    }}
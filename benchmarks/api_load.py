@@ -0,0 +1,83 @@
+"""
+Нагрузочный тест HTTP API (api.py) на копии rentals.db.
+
+Сервер поднимается в этом же процессе на свободном порту, CLIENTS потоков
+с keep-alive соединениями шлют запросы в течение SECONDS секунд на каждый
+сценарий. Печатает запросов в секунду и p50/p99 задержки.
+
+Запуск: python benchmarks/api_load.py [секунд] [клиентов]
+"""
+import http.client
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import api
+import database
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+
+def client(port: int, path: str, headers: dict, deadline: float, latencies: list, statuses: set) -> None:
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses.add(response.status)
+    conn.close()
+
+
+def scenario(port: int, label: str, path: str, headers: dict = None) -> None:
+    latencies, statuses = [], set()
+    deadline = time.perf_counter() + SECONDS
+    threads = [threading.Thread(target=client, args=(port, path, headers or {}, deadline, latencies, statuses))
+               for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<34} {len(latencies) / SECONDS:8.0f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms   {sorted(statuses)}")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / 'rentals.db'
+        shutil.copy(ROOT / 'rentals.db', database.DB_PATH)
+        database.init_db()
+
+        server = api.make_server(port=0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('GET', '/rentals?limit=20')
+        response = conn.getresponse()
+        etag = response.getheader('ETag')
+        first_page = json.loads(response.read())
+        rental_id = first_page['items'][0]['id']
+        conn.close()
+
+        print(f"\n{database.get_rental_count()} rentals, {CLIENTS} clients, {SECONDS:g} s per scenario")
+        scenario(port, "/rentals?limit=20", "/rentals?limit=20")
+        scenario(port, "/rentals?limit=20 (gzip)", "/rentals?limit=20", {'Accept-Encoding': 'gzip'})
+        scenario(port, "/rentals?limit=20 (If-None-Match)", "/rentals?limit=20", {'If-None-Match': etag})
+        scenario(port, "/rentals?district=...&after=", f"/rentals?district=Bratislava&limit=20&after={first_page['next']}")
+        scenario(port, f"/rentals/{rental_id}", f"/rentals/{rental_id}")
+        scenario(port, "/stats?scope=district", "/stats?scope=district")
+        server.shutdown()
+        server.server_close()
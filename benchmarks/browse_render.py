@@ -0,0 +1,56 @@
+"""
+Бенчмарк: отрисовка страницы /browse заново vs. готовая страница из RenderCache.
+
+Без кэша каждое нажатие page_N читает список поколения из БД и заново
+строит текст и клавиатуру; с кэшем - одно чтение номера поколения и
+поиск в OrderedDict.
+
+Запуск: python benchmarks/browse_render.py [повторов]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:LOADTEST')
+
+import bot
+import database
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+def timed(label: str, func) -> None:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    per_call = (time.perf_counter() - start) / REPEAT * 1e6
+    print(f"{label:<32} {per_call:9.1f} µs/page")
+
+
+def uncached() -> None:
+    generation = database.get_snapshot_generation()
+    bot.render_rentals_page(database.get_snapshot_rentals(generation), 0)
+
+
+def cached() -> None:
+    generation = database.get_snapshot_generation()
+    key = (generation, 'browse', 0)
+    if bot.RENDER_CACHE.get(key) is None:
+        bot.RENDER_CACHE.put(key, bot.render_rentals_page(database.get_snapshot_rentals(generation), 0))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / 'rentals.db'
+        shutil.copy(ROOT / 'rentals.db', database.DB_PATH)
+        database.init_db()
+
+        print(f"\n{database.get_rental_count()} rentals, {REPEAT} renders of page 1")
+        timed("read + render every time", uncached)
+        timed("RenderCache (generation lookup)", cached)
+        print(f"cache hits {bot.RENDER_CACHE.hits}, misses {bot.RENDER_CACHE.misses}")
@@ -0,0 +1,102 @@
+"""
+Бенчмарк: много пользователей одновременно, среди них - медленные запросы.
+
+Медленный запрос (/slow) ждёт SLOW_SECONDS, как /refresh ждёт парсер.
+Обновления подаются в очередь Application с постоянной частотой,
+задержка - от подачи до ответа бота в этом чате. Сравниваются
+последовательная обработка и PerChatUpdateProcessor; заодно проверяется,
+что внутри каждого чата порядок обработки совпадает с порядком подачи.
+
+Запуск: python benchmarks/concurrent_users.py [пользователей] [обновлений на пользователя] [workers]
+"""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:LOADTEST')
+
+from telegram import Update
+from telegram.ext import CommandHandler, TypeHandler
+
+import bot
+import database
+from _botapi import LocalBotApi, make_update
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+PER_USER = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+WORKERS = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+RATE = 200           # обновлений в секунду
+SLOW_SHARE = 0.05    # доля медленных запросов
+SLOW_SECONDS = 0.5
+
+
+async def slow(update, context):
+    await asyncio.sleep(SLOW_SECONDS)
+    await update.message.reply_text("done")
+
+
+async def run(workers: int) -> None:
+    bot.UPDATE_CONCURRENCY = workers
+    api = LocalBotApi()
+    application = bot.build_application(request=api)
+    application.add_handler(CommandHandler("slow", slow))
+
+    handled = defaultdict(list)
+
+    async def record_order(update, context):
+        handled[update.effective_chat.id].append(update.update_id)
+
+    application.add_handler(TypeHandler(Update, record_order), group=-1)
+
+    rng = random.Random(42)
+    updates = []
+    for update_id in range(1, USERS * PER_USER + 1):
+        user_id = rng.randrange(1, USERS + 1)
+        kind = 'slow' if rng.random() < SLOW_SHARE else rng.choice(['start', 'browse'])
+        updates.append((user_id, kind, make_update(update_id, user_id, kind)))
+
+    sent = defaultdict(list)
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for user_id, kind, data in updates:
+            sent[user_id].append((time.perf_counter(), kind))
+            await application.update_queue.put(Update.de_json(data, application.bot))
+            await asyncio.sleep(1 / RATE)
+
+        while sum(map(len, api.replies.values())) < len(updates) and time.perf_counter() - start < 300:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        await application.stop()
+
+    fast, slow_latencies = [], []
+    for user_id, requests in sent.items():
+        for (sent_at, kind), replied_at in zip(requests, api.replies[user_id]):
+            (slow_latencies if kind == 'slow' else fast).append((replied_at - sent_at) * 1000)
+
+    in_order = all(ids == sorted(ids) for ids in handled.values())
+    q = statistics.quantiles(fast, n=100)
+    label = "sequential" if workers == 1 else f"per-chat x{workers}"
+    print(f"{label:<14} {len(updates) / elapsed:6.0f} upd/s | fast p50 {q[49]:7.1f} ms  "
+          f"p99 {q[98]:7.1f} ms | slow {len(slow_latencies)} | per-chat order kept: {in_order}")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / 'rentals.db'
+        shutil.copy(ROOT / 'rentals.db', database.DB_PATH)
+        database.init_db()
+
+        print(f"\n{USERS} users, {USERS * PER_USER} updates at {RATE}/s, "
+              f"{SLOW_SHARE:.0%} slow ({SLOW_SECONDS} s)")
+        asyncio.run(run(1))
+        asyncio.run(run(WORKERS))
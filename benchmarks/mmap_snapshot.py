@@ -0,0 +1,100 @@
+"""
+Бенчмарк: каждый процесс строит свою копию списка и фасетов vs. общий
+бинарный снапшот, отображённый в память (mmap_snapshot.py).
+
+Объявления из rentals.db размножаются до ROWS строк. В WORKERS процессах
+замеряется время загрузки и прирост приватной памяти процесса
+(Private_* из /proc/self/smaps_rollup, только Linux): при mmap страницы
+снапшота общие из page cache и в приватную память не попадают.
+
+Запуск: python benchmarks/mmap_snapshot.py [строк] [процессов]
+"""
+import multiprocessing
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from facets import FacetIndex
+from mmap_snapshot import SnapshotFile, write_snapshot
+from models import RentalSummary
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+
+def private_kb() -> int:
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith('Private_'))
+    except OSError:
+        return 0
+
+
+def load_copy(rows) -> tuple:
+    """Как без снапшота: список для /browse и фасеты - объекты в памяти процесса."""
+    rentals = [RentalSummary(rental_id, name, price, rooms, district)
+               for rental_id, name, price, _, rooms, district, _ in rows]
+    facets = FacetIndex()
+    facets.load((district, rooms, price, address) for _, _, price, _, rooms, district, address in rows)
+    return rentals, facets
+
+
+def load_mapped(path) -> tuple:
+    snapshot = SnapshotFile(path)
+    facets = FacetIndex()
+    facets.load_cells(snapshot.price_cells(), snapshot.generation, snapshot.rows_with_address)
+    return snapshot, facets
+
+
+def worker(mode: str, source, results) -> None:
+    before = private_kb()
+    start = time.perf_counter()
+    if mode == 'copy':
+        rows = [tuple(row) for row in sqlite3.connect(source).execute(
+            'SELECT id, name, price, size, rooms, district, address FROM rentals')]
+        _, facets = load_copy(rows)
+    else:
+        _, facets = load_mapped(source)
+    load_ms = (time.perf_counter() - start) * 1000
+    facets.count('Bratislava', '2-izbový', 0, 800)
+    results.put((load_ms, private_kb() - before))
+
+
+def run(mode: str, source) -> None:
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, source, results)) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    load_ms = sum(s[0] for s in samples) / len(samples)
+    private = sum(s[1] for s in samples)
+    print(f"{mode:<6} load {load_ms:8.1f} ms/process, private memory {private / 1024:8.1f} MiB total")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'rentals.db'
+        shutil.copy(ROOT / 'rentals.db', db_path)
+        conn = sqlite3.connect(db_path)
+        base = conn.execute('SELECT id, name, price, size, rooms, district, address FROM rentals').fetchall()
+        rows = [(n * 1_000_000 + row[0],) + row[1:] for n in range(ROWS // len(base) + 1) for row in base][:ROWS]
+        conn.execute('DELETE FROM rentals')
+        conn.executemany('INSERT INTO rentals (id, name, price, size, rooms, district, address, url) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [row + (str(row[0]),) for row in rows])
+        conn.commit()
+        conn.close()
+
+        snapshot_path = Path(tmp) / 'rentals.snapshot'
+        size = write_snapshot(snapshot_path, 1, rows)
+        print(f"\n{len(rows)} rentals, snapshot {size / 1024 / 1024:.1f} MiB, {WORKERS} processes")
+        run('copy', db_path)
+        run('mmap', snapshot_path)
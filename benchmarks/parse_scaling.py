@@ -0,0 +1,82 @@
+"""
+Бенчмарк: SourceAdapter.scrape() с разбором в пуле из 0..N процессов.
+
+Страницы-фикстуры отдаёт локальный HTTP-сервер в этом же процессе (ссылки
+на объявления делаются уникальными для каждой страницы, чтобы дедупликация
+не останавливала обход). Измеряется весь scrape(): скачивание, пауза
+между запросами, разбор и сборка результата - как при парсинге в боте.
+
+Запуск: python benchmarks/parse_scaling.py [макс. процессов] [страниц] [пауза, с]
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import sources
+
+FIXTURES = [ROOT / 'bazos_page.html', ROOT / 'debug_bazos.html']
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """/prenajmu/byt/<offset>/ -> фикстура с уникальными для страницы ссылками."""
+    pages = []
+
+    def do_GET(self) -> None:
+        parts = [part for part in self.path.split('/') if part]
+        page = int(parts[-1]) // 20 if parts and parts[-1].isdigit() else 0
+        body = self.pages[page % len(self.pages)].replace(b'/inzerat/', f'/inzerat/p{page}-'.encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def run(adapter: sources.SourceAdapter, workers: int, page_count: int) -> Tuple[float, int]:
+    sources.shutdown_parse_executor()
+    sources.PARSE_WORKERS = workers
+    executor = sources.get_parse_executor()
+    if executor is not None:
+        # прогрев: все процессы запущены и импортировали bs4
+        list(executor.map(sources._parse_worker, ['bazos.sk'] * workers, FixtureHandler.pages[:1] * workers))
+    start = time.perf_counter()
+    rentals = adapter.scrape(page_count)
+    elapsed = time.perf_counter() - start
+    assert len({r.url for r in rentals}) == len(rentals) > 0
+    return elapsed, len(rentals)
+
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    page_count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    logging.getLogger('sources').setLevel(logging.WARNING)
+    FixtureHandler.pages = [path.read_bytes() for path in FIXTURES]
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    adapter = sources.BazosAdapter()
+    adapter.list_url = f"http://127.0.0.1:{server.server_address[1]}/prenajmu/byt/"
+    adapter.request_delay = delay
+
+    print(f"\nscrape(): {page_count} pages, {delay:g} s between requests, {os.cpu_count()} cores")
+    baseline, count = run(adapter, 0, page_count)
+    print(f"in-process: {baseline:.2f} s ({page_count / baseline:.0f} pages/s, {count} rentals)")
+    for workers in range(1, max_workers + 1):
+        elapsed, count = run(adapter, workers, page_count)
+        print(f"{workers:>2} workers: {elapsed:.2f} s ({page_count / elapsed:.0f} pages/s, "
+              f"x{baseline / elapsed:.2f}, {count} rentals)")
+    sources.shutdown_parse_executor()
+    server.shutdown()
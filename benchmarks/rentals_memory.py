@@ -0,0 +1,72 @@
+"""
+Бенчмарк: память и время построения 100k объявлений
+для dict(row) (как раньше) и Rental со __slots__.
+
+Запуск: python benchmarks/rentals_memory.py [кол-во строк]
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database
+from models import RENTAL_COLUMNS, rental_row_factory
+
+
+def fill_db(rows: int) -> None:
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.executemany('''
+        INSERT INTO rentals (name, price, district, address, rooms, size, description,
+                             url, source, available_from, image_url, first_seen, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ''', (
+        (f"Prenájom 2-izbový byt {i}", 400 + i % 900, 'Bratislava', 'Bratislava, 821 08',
+         '2-izbový', str(40 + i % 60), 'Pekný byt s balkónom ' * 20,
+         f"https://reality.bazos.sk/inzerat/{i}/byt.php", 'bazos.sk', 'Ihneď',
+         f"https://www.bazos.sk/img/1t/{i}.jpg")
+        for i in range(rows)
+    ))
+    conn.commit()
+    conn.close()
+
+
+def load(row_factory, convert) -> list:
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.row_factory = row_factory
+    rows = conn.execute(f'SELECT {RENTAL_COLUMNS} FROM rentals').fetchall()
+    conn.close()
+    return convert(rows)
+
+
+def measure(name: str, row_factory, convert) -> None:
+    load(row_factory, convert)  # прогрев
+
+    start = time.perf_counter()
+    load(row_factory, convert)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    rentals = load(row_factory, convert)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<14} {elapsed * 1000:8.1f} ms  "
+          f"retained {retained / 2**20:7.1f} MiB  peak {peak / 2**20:7.1f} MiB  "
+          f"({retained / len(rentals):.0f} B/row)")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / 'bench.db'
+        database.init_db()
+        fill_db(rows)
+
+        print(f"\n{rows} rows")
+        measure("dict(row)", sqlite3.Row, lambda rows: [dict(row) for row in rows])
+        measure("Rental", rental_row_factory, lambda rows: rows)
@@ -0,0 +1,63 @@
+"""
+Проверка времени старта бота: разбор `python -X importtime -c "import bot"`.
+
+Печатает прямые импорты bot по накопленному времени и время до готового
+Application (импорт + build_application). То, что стек парсера (requests,
+bs4, lxml) не импортируется при старте, проверяет test_startup.py.
+
+Запуск: python benchmarks/startup_time.py [повторов]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+LINE_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+BUILD_SNIPPET = (
+    "import time; start = time.perf_counter(); import bot; bot.build_application(); "
+    "print((time.perf_counter() - start) * 1000)"
+)
+
+
+def run(args):
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=os.environ.get('TELEGRAM_BOT_TOKEN', '123456:STARTUP'))
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_profile():
+    """{модуль: накопленное время, мкс} для прямых импортов bot."""
+    stderr = run(['-X', 'importtime', '-c', 'import bot']).stderr
+    direct, children = {}, {}
+    for match in LINE_RE.finditer(stderr):
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        # Дочерние модули печатаются до родителя: "|   rental_data" ... "| bot"
+        if indent == 3:
+            children[module] = cumulative
+        elif indent == 1:
+            if module == 'bot':
+                direct = dict(children, bot=cumulative)
+            children = {}
+    return direct
+
+
+if __name__ == "__main__":
+    samples = defaultdict(list)
+    for _ in range(REPEAT):
+        direct = import_profile()
+        for module, cumulative in direct.items():
+            samples[module].append(cumulative / 1000)
+
+    print(f"\nimport bot, median of {REPEAT} runs (ms, cumulative):")
+    for module, times in sorted(samples.items(), key=lambda item: -statistics.median(item[1]))[:12]:
+        print(f"  {module:<28} {statistics.median(times):8.1f}")
+
+    build_ms = [float(run(['-c', BUILD_SNIPPET]).stdout.strip().splitlines()[-1]) for _ in range(REPEAT)]
+    print(f"\nimport + build_application: {statistics.median(build_ms):.0f} ms (median)")
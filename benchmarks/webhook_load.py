@@ -0,0 +1,100 @@
+"""
+Нагрузочный тест webhook-режима: локальный сервер бота + синтетические обновления.
+
+Bot API подменяется локальным транспортом (Telegram не нужен), обновления
+отправляются POST-запросами с секретом по keep-alive соединениям.
+Задержка - от отправки обновления до ответа обработчика (sendMessage /
+editMessageText) для этого чата.
+
+Запуск: python benchmarks/webhook_load.py [обновлений] [клиентов] [UPDATE_CONCURRENCY]
+"""
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+os.environ['UPDATE_CONCURRENCY'] = sys.argv[3] if len(sys.argv) > 3 else '1'
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:LOADTEST')
+
+import requests
+
+import bot
+import database
+from _botapi import LocalBotApi, make_update
+
+PORT = 8799
+SECRET = 'loadtest-secret'
+
+
+def post_updates(updates, sent_at):
+    session = requests.Session()  # keep-alive
+    url = f'http://127.0.0.1:{PORT}/{bot.WEBHOOK_PATH}'
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+    for update in updates:
+        sent_at[update['update_id']] = time.perf_counter()
+        resp = session.post(url, json=update, headers=headers)
+        resp.raise_for_status()
+    session.close()
+
+
+async def run_load_test():
+    api = LocalBotApi()
+    application = bot.build_application(request=api)
+
+    async with application:
+        await application.start()
+        await application.updater.start_webhook(
+            listen='127.0.0.1', port=PORT, url_path=bot.WEBHOOK_PATH,
+            webhook_url=f'http://127.0.0.1:{PORT}/{bot.WEBHOOK_PATH}',
+            secret_token=SECRET, allowed_updates=bot.ALLOWED_UPDATES,
+        )
+
+        # Чужой запрос без секрета должен быть отклонён
+        resp = await asyncio.to_thread(
+            requests.post, f'http://127.0.0.1:{PORT}/{bot.WEBHOOK_PATH}',
+            json=make_update(0, 1, 'start')
+        )
+        print(f"Request without secret -> HTTP {resp.status_code}")
+
+        # Каждый пользователь шлёт одно обновление: /start или кнопку browse
+        updates = [make_update(i, i, 'browse' if i % 2 else 'start') for i in range(1, UPDATES + 1)]
+        sent_at = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(CLIENTS) as pool:
+            chunks = [updates[i::CLIENTS] for i in range(CLIENTS)]
+            await asyncio.gather(*(
+                asyncio.get_running_loop().run_in_executor(pool, post_updates, chunk, sent_at)
+                for chunk in chunks
+            ))
+
+        while len(api.replies) < UPDATES and time.perf_counter() - start < 120:
+            await asyncio.sleep(0.05)
+        elapsed = max(times[0] for times in api.replies.values()) - start
+
+        await application.updater.stop()
+        await application.stop()
+
+    latencies = sorted((times[0] - sent_at[chat]) * 1000 for chat, times in api.replies.items())
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"\n{UPDATES} updates, {CLIENTS} clients, UPDATE_CONCURRENCY={bot.UPDATE_CONCURRENCY}")
+    print(f"Handled: {len(latencies)} in {elapsed:.2f} s -> {len(latencies) / elapsed:.0f} updates/s")
+    print(f"Latency ms: p50 {quantiles[49]:.1f}  p95 {quantiles[94]:.1f}  "
+          f"p99 {quantiles[98]:.1f}  max {latencies[-1]:.1f}")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / 'rentals.db'
+        shutil.copy(ROOT / 'rentals.db', database.DB_PATH)
+        database.init_db()
+        asyncio.run(run_load_test())
@@ -1,13 +1,17 @@
+import asyncio
 import logging
 import os
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 # Загрузка .env файла
 script_dir = Path(__file__).parent
 env_path = script_dir / '.env'
 
-BOT_TOKEN = None
+BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 
 if env_path.exists():
     with open(env_path, 'r') as f:
@@ -19,25 +23,58 @@ if env_path.exists():
                 if key.strip() == 'TELEGRAM_BOT_TOKEN':
                     BOT_TOKEN = value.strip()
 
-if not BOT_TOKEN:
-    print("ERROR: TELEGRAM_BOT_TOKEN not found in .env file!")
-    print(f"Checked path: {env_path}")
-    sys.exit(1)
-
-print(f"✅ Bot token loaded successfully")
-
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')            # публичный URL (reverse proxy -> локальный сервер)
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')      # проверяется в X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40'))
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', '8'))
+HEAVY_CONCURRENCY = int(os.environ.get('HEAVY_CONCURRENCY', '3'))
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultsButton, InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, 
+    Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler,
     MessageHandler, filters, ContextTypes, ConversationHandler
 )
+from telegram.request import BaseRequest
+from admission import ConcurrencyLimit, Overloaded, SingleFlight, TokenBucket
+from callbacks import (
+    CallbackRouter, decode, encode, pattern,
+    NOOP, BROWSE, PAGE, RENTAL, FAVORITE, SIMILAR, SEARCH_PAGE, BACK_TO_LIST,
+    REFRESH_LIST, SHOW_NEW, SHOW_FAVORITES, CLEAR_FAVORITES, MULTI_FILTER_MENU,
+    SEARCH_ADVANCED, SEARCH_KEYWORD, CANCEL_SEARCH, BACK_TO_FILTERS,
+    CANCEL_MULTI_FILTER, SET_PRICE_RANGE, SET_DISTRICT, SET_ROOMS,
+    EXECUTE_MULTI_FILTER, DISTRICT, ROOMS,
+)
 from rental_data import (
-    get_rentals, search_rentals, get_rental_details, 
-    get_districts, get_price_range, background_parse_rentals, search_rentals_combined
+    search_rentals, get_rental_details, 
+    get_price_range, background_parse_rentals, search_rentals_combined
+)
+from database import (
+    init_db, get_rental_count, get_last_parse_time, get_market_stats,
+    get_snapshot_generation, get_snapshot_rentals,
+    get_nearest_rentals, get_similar_rentals, suggest_terms,
+    count_new_rentals, get_new_rentals, get_rentals_by_ids, utc_now,
+)
+from geo import find_place
+from export import EXPORT_FORMATS, EXPORT_MAX_ROWS, export_rentals
+from facets import get_facets, filter_args
+from fuzzy import normalize
+from images import get_cached_photo, remember_file_id
+from inline import (
+    INLINE_BUDGET, INLINE_CACHE_TTL, INLINE_DEBOUNCE, INLINE_PAGE_SIZE,
+    InlineSearch, rental_article,
 )
-from database import init_db, get_rental_count, get_last_parse_time
+from persistence import SQLitePersistence
+from render_cache import RenderCache, RenderedPage
+from sources import shutdown_parse_executor
+from update_processor import PerChatUpdateProcessor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Логирование
 logging.basicConfig(
@@ -49,17 +86,55 @@ logger = logging.getLogger(__name__)
 # Состояния диалога
 SEARCH_TYPE, KEYWORD, ADVANCED_SEARCH, MULTI_FILTER_STATE = range(4)
 
+# Бот обрабатывает сообщения, нажатия кнопок и inline-запросы
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
+
+# Отрисованные страницы общих списков (ключ: версия данных, список, страница)
+RENDER_CACHE = RenderCache(max_size=256)
+
+# /export: не чаще раза в минуту на пользователя и не больше двух выгрузок
+# одновременно на весь бот
+EXPORT_COOLDOWN = 60
+EXPORT_SLOTS = asyncio.Semaphore(2)
+
+# Admission control: у пользователя ведро на 6 поисков подряд, дальше один
+# в 5 с (/refresh стоит 3). Тяжёлых запросов к БД одновременно не больше
+# HEAVY_CONCURRENCY, одинаковые запросы и парсинг в работе объединяются
+USER_BUCKET = TokenBucket(rate=0.2, capacity=6)
+REFRESH_COST = 3
+HEAVY_SLOTS = ConcurrencyLimit(HEAVY_CONCURRENCY, wait=3.0)
+IN_FLIGHT = SingleFlight()
+PARSE_KEY = 'parse'
+# Ручной парсинг не чаще, чем раз в столько секунд после предыдущего
+REFRESH_MIN_INTERVAL = 300
+
+# /new для пользователя без отметки seen_until: объявления за столько дней
+NEW_LOOKBACK = timedelta(days=3)
+
+# Результаты inline-запросов (кэш по строке запроса на весь бот)
+INLINE_SEARCH = InlineSearch()
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Приветственное сообщение."""
     user = update.effective_user
-    rental_count = get_rental_count()
-    last_parse = get_last_parse_time()
+    rental_count = await asyncio.to_thread(get_rental_count)
+    last_parse = await asyncio.to_thread(get_last_parse_time)
     
     parse_time_text = "Нет данных"
     if last_parse:
         parse_time_text = last_parse.strftime("%H:%M") if last_parse else "Нет данных"
     
+    # Отметка "просмотрено до" ставится при первом визите и сдвигается в /new
+    if 'seen_until' in context.user_data:
+        new_count = await asyncio.to_thread(
+            count_new_rentals, context.user_data['seen_until'], context.user_data.get('seen_id', 0)
+        )
+    else:
+        context.user_data['seen_until'] = utc_now()
+        new_count = 0
+    new_text = f"• 🆕 Nové od poslednej návštevy: {new_count}\n" if new_count else ""
+    
     welcome_text = f"""
 🏠 <b>Vitajte v Bratislava Rental Finder!</b> 🏠
 
@@ -68,33 +143,107 @@ Ahoj {user.first_name}! Pomôžem vám nájsť byt v Bratislave z bazos.sk.
 <b>� Momentálna stavy:</b>
 • 📋 Dostupných: {rental_count} inzerátov
 • 🕐 Posledná aktualizácia: {parse_time_text}
-
+{new_text}
 <i>Len súkromní vlastníci, bez realitiek!</i>
     """
     
     keyboard = [
-        [InlineKeyboardButton("🔍 Vyhľadávanie s filtrami", callback_data="multi_filter_menu")],
-        [InlineKeyboardButton("📖 Prehliadať všetky", callback_data="browse")],
-        [InlineKeyboardButton("❤️ Obľúbené", callback_data="show_favorites")],
-        [InlineKeyboardButton("🔄 Aktualizovať", callback_data="refresh_list")],
+        [InlineKeyboardButton("🔍 Vyhľadávanie s filtrami", callback_data=encode(MULTI_FILTER_MENU))],
+        [InlineKeyboardButton("📖 Prehliadať všetky", callback_data=encode(BROWSE))],
+        [InlineKeyboardButton("❤️ Obľúbené", callback_data=encode(SHOW_FAVORITES))],
+        [InlineKeyboardButton("🔄 Aktualizovať", callback_data=encode(REFRESH_LIST))],
     ]
+    if new_count:
+        keyboard.insert(0, [InlineKeyboardButton(f"🆕 Nové inzeráty ({new_count})", callback_data=encode(SHOW_NEW))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode="HTML")
 
 
+async def new_rentals(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/new - объявления, появившиеся после отметки пользователя seen_until/seen_id."""
+    since = context.user_data.get('seen_until') or utc_now(NEW_LOOKBACK)
+    results, watermark, more = await asyncio.to_thread(get_new_rentals, since, context.user_data.get('seen_id', 0))
+    if not results:
+        await update.effective_message.reply_text(
+            "✅ Od vašej poslednej návštevy nepribudli žiadne nové inzeráty.\n\n"
+            "Použite /browse pre všetky inzeráty."
+        )
+        return
+    
+    # Просмотренным считается только показанное: отметка - последнее
+    # отданное объявление, остаток (если не влез в лимит) - следующим /new
+    context.user_data['seen_until'], context.user_data['seen_id'] = watermark
+    title = f"🆕 Nové od {since[:16]} UTC: {len(results)}"
+    if more:
+        title += " (ďalšie zobrazí /new)"
+    await show_search_results(update, context, results, title)
+
+
+async def admit(update: Update, cost: float = 1.0) -> bool:
+    """Списывает cost из ведра пользователя; при отказе отвечает, сколько ждать."""
+    wait = USER_BUCKET.take(update.effective_user.id, cost)
+    if wait:
+        await update.effective_message.reply_text(f"⏳ Príliš veľa požiadaviek, skúste o {wait:.0f} s.")
+    return not wait
+
+
+async def heavy(func, *args):
+    """
+    Дорогой вызов func(*args) в потоке: одинаковые вызовы в работе
+    выполняются один раз, одновременно - не больше HEAVY_CONCURRENCY
+    (иначе Overloaded, ответ - в error_handler).
+    """
+    async def call():
+        async with HEAVY_SLOTS:
+            return await asyncio.to_thread(func, *args)
+    
+    task, _ = IN_FLIGHT.run((func, repr(args)), call)
+    return await asyncio.shield(task)
+
+
+async def scheduled_parse() -> None:
+    """Парсинг по расписанию; если его уже запустил /refresh - ждём тот же."""
+    task, _ = IN_FLIGHT.run(PARSE_KEY, background_parse_rentals)
+    await asyncio.shield(task)
+
+
 async def refresh(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Принудительное обновление данных."""
-    await update.message.reply_text(
-        "🔄 <b>Aktualizácia dát</b>\n\n"
-        "Spúšťam parser... môže to trvať 1-2 minúty.\n"
-        "Odoslú vám správu keď bude hotovo.",
-        parse_mode="HTML"
-    )
+    if not IN_FLIGHT.running(PARSE_KEY):
+        # Сначала интервал: отказ "данные свежие" токенов не списывает
+        last_parse = await asyncio.to_thread(get_last_parse_time)
+        # parse_log.parsed_at - CURRENT_TIMESTAMP SQLite (UTC), как и utc_now()
+        age = (datetime.fromisoformat(utc_now()) - last_parse).total_seconds() if last_parse else None
+        if age is not None and age < REFRESH_MIN_INTERVAL:
+            await update.message.reply_text(
+                f"✅ Dáta boli aktualizované pred {age / 60:.0f} min, "
+                f"ďalšia aktualizácia bude možná o {(REFRESH_MIN_INTERVAL - age) / 60:.0f} min."
+            )
+            return
+        if not await admit(update, REFRESH_COST):
+            return
+    
+    # Идущий парсинг (по расписанию или чужой /refresh) не запускается второй раз
+    task, started = IN_FLIGHT.run(PARSE_KEY, background_parse_rentals)
+    if started:
+        await update.message.reply_text(
+            "🔄 <b>Aktualizácia dát</b>\n\n"
+            "Spúšťam parser... môže to trvať 1-2 minúty.\n"
+            "Odoslú vám správu keď bude hotovo.",
+            parse_mode="HTML"
+        )
+    else:
+        eta = IN_FLIGHT.eta(PARSE_KEY)
+        await update.message.reply_text(
+            "⏳ Aktualizácia už prebieha"
+            + (f", hotovo asi o {eta:.0f} s" if eta is not None else "")
+            + ".\nOdošlem vám správu, keď bude hotovo."
+        )
     
     try:
-        await background_parse_rentals()
-        rental_count = get_rental_count()
+        await asyncio.shield(task)
+        rental_count = await asyncio.to_thread(get_rental_count)
         await update.message.reply_text(
             f"✅ <b>Hotovo!</b>\n\n"
             f"Načítaných: {rental_count} inzerátov\n\n"
@@ -123,26 +272,58 @@ async def browse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     await message.reply_text("🔄 Načítavam inzeráty z bazos.sk...") if not edit_message else None
     
-    rentals = get_rentals()
+    await show_browse_page(update, context, 0)
+
+
+async def show_browse_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    """
+    Страница общего списка из опубликованного снапшота.
     
-    if not rentals:
+    Первая страница начинает сессию на последнем поколении, следующие
+    листают то же поколение: публикация нового посреди листания не
+    сдвигает страницы. Страницы одинаковы для всех и берутся из кэша.
+    """
+    # Личную копию списка не храним - страницы общего списка рисуются из кэша
+    context.user_data['rentals_list'] = None
+    context.user_data['current_page'] = page
+    
+    # Закреплённое поколение в кэше - страница отдаётся без обращения к БД
+    pinned = context.user_data.get('browse_generation') if page > 0 else None
+    rendered = RENDER_CACHE.get((pinned, 'browse', page)) if pinned else None
+    
+    notice = ""
+    if rendered is None:
+        generation = await asyncio.to_thread(get_snapshot_generation, pinned)
+        if pinned and generation != pinned:
+            # Поколение кнопки уже удалено: та же страница нового списка
+            # показала бы другие объявления - начинаем с первой
+            page = 0
+            context.user_data['current_page'] = 0
+            notice = "ℹ️ Zoznam sa medzitým aktualizoval, zobrazujem prvú stranu.\n\n"
+        context.user_data['browse_generation'] = generation
+        cache_key = (generation, 'browse', page)
+        rendered = RENDER_CACHE.get(cache_key)
+    if rendered is None:
+        rentals = await asyncio.to_thread(get_snapshot_rentals, generation)
+        if rentals:
+            rendered = render_rentals_page(rentals, page, generation)
+            RENDER_CACHE.put(cache_key, rendered)
+    
+    if rendered is None:
         text = "❌ Momentálne nie sú dostupné žiadne inzeráty.\n\nPoužite /refresh pre aktualizáciu."
-        if edit_message:
-            await query.edit_message_text(text)
+        if update.callback_query:
+            await update.callback_query.edit_message_text(text)
         else:
-            await message.reply_text(text)
+            await update.message.reply_text(text)
         return
-    
-    # Сохраняем список в контекст для пагинации
-    context.user_data['current_page'] = 0
-    context.user_data['rentals_list'] = rentals
-    
-    await show_rentals_page(update, context, rentals, 0)
+    await send_rendered_page(update, (notice + rendered[0], rendered[1]))
 
 
-async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                           rentals: list, page: int) -> None:
-    """Показать страницу с квартирами."""
+def render_rentals_page(rentals: list, page: int, generation: int = 0) -> RenderedPage:
+    """
+    Текст и клавиатура страницы со списком квартир. generation - поколение
+    снапшота в кнопках (0 - личный список): по нему видно устаревшие кнопки.
+    """
     items_per_page = 8
     start_idx = page * items_per_page
     end_idx = start_idx + items_per_page
@@ -150,7 +331,6 @@ async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
     
     keyboard = []
     for rental in page_rentals:
-        idx = rentals.index(rental)
         price_text = f"€{rental['price']}" if rental['price'] > 0 else "Cena dohodou"
         rooms_text = rental['rooms'][:10] if rental['rooms'] != "neuvedené" else ""
         
@@ -160,7 +340,7 @@ async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
         
         keyboard.append([InlineKeyboardButton(
             button_text,
-            callback_data=f"rental_{idx}"
+            callback_data=encode(RENTAL, rental.id, generation)
         )])
     
     # Навигация
@@ -168,17 +348,15 @@ async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
     total_pages = (len(rentals) + items_per_page - 1) // items_per_page
     
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Späť", callback_data=f"page_{page-1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ Späť", callback_data=encode(PAGE, page - 1, generation)))
     
-    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="noop"))
+    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data=encode(NOOP)))
     
     if end_idx < len(rentals):
-        nav_buttons.append(InlineKeyboardButton("Ďalej ➡️", callback_data=f"page_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton("Ďalej ➡️", callback_data=encode(PAGE, page + 1, generation)))
     
     keyboard.append(nav_buttons)
-    keyboard.append([InlineKeyboardButton("🔄 Aktualizovať", callback_data="refresh_list")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard.append([InlineKeyboardButton("🔄 Aktualizovať", callback_data=encode(REFRESH_LIST))])
     
     text = (
         f"🏘️ <b>Inzeráty z bazos.sk</b>\n"
@@ -186,6 +364,18 @@ async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
         f"📄 Strana {page+1} z {total_pages}\n\n"
         f"Kliknite pre detaily:"
     )
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE, 
+                           rentals: list, page: int) -> None:
+    """Показать страницу личного списка квартир (избранное)."""
+    await send_rendered_page(update, render_rentals_page(rentals, page))
+
+
+async def send_rendered_page(update: Update, rendered: RenderedPage) -> None:
+    """Отправить готовую страницу: правкой сообщения с кнопками или новым сообщением."""
+    text, reply_markup = rendered
     
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -200,9 +390,9 @@ async def show_rentals_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
 async def search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало поиска."""
     keyboard = [
-        [InlineKeyboardButton("� Vyhľadávanie s filtrami (Cena + Lokalita)", callback_data="multi_filter_menu")],
-        [InlineKeyboardButton("🔤 Podľa kľúčového slova", callback_data="search_keyword")],
-        [InlineKeyboardButton("❌ Zrušiť", callback_data="cancel_search")],
+        [InlineKeyboardButton("� Vyhľadávanie s filtrami (Cena + Lokalita)", callback_data=encode(MULTI_FILTER_MENU))],
+        [InlineKeyboardButton("🔤 Podľa kľúčového slova", callback_data=encode(SEARCH_KEYWORD))],
+        [InlineKeyboardButton("❌ Zrušiť", callback_data=encode(CANCEL_SEARCH))],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -224,8 +414,10 @@ async def district_selected_multi(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
-    district = query.data.replace('dist_', '')
-    context.user_data['multi_filters']['district'] = district
+    decoded = decode(query.data)
+    if not decoded or len(decoded[1]) != 1 or not choose_filter(update, context, 'district', decoded[1][0]):
+        await stale_button(update, context)
+        return MULTI_FILTER_STATE
     await show_filter_selection(update, context)
     
     return MULTI_FILTER_STATE
@@ -292,6 +484,32 @@ async def search_by_keyword(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return KEYWORD
 
 
+def search_keyword(word: str) -> list:
+    return search_rentals('keyword', word)
+
+
+def search_filters_keyword(word: str, filter_items: tuple) -> list:
+    """Расширенный поиск: фильтры (пары, отсортированные по ключу) и слово."""
+    return search_rentals_combined({**dict(filter_items), 'keyword': word})
+
+
+async def search_with_correction(search, keyword: str, *args) -> Tuple[list, str]:
+    """
+    Поиск search(слово, *args); если ничего не нашлось - повтор с ближайшими
+    словами из словаря (опечатка, ввод без диакритики: "balkom" -> "balkón").
+    search - функция модуля, а не lambda: heavy() объединяет одинаковые
+    вызовы по (функции, аргументам). Возвращает (результаты, слово).
+    """
+    results = await heavy(search, keyword, *args)
+    if results:
+        return results, keyword
+    for word, _, _ in await asyncio.to_thread(suggest_terms, keyword, ('word',), 3):
+        results = await heavy(search, word, *args)
+        if results:
+            return results, word
+    return [], keyword
+
+
 async def keyword_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка ключевого слова."""
     keyword = update.message.text.strip()
@@ -302,7 +520,9 @@ async def keyword_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return KEYWORD
     
-    results = search_rentals('keyword', keyword)
+    if not await admit(update):
+        return KEYWORD
+    results, used = await search_with_correction(search_keyword, keyword)
     
     if not results:
         await update.message.reply_text(
@@ -310,7 +530,10 @@ async def keyword_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     
-    await show_search_results(update, context, results, f"🔤 Kľúčové slovo: {keyword}")
+    filter_text = f"🔤 Kľúčové slovo: {used}"
+    if used != keyword:
+        filter_text += f" (namiesto '{keyword}')"
+    await show_search_results(update, context, results, filter_text)
     
     return ConversationHandler.END
 
@@ -339,16 +562,23 @@ async def show_filter_selection(update: Update, context: ContextTypes.DEFAULT_TY
         filter_text += f"💰 Cena: €{min_p}-€{max_p}\n"
     if 'district' in filters:
         filter_text += f"📍 Lokalita: {filters['district']}\n"
+    if 'rooms' in filters:
+        filter_text += f"🛏 Izby: {filters['rooms']}\n"
     
-    if not any(k in filters for k in ['min_price', 'max_price', 'district']):
+    if not any(k in filters for k in ['min_price', 'max_price', 'district', 'rooms']):
         filter_text += "Bez filtrů\n"
     
+    # Сколько найдёт текущая комбинация - из фасетов в памяти, без запроса к БД
+    matches = get_facets().count(**filter_args(filters))
+    filter_text += f"\n📊 Zodpovedá: {matches} inzerátov\n"
+    
     # Создаем кнопки фильтров
     keyboard = [
-        [InlineKeyboardButton("💰 Cena (od-do)", callback_data="set_price_range")],
-        [InlineKeyboardButton("📍 Lokalita", callback_data="set_district")],
-        [InlineKeyboardButton("🔍 HĽADAJ", callback_data="execute_multi_filter")],
-        [InlineKeyboardButton("❌ Zrušiť", callback_data="cancel_multi_filter")],
+        [InlineKeyboardButton("💰 Cena (od-do)", callback_data=encode(SET_PRICE_RANGE))],
+        [InlineKeyboardButton("📍 Lokalita", callback_data=encode(SET_DISTRICT))],
+        [InlineKeyboardButton("🛏 Izby", callback_data=encode(SET_ROOMS))],
+        [InlineKeyboardButton(f"🔍 HĽADAJ ({matches})", callback_data=encode(EXECUTE_MULTI_FILTER))],
+        [InlineKeyboardButton("❌ Zrušiť", callback_data=encode(CANCEL_MULTI_FILTER))],
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -378,8 +608,26 @@ async def set_price_range(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     context.user_data['filter_step'] = 'price'
     
+    # Подсказка по ценам из готовой статистики (без агрегации в запросе)
+    district = context.user_data['multi_filters'].get('district')
+    histogram = get_facets().price_histogram(district, context.user_data['multi_filters'].get('rooms'))
+    histogram_text = " · ".join(
+        f"€{lo}-{hi}: {n}" if hi else f"€{lo}+: {n}" for lo, hi, n in histogram
+    )
+    stats = await asyncio.to_thread(get_market_stats, 'district', district) if district else None
+    stats = stats or await asyncio.to_thread(get_market_stats, 'all')
+    hint_text = ""
+    if stats:
+        where = f" в {district}" if stats['scope'] == 'district' else ""
+        hint_text = (
+            f"📊 Обычно{where}: €{stats['price_p25']}-€{stats['price_p75']} "
+            f"(медиана €{stats['price_median']}, всего €{stats['price_min']}-€{stats['price_max']})\n\n"
+        )
+    
     await query.edit_message_text(
         "💰 <b>Установка цены</b>\n\n"
+        f"{hint_text}"
+        f"📊 {histogram_text}\n\n"
         "Укажите минимальную цену (€) или напишите 0 для пропуска:",
         parse_mode="HTML"
     )
@@ -398,9 +646,16 @@ async def set_district(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     
     context.user_data['filter_step'] = 'district'
     
-    districts = get_districts()
-    keyboard = [[InlineKeyboardButton(d, callback_data=f"dist_{d}")] for d in districts[:10]]
-    keyboard.append([InlineKeyboardButton("« Назад", callback_data="back_to_filters")])
+    # Самые частые районы при уже выбранных цене/комнатах, с количеством
+    counts = get_facets().counts_by('district', **filter_args(context.user_data['multi_filters'], 'district'))
+    districts = [d for d, _ in counts.most_common() if d and d != 'Slovensko'][:10]
+    # В кнопке только номер варианта: названия районов не влезают в 64 байта
+    context.user_data['filter_choices'] = {'message_id': query.message.message_id, 'district': districts}
+    keyboard = [
+        [InlineKeyboardButton(f"{d} ({counts[d]})", callback_data=encode(DISTRICT, i))]
+        for i, d in enumerate(districts)
+    ]
+    keyboard.append([InlineKeyboardButton("« Назад", callback_data=encode(BACK_TO_FILTERS))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -414,6 +669,32 @@ async def set_district(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 
 
+async def set_rooms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Установить количество комнат."""
+    query = update.callback_query
+    await query.answer()
+    
+    if 'multi_filters' not in context.user_data:
+        context.user_data['multi_filters'] = {}
+    
+    counts = get_facets().counts_by('rooms', **filter_args(context.user_data['multi_filters'], 'rooms'))
+    choices = sorted(counts)
+    context.user_data['filter_choices'] = {'message_id': query.message.message_id, 'rooms': choices}
+    keyboard = [
+        [InlineKeyboardButton(f"{rooms} ({counts[rooms]})", callback_data=encode(ROOMS, i))]
+        for i, rooms in enumerate(choices)
+    ]
+    keyboard.append([InlineKeyboardButton("« Назад", callback_data=encode(BACK_TO_FILTERS))])
+    
+    await query.edit_message_text(
+        "🛏 <b>Выберите количество комнат</b>:",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML"
+    )
+    
+    return MULTI_FILTER_STATE
+
+
 async def search_advanced_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало расширенного поиска с несколькими фильтрами."""
     query = update.callback_query
@@ -435,6 +716,28 @@ async def search_advanced_handler(update: Update, context: ContextTypes.DEFAULT_
     return ADVANCED_SEARCH
 
 
+async def resolve_location(text: str, filters: Dict) -> str:
+    """
+    Локалита из свободного ввода -> фильтр. Опечатки и ввод без диакритики
+    исправляются по словарю: город/район ищется по названию, часть
+    Братиславы ("petrzalka") - по радиусу от её центра. Возвращает название.
+    """
+    suggestions = await asyncio.to_thread(suggest_terms, text, ('district', 'town', 'place'), 1)
+    if not suggestions:
+        filters['district'] = text
+        return text
+    
+    name, kind, _ = suggestions[0]
+    place = find_place(name) if kind == 'place' else None
+    if place:
+        filters['near'] = [place[1], place[2]]
+        filters['near_name'] = name
+        filters['radius_km'] = 2
+    else:
+        filters['district'] = name
+    return name if normalize(name) == normalize(text) else f"{name} (namiesto '{text}')"
+
+
 async def advanced_search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Obrada rozšíreného hledání."""
     text = update.message.text.strip()
@@ -481,12 +784,13 @@ async def advanced_search_handler(update: Update, context: ContextTypes.DEFAULT_
             return ADVANCED_SEARCH
     
     elif step == 2:  # Lokalita
+        location = "Všetky"
         if text != "-":
-            context.user_data['search_filters']['district'] = text
+            location = await resolve_location(text, context.user_data['search_filters'])
         context.user_data['advanced_step'] = 3
         
         await update.message.reply_text(
-            "✅ Lokalita: {}\n\n".format(text if text != "-" else "Všetky") +
+            "✅ Lokalita: {}\n\n".format(location) +
             "Zadajte kľúčové slovo (napr. 'balkón') alebo napíšte '-' pre vyhľadávanie:",
             parse_mode="HTML"
         )
@@ -497,8 +801,15 @@ async def advanced_search_handler(update: Update, context: ContextTypes.DEFAULT_
             context.user_data['search_filters']['keyword'] = text
         
         # Vyhľadávání
+        if not await admit(update):
+            return ADVANCED_SEARCH
         filters = context.user_data.get('search_filters', {})
-        results = search_rentals_combined(filters)
+        if 'keyword' in filters:
+            results, filters['keyword'] = await search_with_correction(
+                search_filters_keyword, filters['keyword'], tuple(sorted(filters.items()))
+            )
+        else:
+            results = await heavy(search_rentals_combined, filters)
         
         if not results:
             await update.message.reply_text(
@@ -514,6 +825,8 @@ async def advanced_search_handler(update: Update, context: ContextTypes.DEFAULT_
             filter_text += f"💰 Cena: €{min_p} - €{max_p}\n"
         if 'district' in filters:
             filter_text += f"📍 Lokalita: {filters['district']}\n"
+        if 'near' in filters:
+            filter_text += f"📍 Lokalita: {filters['near_name']} (do {filters['radius_km']} km)\n"
         if 'keyword' in filters:
             filter_text += f"🔤 Slovo: {filters['keyword']}\n"
         filter_text += f"\n📊 Nájdeno: {len(results)} inzerátov"
@@ -536,7 +849,6 @@ async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def show_search_results_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
                                   results: list, filter_text: str, page: int) -> None:
     """Показать страницу результатов поиска с пагинацией."""
-    rentals = get_rentals()
     items_per_page = 10
     start_idx = page * items_per_page
     end_idx = start_idx + items_per_page
@@ -544,30 +856,26 @@ async def show_search_results_page(update: Update, context: ContextTypes.DEFAULT
     
     keyboard = []
     for rental in page_results:
-        try:
-            idx = rentals.index(rental)
-            price_text = f"€{rental['price']}" if rental['price'] > 0 else "Dohodou"
-            keyboard.append([InlineKeyboardButton(
-                f"🏢 {rental['name'][:25]}... | {price_text}",
-                callback_data=f"rental_{idx}"
-            )])
-        except ValueError:
-            continue
+        price_text = f"€{rental['price']}" if rental['price'] > 0 else "Dohodou"
+        keyboard.append([InlineKeyboardButton(
+            f"🏢 {rental['name'][:25]}... | {price_text}",
+            callback_data=encode(RENTAL, rental.id, 0)
+        )])
     
     # Навигация по результатам
     nav_buttons = []
     total_pages = (len(results) + items_per_page - 1) // items_per_page
     
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Späť", callback_data=f"search_page_{page-1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ Späť", callback_data=encode(SEARCH_PAGE, page - 1)))
     
-    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="noop"))
+    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data=encode(NOOP)))
     
     if end_idx < len(results):
-        nav_buttons.append(InlineKeyboardButton("Ďalej ➡️", callback_data=f"search_page_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton("Ďalej ➡️", callback_data=encode(SEARCH_PAGE, page + 1)))
     
     keyboard.append(nav_buttons)
-    keyboard.append([InlineKeyboardButton("« Späť na zoznam", callback_data="back_to_list")])
+    keyboard.append([InlineKeyboardButton("« Späť na zoznam", callback_data=encode(BACK_TO_LIST))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -594,156 +902,296 @@ async def show_search_results_page(update: Update, context: ContextTypes.DEFAULT
         )
 
 
+async def stale_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка старого формата или из давно изменившегося списка."""
+    await update.callback_query.message.reply_text(
+        "⚠️ Toto tlačidlo je zo staršej verzie zoznamu. Použite /browse alebo /start."
+    )
+
+
+# Нажатия кнопок: код действия из callback_data -> обработчик
+ROUTER = CallbackRouter(stale_button)
+
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка нажатий кнопок."""
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    
-    if data == "noop":
-        return
-    
-    if data == "browse":
-        rentals = get_rentals()
-        context.user_data['rentals_list'] = rentals
-        context.user_data['current_page'] = 0
-        await show_rentals_page(update, context, rentals, 0)
-        return
-    
-    if data == "cancel_search":
-        await query.edit_message_text("❌ Vyhľadávanie zrušené.")
-        return
-    
-    if data == "multi_filter_menu":
-        await multi_filter_menu(update, context)
-        return
-    
-    if data == "search_advanced":
-        await search_advanced_handler(update, context)
-        return
-    
-    if data == "back_to_filters":
-        await show_filter_selection(update, context)
-        return
-    
-    if data == "cancel_multi_filter":
-        await query.edit_message_text("❌ Поиск отменен.")
-        return
-    
-    if data == "set_price_range":
-        await update.callback_query.answer()
-        await set_price_range(update, context)
-        return
-    
-    if data == "set_district":
-        await update.callback_query.answer()
-        await set_district(update, context)
+    await update.callback_query.answer()
+    await ROUTER.dispatch(update, context)
+
+
+@ROUTER.route(NOOP)
+async def on_noop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    pass
+
+
+@ROUTER.route(BROWSE)
+async def on_browse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await show_browse_page(update, context, 0)
+
+
+@ROUTER.route(CANCEL_SEARCH)
+async def on_cancel_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.edit_message_text("❌ Vyhľadávanie zrušené.")
+
+
+@ROUTER.route(CANCEL_MULTI_FILTER)
+async def on_cancel_multi_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.edit_message_text("❌ Поиск отменен.")
+
+
+ROUTER.route(MULTI_FILTER_MENU)(multi_filter_menu)
+ROUTER.route(SEARCH_ADVANCED)(search_advanced_handler)
+ROUTER.route(BACK_TO_FILTERS)(show_filter_selection)
+ROUTER.route(SET_PRICE_RANGE)(set_price_range)
+ROUTER.route(SET_DISTRICT)(set_district)
+ROUTER.route(SET_ROOMS)(set_rooms)
+ROUTER.route(SHOW_NEW)(new_rentals)
+
+
+def choose_filter(update: Update, context: ContextTypes.DEFAULT_TYPE, field: str, index: int) -> bool:
+    """
+    Вариант index из показанного списка filter_choices -> multi_filters.
+    False - кнопка не из последнего показанного списка (старое сообщение):
+    номер в ней мог бы указать на другой вариант.
+    """
+    shown = context.user_data.get('filter_choices') or {}
+    choices = shown.get(field, [])
+    if shown.get('message_id') != update.callback_query.message.message_id or index >= len(choices):
+        return False
+    context.user_data.setdefault('multi_filters', {})[field] = choices[index]
+    return True
+
+
+@ROUTER.route(ROOMS, args=1)
+async def on_rooms(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int) -> None:
+    if not choose_filter(update, context, 'rooms', index):
+        await stale_button(update, context)
         return
-    
-    if data.startswith("dist_"):
-        district = data.split("dist_", 1)[1]
-        context.user_data['multi_filters']['district'] = district
-        await show_filter_selection(update, context)
+    await show_filter_selection(update, context)
+
+
+@ROUTER.route(DISTRICT, args=1)
+async def on_district(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int) -> None:
+    if not choose_filter(update, context, 'district', index):
+        await stale_button(update, context)
         return
-    
-    if data == "execute_multi_filter":
-        filters = context.user_data.get('multi_filters', {})
-        results = search_rentals_combined(filters)
-        
-        # Создаем текст с примененными фильтрами
-        filter_desc = []
-        if 'min_price' in filters:
-            filter_desc.append(f"€{filters['min_price']}")
-        if 'max_price' in filters:
-            filter_desc.append(f"до €{filters['max_price']}")
-        if 'district' in filters:
-            filter_desc.append(f"в {filters['district']}")
-        if 'keyword' in filters:
-            filter_desc.append(f"'{filters['keyword']}'")
-        
-        filter_text = " + ".join(filter_desc) if filter_desc else "Без фильтров"
-        
-        if results:
-            await show_search_results(update, context, results, f"🔍 {filter_text}")
-        else:
-            await query.edit_message_text(
-                f"❌ <b>Результаты не найдены</b>\n\n🔍 {filter_text}",
-                parse_mode="HTML"
-            )
+    await show_filter_selection(update, context)
+
+
+@ROUTER.route(EXECUTE_MULTI_FILTER)
+async def on_execute_multi_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not await admit(update):
         return
+    filters = context.user_data.get('multi_filters', {})
+    results = await heavy(search_rentals_combined, filters)
+    
+    # Создаем текст с примененными фильтрами
+    filter_desc = []
+    if 'min_price' in filters:
+        filter_desc.append(f"€{filters['min_price']}")
+    if 'max_price' in filters:
+        filter_desc.append(f"до €{filters['max_price']}")
+    if 'district' in filters:
+        filter_desc.append(f"в {filters['district']}")
+    if 'rooms' in filters:
+        filter_desc.append(filters['rooms'])
+    if 'keyword' in filters:
+        filter_desc.append(f"'{filters['keyword']}'")
     
-    if data == "back_to_list" or data == "back_to_rentals":
-        rentals = get_rentals()
-        page = context.user_data.get('current_page', 0)
-        await show_rentals_page(update, context, rentals, page)
-        return
+    filter_text = " + ".join(filter_desc) if filter_desc else "Без фильтров"
     
-    if data == "show_favorites":
-        favorites = context.user_data.get('favorites', [])
-        if not favorites:
-            await query.edit_message_text("❌ У вас нет сохраненных объявлений")
-            return
-        rentals = get_rentals()
-        favorite_rentals = [r for i, r in enumerate(rentals) if i in favorites]
-        if favorite_rentals:
-            context.user_data['rentals_list'] = favorite_rentals
-            context.user_data['current_page'] = 0
-            await show_rentals_page(update, context, favorite_rentals, 0)
-        else:
-            await query.edit_message_text("❌ Нет сохраненных объявлений")
+    if results:
+        await show_search_results(update, context, results, f"🔍 {filter_text}")
+    else:
+        await update.callback_query.edit_message_text(
+            f"❌ <b>Результаты не найдены</b>\n\n🔍 {filter_text}",
+            parse_mode="HTML"
+        )
+
+
+@ROUTER.route(BACK_TO_LIST)
+async def on_back_to_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await delete_rental_photo(update.callback_query, context)
+    await show_browse_page(update, context, context.user_data.get('current_page', 0))
+
+
+@ROUTER.route(SHOW_FAVORITES)
+async def on_show_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    favorites = context.user_data.get('favorites', [])
+    if not favorites:
+        await query.edit_message_text("❌ У вас нет сохраненных объявлений")
         return
-    
-    if data == "refresh_list":
-        await query.edit_message_text("🔄 Aktualizujem...")
-        rentals = get_rentals(force_refresh=True)
-        context.user_data['rentals_list'] = rentals
+    favorite_rentals = await asyncio.to_thread(get_rentals_by_ids, favorites)
+    if favorite_rentals:
+        context.user_data['rentals_list'] = favorite_rentals
         context.user_data['current_page'] = 0
-        await show_rentals_page(update, context, rentals, 0)
-        return
-    
-    if data.startswith("page_"):
-        page = int(data.split("_")[1])
+        await show_rentals_page(update, context, favorite_rentals, 0)
+    else:
+        await query.edit_message_text("❌ Нет сохраненных объявлений")
+
+
+@ROUTER.route(CLEAR_FAVORITES)
+async def on_clear_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    context.user_data['favorites'] = []
+    await update.callback_query.edit_message_text("🗑️ Obľúbené inzeráty boli vymazané.")
+
+
+@ROUTER.route(REFRESH_LIST)
+async def on_refresh_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.edit_message_text("🔄 Aktualizujem...")
+    await show_browse_page(update, context, 0)
+
+
+@ROUTER.route(PAGE, args=2)
+async def on_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int, generation: int) -> None:
+    if not generation:
+        # Личный список (избранное)
+        rentals = context.user_data.get('rentals_list')
+        if not rentals:
+            await stale_button(update, context)
+            return
         context.user_data['current_page'] = page
-        rentals = context.user_data.get('rentals_list', get_rentals())
         await show_rentals_page(update, context, rentals, page)
         return
-    
-    if data.startswith("search_page_"):
-        page = int(data.split("_")[2])
-        results = context.user_data.get('search_results', [])
-        filter_text = context.user_data.get('search_filter_text', "")
-        await show_search_results_page(update, context, results, filter_text, page)
+    # Листается то поколение, которое показано в сообщении
+    context.user_data['browse_generation'] = generation
+    await show_browse_page(update, context, page)
+
+
+@ROUTER.route(SEARCH_PAGE, args=1)
+async def on_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    results = context.user_data.get('search_results', [])
+    filter_text = context.user_data.get('search_filter_text', "")
+    await show_search_results_page(update, context, results, filter_text, page)
+
+
+@ROUTER.route(RENTAL, args=2)
+async def on_rental(update: Update, context: ContextTypes.DEFAULT_TYPE, rental_id: int, generation: int) -> None:
+    if generation:
+        # "Назад" из деталей вернёт в тот же список, из которого открыли
+        context.user_data['browse_generation'] = generation
+    await show_rental_details(update, context, rental_id)
+
+
+@ROUTER.route(FAVORITE, args=1)
+async def on_favorite(update: Update, context: ContextTypes.DEFAULT_TYPE, rental_id: int) -> None:
+    await toggle_favorite(update, context, rental_id)
+
+
+@ROUTER.route(SIMILAR, args=1)
+async def show_similar_rentals(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               rental_id: int) -> None:
+    """Похожие объявления из предрасчитанного индекса (rental_neighbors)."""
+    results = await asyncio.to_thread(get_similar_rentals, rental_id)
+    if not results:
+        await update.callback_query.edit_message_text(
+            "❌ Podobné inzeráty zatiaľ nie sú k dispozícii.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("« Späť", callback_data=encode(RENTAL, rental_id, 0))
+            ]])
+        )
+        return
+    await show_search_results(update, context, results, "🔁 Podobné inzeráty")
+
+
+async def put_rental_photo(query, context: ContextTypes.DEFAULT_TYPE,
+                           photo_message_id: Optional[int], photo):
+    """
+    Меняет картинку в сообщении photo_message_id (edit_message_media);
+    если его нет или оно удалено - отправляет новое. photo - file_id или путь.
+    """
+    if photo_message_id:
+        try:
+            with open(photo, 'rb') if isinstance(photo, Path) else nullcontext(photo) as media:
+                return await context.bot.edit_message_media(
+                    InputMediaPhoto(media), chat_id=query.message.chat_id, message_id=photo_message_id
+                )
+        except BadRequest as e:
+            logger.info(f"Rental photo message {photo_message_id} not editable: {e}")
+    with open(photo, 'rb') if isinstance(photo, Path) else nullcontext(photo) as media:
+        return await query.message.reply_photo(photo=media)
+
+
+async def delete_rental_photo(query, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Убирает фото, показанное к карточке объявления в этом сообщении."""
+    shown = context.user_data.get('rental_photo') or {}
+    if shown.get('message_id') != query.message.message_id:
         return
+    context.user_data['rental_photo'] = None
+    try:
+        await context.bot.delete_message(chat_id=query.message.chat_id, message_id=shown['photo_id'])
+    except BadRequest as e:
+        logger.info(f"Rental photo message {shown['photo_id']} not deleted: {e}")
+
+
+async def send_rental_photo(query, context: ContextTypes.DEFAULT_TYPE, rental) -> None:
+    """
+    Фото объявления из локального кэша - одно сообщение с фото на карточку.
     
-    if data.startswith("rental_"):
-        await show_rental_details(update, context, data)
+    Сообщение с фото запоминается вместе с id сообщения карточки: следующее
+    объявление, открытое из той же карточки, меняет в нём картинку, а не
+    присылает новую. После первой загрузки сохраняется file_id, повторные
+    показы отправляют только его, без повторной загрузки файла.
+    """
+    shown = context.user_data.get('rental_photo') or {}
+    photo_message_id = shown.get('photo_id') if shown.get('message_id') == query.message.message_id else None
+    if photo_message_id and shown.get('rental_id') == rental['id']:
         return
     
-    if data.startswith("fav_"):
-        await toggle_favorite(update, context, data)
+    photo = await asyncio.to_thread(get_cached_photo, rental['image_url'])
+    if not photo:
+        # Фото предыдущего объявления под этой карточкой не оставляем
+        await delete_rental_photo(query, context)
         return
+    
+    try:
+        message = await put_rental_photo(query, context, photo_message_id, photo)
+        if isinstance(photo, Path):
+            await asyncio.to_thread(remember_file_id, rental['image_url'], message.photo[-1].file_id)
+        context.user_data['rental_photo'] = {
+            'message_id': query.message.message_id, 'photo_id': message.message_id, 'rental_id': rental['id'],
+        }
+    except Exception as e:
+        logger.error(f"Error sending rental photo: {e}")
 
 
 async def show_rental_details(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                              data: str) -> None:
+                              rental_id: int, with_photo: bool = True) -> None:
     """Показать детали квартиры."""
     query = update.callback_query
-    rentals = get_rentals()
     
     try:
-        rental_idx = int(data.split("_")[1])
-        rental = rentals[rental_idx]
+        # Полное объявление (с описанием) читается только здесь
+        rental = await asyncio.to_thread(get_rental_details, rental_id)
+        if rental is None:
+            # id стабилен: кнопка из старого списка не откроет чужое объявление
+            await query.edit_message_text(
+                "⚠️ Tento inzerát už nie je dostupný. Použite /browse pre aktuálny zoznam."
+            )
+            return
         
         price_text = f"€{rental['price']}/mesiac" if rental['price'] > 0 else "Cena dohodou"
         
+        # Сравнение с медианой района из market_stats
+        market_text = ""
+        stats = await asyncio.to_thread(get_market_stats, 'district', rental['district'])
+        if rental['price'] > 0 and stats and stats['count'] > 1:
+            diff = round((rental['price'] - stats['price_median']) * 100 / stats['price_median'])
+            if diff < 0:
+                market_text = f"📊 {-diff}% pod mediánom lokality (€{stats['price_median']})\n"
+            elif diff > 0:
+                market_text = f"📊 {diff}% nad mediánom lokality (€{stats['price_median']})\n"
+            else:
+                market_text = f"📊 Na úrovni mediánu lokality (€{stats['price_median']})\n"
+        
         details_text = f"""
 🏢 <b>{rental['name']}</b>
 
 📍 <b>Lokalita:</b> {rental['district']}
 🏠 <b>Adresa:</b> {rental['address']}
 💰 <b>Cena:</b> {price_text}
-🛏️ <b>Izby:</b> {rental['rooms']}
+{market_text}🛏️ <b>Izby:</b> {rental['rooms']}
 📐 <b>Rozloha:</b> {rental['size']} m²
 📅 <b>Dostupné:</b> {rental['available_from']}
 
@@ -755,15 +1203,19 @@ async def show_rental_details(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Проверяем, в избранном ли
         favorites = context.user_data.get('favorites', [])
-        fav_text = "💔 Odstrániť z obľúbených" if rental_idx in favorites else "❤️ Pridať do obľúbených"
+        fav_text = "💔 Odstrániť z obľúbených" if rental_id in favorites else "❤️ Pridať do obľúbených"
         
         keyboard = [
             [InlineKeyboardButton("🔗 Otvoriť na bazos.sk", url=rental['url'])],
-            [InlineKeyboardButton(fav_text, callback_data=f"fav_{rental_idx}")],
-            [InlineKeyboardButton("« Späť", callback_data="back_to_list")],
+            [InlineKeyboardButton(fav_text, callback_data=encode(FAVORITE, rental_id))],
+            [InlineKeyboardButton("🔁 Podobné inzeráty", callback_data=encode(SIMILAR, rental_id))],
+            [InlineKeyboardButton("« Späť", callback_data=encode(BACK_TO_LIST))],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        if with_photo:
+            await send_rental_photo(query, context, rental)
+        
         await query.edit_message_text(
             text=details_text,
             reply_markup=reply_markup,
@@ -778,25 +1230,23 @@ async def show_rental_details(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 
 async def toggle_favorite(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                         data: str) -> None:
+                         rental_id: int) -> None:
     """Добавить/удалить из избранного."""
     query = update.callback_query
     
     try:
-        rental_idx = int(data.split("_")[1])
-        
         if "favorites" not in context.user_data:
             context.user_data["favorites"] = []
         
-        if rental_idx in context.user_data["favorites"]:
-            context.user_data["favorites"].remove(rental_idx)
+        if rental_id in context.user_data["favorites"]:
+            context.user_data["favorites"].remove(rental_id)
             await query.answer("💔 Odstránené z obľúbených")
         else:
-            context.user_data["favorites"].append(rental_idx)
+            context.user_data["favorites"].append(rental_id)
             await query.answer("❤️ Pridané do obľúbených!")
         
         # Обновляем сообщение с новой кнопкой
-        await show_rental_details(update, context, f"rental_{rental_idx}")
+        await show_rental_details(update, context, rental_id, with_photo=False)
         
     except (ValueError, IndexError) as e:
         logger.error(f"Error toggling favorite: {e}")
@@ -814,19 +1264,17 @@ async def favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         return
     
-    rentals = get_rentals()
+    rentals = await asyncio.to_thread(get_rentals_by_ids, context.user_data["favorites"])
     keyboard = []
     valid_favorites = []
     
-    for fav_idx in context.user_data["favorites"]:
-        if fav_idx < len(rentals):
-            rental = rentals[fav_idx]
-            price_text = f"€{rental['price']}" if rental['price'] > 0 else "Dohodou"
-            keyboard.append([InlineKeyboardButton(
-                f"❤️ {rental['name'][:25]}... | {price_text}",
-                callback_data=f"rental_{fav_idx}"
-            )])
-            valid_favorites.append(fav_idx)
+    for rental in rentals:
+        price_text = f"€{rental['price']}" if rental['price'] > 0 else "Dohodou"
+        keyboard.append([InlineKeyboardButton(
+            f"❤️ {rental['name'][:25]}... | {price_text}",
+            callback_data=encode(RENTAL, rental.id, 0)
+        )])
+        valid_favorites.append(rental.id)
     
     # Обновляем список избранного (удаляем несуществующие)
     context.user_data["favorites"] = valid_favorites
@@ -837,7 +1285,7 @@ async def favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         return
     
-    keyboard.append([InlineKeyboardButton("🗑️ Vymazať všetky", callback_data="clear_favorites")])
+    keyboard.append([InlineKeyboardButton("🗑️ Vymazať všetky", callback_data=encode(CLEAR_FAVORITES))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
@@ -848,6 +1296,131 @@ async def favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
+async def location_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пользователь отправил геопозицию - ближайшие объявления."""
+    location = update.message.location
+    if not await admit(update):
+        return
+    nearest = await heavy(get_nearest_rentals, location.latitude, location.longitude, 30)
+    if not nearest:
+        await update.message.reply_text("❌ V okolí nie sú žiadne inzeráty.")
+        return
+    
+    results = [rental for rental, _ in nearest]
+    farthest = nearest[-1][1]
+    await show_search_results(update, context, results, f"📍 Do {farthest:.1f} km od vašej polohy")
+
+
+async def near(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/near <miesto> [km] - inzeráty v okruhu od mestskej časti alebo mesta."""
+    args = list(context.args)
+    radius_km = 3.0
+    if args:
+        try:
+            radius_km = float(args[-1].replace(',', '.'))
+            args = args[:-1]
+        except ValueError:
+            pass
+    
+    place = find_place(' '.join(args))
+    if not place:
+        await update.message.reply_text(
+            "📍 Použitie: /near Petržalka 2\n"
+            "Alebo pošlite svoju polohu 📎 → Poloha."
+        )
+        return
+    
+    name, lat, lon = place
+    if not await admit(update):
+        return
+    results = await heavy(search_rentals_combined, {'near': (lat, lon), 'radius_km': radius_km})
+    filter_text = f"📍 Do {radius_km:g} km od {name}"
+    if results:
+        await show_search_results(update, context, results, filter_text)
+    else:
+        await update.message.reply_text(f"❌ <b>Nič sa nenašlo</b>\n\n{filter_text}", parse_mode="HTML")
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/export [csv|jsonl] - výsledky podľa aktuálnych filtrov ako .gz súbor."""
+    fmt = context.args[0].lower() if context.args else 'csv'
+    if fmt not in EXPORT_FORMATS:
+        await update.message.reply_text("📤 Použitie: /export csv alebo /export jsonl")
+        return
+    
+    wait = EXPORT_COOLDOWN - (time.monotonic() - context.user_data.get('last_export_at', -EXPORT_COOLDOWN))
+    if wait > 0:
+        await update.message.reply_text(f"⏳ Ďalší export bude možný o {wait:.0f} s.")
+        return
+    if EXPORT_SLOTS.locked():
+        await update.message.reply_text("⏳ Práve prebiehajú iné exporty, skúste o chvíľu.")
+        return
+    context.user_data['last_export_at'] = time.monotonic()
+    
+    # Фильтры из меню мульти-фильтра или расширенного поиска; без них - всё
+    filters = context.user_data.get('multi_filters') or context.user_data.get('search_filters') or {}
+    async with EXPORT_SLOTS:
+        fileobj, count, truncated = await asyncio.to_thread(export_rentals, filters, fmt)
+        try:
+            if not count:
+                await update.message.reply_text("❌ Pre aktuálne filtre sa nič nenašlo.")
+                return
+            caption = f"📤 {count} inzerátov"
+            if truncated:
+                caption += f" (prvých {EXPORT_MAX_ROWS}, upresnite filtre)"
+            await update.message.reply_document(
+                document=fileobj,
+                filename=f"inzeraty-{datetime.now():%Y%m%d-%H%M}.{fmt}.gz",
+                caption=caption,
+            )
+        finally:
+            fileobj.close()
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """@bot 2-izb petrzalka 700 - поиск из любого чата."""
+    query = update.inline_query
+    if query.offset or INLINE_SEARCH.cached(query.query) is not None:
+        await answer_inline_query(query)
+        return
+    
+    # Запросы одного пользователя обрабатываются по очереди, поэтому пауза
+    # debounce идёт в отдельной задаче, а не держит очередь обновлений
+    context.user_data['inline_query_id'] = query.id
+    
+    async def debounced() -> None:
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        # Пользователь печатает дальше - на этот запрос уже не отвечаем
+        if context.user_data.get('inline_query_id') == query.id:
+            await answer_inline_query(query)
+    
+    context.application.create_task(debounced(), update=update)
+
+
+async def answer_inline_query(query) -> None:
+    """Страница результатов по offset (offset - номер первого результата)."""
+    rows = await INLINE_SEARCH.results(query.query, INLINE_BUDGET)
+    try:
+        if rows is None:
+            await query.answer(
+                [], cache_time=0, is_personal=True,
+                button=InlineQueryResultsButton("⏳ Hľadanie trvá dlhšie, skúste znova", start_parameter="inline"),
+            )
+            return
+        
+        offset = int(query.offset) if query.offset.isdigit() else 0
+        page = rows[offset:offset + INLINE_PAGE_SIZE]
+        next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(rows) else ''
+        await query.answer(
+            [rental_article(row) for row in page],
+            cache_time=int(INLINE_CACHE_TTL),
+            next_offset=next_offset,
+        )
+    except BadRequest as e:
+        # Запрос устарел, пока шёл поиск (пользователь закрыл inline-панель)
+        logger.debug(f"Inline answer dropped: {e}")
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Помощь."""
     help_text = """
@@ -856,11 +1429,18 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 <b>Príkazy:</b>
 /start - Uvítacia správa
 /browse - Zobraziť všetky inzeráty
+/new - Nové inzeráty od poslednej návštevy
 /search - Vyhľadávanie podľa kritérií
 /refresh - Aktualizovať dáta z bazos.sk
 /favorites - Vaše uložené inzeráty
+/near - Inzeráty v okolí (napr. /near Aupark 3)
+/export - Výsledky podľa filtrov ako CSV (/export jsonl)
 /help - Tento pomocník
 
+<b>V ľubovoľnom chate:</b>
+@bot 2-izb petrzalka 700 - hľadanie priamo z konverzácie
+(izby, lokalita, cena do/od alebo 500-800, 3km, kľúčové slovo)
+
 <b>Ako to funguje:</b>
 1. Bot parsuje reality.bazos.sk
 2. Automaticky filtruje realitné kancelárie
@@ -871,6 +1451,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 • 💰 Podľa ceny - zadáte min/max cenu
 • 📍 Podľa lokality - vyberiete mestskú časť
 • 🔤 Podľa slova - hľadáte v popisoch
+• 📎 Pošlite polohu - najbližšie inzeráty
 
 <b>Tipy:</b>
 • Dáta sa automaticky aktualizujú každých 5 minút
@@ -886,6 +1467,15 @@ Všetky inzeráty sú od súkromných osôb! 🏠
     await update.message.reply_text(help_text, parse_mode="HTML")
 
 
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Перегрузка - короткий ответ пользователю, остальное - в лог."""
+    if isinstance(context.error, Overloaded):
+        if isinstance(update, Update) and update.effective_message:
+            await update.effective_message.reply_text("⏳ Bot je práve vyťažený, skúste o chvíľu.")
+        return
+    logger.error("Unhandled error while processing update", exc_info=context.error)
+
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отмена."""
     await update.message.reply_text(
@@ -895,19 +1485,29 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 
-def main() -> None:
-    """Запуск бота с фоновым парсингом."""
-    # Инициализируем БД
-    init_db()
-    
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_application(request: Optional[BaseRequest] = None) -> Application:
+    """
+    Создаёт Application со всеми обработчиками и планировщиком.
+    request - свой HTTP-транспорт к Bot API (например, для нагрузочного теста).
+    """
+    # Разные чаты обрабатываются параллельно, обновления одного чата - по порядку.
+    # Избранное, фильтры и состояние поиска хранятся в rentals.db
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(UPDATE_CONCURRENCY))
+        .persistence(SQLitePersistence())
+    )
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
 
     # Создаём планировщик для фонового парсинга
     scheduler = AsyncIOScheduler()
     
     # Добавляем задачу парсинга каждые 3 часа
     scheduler.add_job(
-        background_parse_rentals,
+        scheduled_parse,
         "interval",
         hours=3,
         id="parse_job",
@@ -918,14 +1518,16 @@ def main() -> None:
     # Инициализация при запуске
     async def startup(app):
         logger.info("🤖 Bot starting...")
-        rental_count = get_rental_count()
+        rental_count = await asyncio.to_thread(get_rental_count)
         logger.info(f"✅ БД загружена: {rental_count} объявлений")
+        await asyncio.to_thread(get_facets)
         scheduler.start()
         logger.info("✅ Scheduler started (парсинг каждые 3 часа)")
     
     async def shutdown(app):
         logger.info("👋 Bot shutting down...")
         scheduler.shutdown()
+        shutdown_parse_executor()
         logger.info("✅ Scheduler stopped")
     
     application.post_init = startup
@@ -934,17 +1536,22 @@ def main() -> None:
     # Обработчики команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("browse", browse))
+    application.add_handler(CommandHandler("new", new_rentals))
     application.add_handler(CommandHandler("refresh", refresh))
     application.add_handler(CommandHandler("favorites", favorites))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("near", near))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(MessageHandler(filters.LOCATION, location_handler))
+    application.add_handler(InlineQueryHandler(inline_query))
     
     # Обработчик поиска (ConversationHandler)
     search_handler = ConversationHandler(
         entry_points=[CommandHandler("search", search)],
         states={
             SEARCH_TYPE: [
-                CallbackQueryHandler(search_by_keyword, pattern="^search_keyword$"),
-                CallbackQueryHandler(cancel, pattern="^cancel_search$"),
+                CallbackQueryHandler(search_by_keyword, pattern=pattern(SEARCH_KEYWORD)),
+                CallbackQueryHandler(cancel, pattern=pattern(CANCEL_SEARCH)),
             ],
             KEYWORD: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, keyword_handler)
@@ -954,16 +1561,40 @@ def main() -> None:
             ],
             MULTI_FILTER_STATE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, multi_filter_text_handler),
-                CallbackQueryHandler(district_selected_multi, pattern="^dist_")
+                CallbackQueryHandler(district_selected_multi, pattern=pattern(DISTRICT))
             ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="search",
+        persistent=True,
     )
     
     application.add_handler(search_handler)
 
     # Обработчик кнопок
     application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_error_handler(error_handler)
+    
+    return application
+
+
+def main() -> None:
+    """Запуск бота с фоновым парсингом."""
+    if not BOT_TOKEN:
+        print("ERROR: TELEGRAM_BOT_TOKEN not found in .env file!")
+        print(f"Checked path: {env_path}")
+        sys.exit(1)
+    
+    print("✅ Bot token loaded successfully")
+    
+    if BOT_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET):
+        print("ERROR: BOT_MODE=webhook requires WEBHOOK_URL and WEBHOOK_SECRET in .env file!")
+        sys.exit(1)
+    
+    # Инициализируем БД
+    init_db()
+    
+    application = build_application()
 
     # Запуск
     print("\n" + "="*60)
@@ -975,7 +1606,20 @@ def main() -> None:
     print("="*60)
     print("\nBот работает... Нажмите Ctrl+C чтобы остановить\n")
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        # Локальный HTTP-сервер (tornado из python-telegram-bot[webhooks]) с keep-alive;
+        # Telegram присылает секрет в заголовке, чужие запросы получают 403
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
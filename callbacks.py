@@ -0,0 +1,126 @@
+"""
+Компактные callback_data кнопок и таблица их обработчиков.
+
+Формат: версия формата (1 символ) + код действия (1 символ) + числовые
+аргументы через '.', в base36:
+
+    '1n'          - пустая кнопка
+    '1p.3.1c'     - страница 3 списка /browse поколения 48
+    '1r.jt7.1c'   - объявление 25675, показанное в поколении 48
+
+Строки (районы, комнаты) в кнопки не кладутся - только номер варианта
+из списка, сохранённого при показе клавиатуры: длина не зависит от
+названий и всегда в пределах 64 байт Telegram. Кнопки старого формата
+(другая версия или незнакомое действие) распознаются при разборе.
+"""
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_VERSION = '1'
+MAX_CALLBACK_BYTES = 64
+
+# Коды действий (один символ)
+NOOP = 'n'
+BROWSE = 'b'
+PAGE = 'p'                      # (страница, поколение; 0 - личный список)
+RENTAL = 'r'                    # (id, поколение; 0 - не из снапшота)
+FAVORITE = 'f'                  # (id,)
+SIMILAR = 's'                   # (id,)
+SEARCH_PAGE = 'q'               # (страница,)
+BACK_TO_LIST = 'l'
+REFRESH_LIST = 'u'
+SHOW_NEW = 'w'
+SHOW_FAVORITES = 'h'
+CLEAR_FAVORITES = 'c'
+MULTI_FILTER_MENU = 'M'
+SEARCH_ADVANCED = 'A'
+SEARCH_KEYWORD = 'K'
+CANCEL_SEARCH = 'X'
+BACK_TO_FILTERS = 'B'
+CANCEL_MULTI_FILTER = 'Y'
+SET_PRICE_RANGE = 'P'
+SET_DISTRICT = 'D'
+SET_ROOMS = 'O'
+EXECUTE_MULTI_FILTER = 'E'
+DISTRICT = 'd'                  # (номер в filter_choices['district'],)
+ROOMS = 'o'                     # (номер в filter_choices['rooms'],)
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+Handler = Callable[..., Awaitable[None]]
+
+
+def _base36(number: int) -> str:
+    if number < 0:
+        raise ValueError(f"negative callback argument: {number}")
+    digits = ''
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _DIGITS[digit] + digits
+        if not number:
+            return digits
+
+
+def encode(action: str, *args: int) -> str:
+    """callback_data для действия action с целыми аргументами."""
+    data = CALLBACK_VERSION + action + ''.join('.' + _base36(arg) for arg in args)
+    if len(data.encode()) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data longer than {MAX_CALLBACK_BYTES} bytes: {data}")
+    return data
+
+
+def decode(data: Optional[str]) -> Optional[Tuple[str, Tuple[int, ...]]]:
+    """(действие, аргументы) или None - кнопка другого формата или версии."""
+    if not data or len(data) < 2 or data[0] != CALLBACK_VERSION:
+        return None
+    action, tail = data[1], data[2:]
+    if not tail:
+        return action, ()
+    if tail[0] != '.':
+        return None
+    try:
+        return action, tuple(int(part, 36) for part in tail[1:].split('.'))
+    except ValueError:
+        return None
+
+
+def pattern(action: str) -> str:
+    """Регулярное выражение для CallbackQueryHandler(pattern=...)."""
+    return f"^{re.escape(CALLBACK_VERSION + action)}(\\.|$)"
+
+
+class CallbackRouter:
+    """
+    Таблица действие -> (обработчик(update, context, *аргументы), число
+    аргументов): нажатие разбирается один раз и уходит в обработчик
+    поиском по словарю. Кнопки старого формата, незнакомые действия и
+    неверное число аргументов получают stale(update, context).
+    """
+
+    def __init__(self, stale: Handler):
+        self._routes: Dict[str, Tuple[Handler, int]] = {}
+        self._stale = stale
+
+    def route(self, action: str, args: int = 0) -> Callable[[Handler], Handler]:
+        """Декоратор: регистрирует обработчик действия с args аргументами."""
+        def register(handler: Handler) -> Handler:
+            if action in self._routes:
+                raise ValueError(f"callback action {action!r} already registered")
+            self._routes[action] = (handler, args)
+            return handler
+        return register
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        decoded = decode(update.callback_query.data)
+        route = self._routes.get(decoded[0]) if decoded else None
+        if route is None or len(decoded[1]) != route[1]:
+            logger.debug(f"Stale callback: {update.callback_query.data!r}")
+            await self._stale(update, context)
+            return
+        await route[0](update, context, *decoded[1])
@@ -0,0 +1,27 @@
+"""
+Общие фикстуры тестов: копия rentals.db во временном каталоге.
+
+Запуск: python -m pytest -q
+"""
+import shutil
+from pathlib import Path
+
+import pytest
+
+import database
+
+ROOT = Path(__file__).parent
+
+# Скрипты ручной отладки парсера ходят в сеть при импорте - не тесты
+collect_ignore = ['test_parser.py', 'debug_bazos.py']
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Копия rentals.db из репозитория; database работает с ней."""
+    path = tmp_path / 'rentals.db'
+    shutil.copy(ROOT / 'rentals.db', path)
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    monkeypatch.setattr(database, '_change_listeners', [])
+    database.init_db()
+    return path
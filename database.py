@@ -1,21 +1,166 @@
 import sqlite3
 import json
 import logging
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime
+from collections import Counter, defaultdict
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from fuzzy import levenshtein, max_edits, normalize, title_words, trigrams
+from geo import BRATISLAVA_PLACES, bounding_box, distance_km, geocode, parse_address
+from mmap_snapshot import MappedSnapshot, SnapshotFile, write_snapshot
+from models import (
+    Rental, RentalChange, RentalSummary, CHANGE_COLUMNS, RENTAL_COLUMNS, SUMMARY_COLUMNS,
+    change_row_factory, rental_row_factory, summary_row_factory,
+)
+from similarity import Listing, build_neighbors
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 DB_PATH = Path(__file__).parent / 'rentals.db'
 
+# Подписчики на изменения rentals (см. add_change_listener)
+_change_listeners: List[Callable] = []
+
+# Сколько опубликованных поколений снапшота хранится: текущее и предыдущее,
+# чтобы сессия листания, начатая до публикации, дочитала своё поколение
+SNAPSHOT_GENERATIONS = 2
+
+# Отображённый в память снапшот текущего поколения (см. mmap_snapshot.py)
+_mapped_snapshot = MappedSnapshot()
+
+# Поля объявления, изменения которых попадают в rental_changes (порядок -
+# как в values save_rentals)
+CHANGE_FIELDS = (
+    'name', 'price', 'district', 'address', 'rooms', 'size',
+    'description', 'source', 'available_from', 'image_url',
+)
+
+# Поля, от которых зависит market_stats (см. update_market_stats)
+MARKET_STATS_FIELDS = {'price', 'size', 'district', 'rooms'}
+
+# Колонки жизненного цикла, которых нет в старых БД (добавляются миграцией)
+LIFECYCLE_COLUMNS = {
+    'first_seen': 'TIMESTAMP',
+    'last_seen': 'TIMESTAMP',
+    'delisted_at': 'TIMESTAMP',
+    'missed_runs': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+def utc_now(ago: timedelta = timedelta()) -> str:
+    """Текущее время (или на ago раньше) в формате CURRENT_TIMESTAMP (UTC)."""
+    return (datetime.now(timezone.utc) - ago).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _migrate_lifecycle(cursor):
+    """Добавляет колонки жизненного цикла в старую таблицу rentals."""
+    cursor.execute('PRAGMA table_info(rentals)')
+    existing = {row[1] for row in cursor.fetchall()}
+    
+    for column, ddl in LIFECYCLE_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE rentals ADD COLUMN {column} {ddl}')
+    
+    if 'first_seen' not in existing:
+        # Для старых строк единственная известная дата - parsed_at
+        cursor.execute('''
+            UPDATE rentals SET first_seen = parsed_at, last_seen = parsed_at
+            WHERE first_seen IS NULL
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO price_history (rental_id, price, seen_at)
+            SELECT id, price, parsed_at FROM rentals
+        ''')
+        logger.info("✅ Migrated rentals table to lifecycle model")
+
+
+def _index_location(cursor, rental_id: int, rental) -> None:
+    """Геокодирует объявление и кладёт точку в rentals_geo."""
+    coords = geocode(rental['address'], rental['name'], rental['description'])
+    if coords is None:
+        cursor.execute('DELETE FROM rentals_geo WHERE rental_id = ?', (rental_id,))
+        return
+    lat, lon = coords
+    cursor.execute('''
+        INSERT OR REPLACE INTO rentals_geo (rental_id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (rental_id, lat, lat, lon, lon))
+
+
+def _backfill_geo(cursor):
+    """Геокодирует объявления, сохранённые до появления rentals_geo."""
+    cursor.execute('SELECT COUNT(*) FROM rentals_geo')
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute('SELECT id, name, address, description FROM rentals')
+    rows = cursor.fetchall()
+    for rental_id, name, address, description in rows:
+        _index_location(cursor, rental_id, {'name': name, 'address': address, 'description': description})
+    if rows:
+        logger.info(f"📍 Geocoded {len(rows)} existing rentals")
+
+
+def _rebuild_search_terms(cursor) -> int:
+    """Пересобирает словарь подсказок и триграммы из текущих объявлений."""
+    # (term, kind) -> Counter написаний; самое частое написание показывается
+    spellings: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+    
+    cursor.execute('SELECT name, district, address FROM rentals')
+    for name, district, address in cursor.fetchall():
+        if district and district != 'Slovensko':
+            spellings[(normalize(district), 'district')][district] += 1
+        town = parse_address(address)[0]
+        if town:
+            spellings[(normalize(town), 'town')][town] += 1
+        for word in title_words(name):
+            spellings[(normalize(word), 'word')][word.lower()] += 1
+    for place in BRATISLAVA_PLACES:
+        spellings[(normalize(place), 'place')][place] += 0
+    
+    cursor.execute('DELETE FROM term_trigrams')
+    cursor.execute('DELETE FROM search_terms')
+    for (term, kind), counter in spellings.items():
+        display, _ = counter.most_common(1)[0]
+        cursor.execute('''
+            INSERT INTO search_terms (term, kind, display, freq) VALUES (?, ?, ?, ?)
+        ''', (term, kind, display, sum(counter.values())))
+        term_id = cursor.lastrowid
+        cursor.executemany(
+            'INSERT INTO term_trigrams (trigram, term_id) VALUES (?, ?)',
+            [(gram, term_id) for gram in trigrams(term)]
+        )
+    return len(spellings)
+
+
+def _rebuild_neighbors(cursor) -> int:
+    """Пересобирает rental_neighbors (top-k похожих) по текущим объявлениям."""
+    cursor.execute('''
+        SELECT r.id, r.name, r.description, r.district, r.price, r.size, r.rooms, g.min_lat, g.min_lon
+        FROM rentals r LEFT JOIN rentals_geo g ON g.rental_id = r.id
+    ''')
+    listings = [
+        Listing(rental_id, f"{name} {description}", district, price or 0, size, rooms,
+                (lat, lon) if lat is not None else None)
+        for rental_id, name, description, district, price, size, rooms, lat, lon in cursor.fetchall()
+    ]
+    rows = build_neighbors(listings)
+    cursor.execute('DELETE FROM rental_neighbors')
+    cursor.executemany('''
+        INSERT INTO rental_neighbors (rental_id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)
+    ''', rows)
+    return len(listings)
+
 
 def init_db():
     """Инициализация базы данных."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # WAL: чтение не ждёт запись парсера и видит последнее закоммиченное состояние
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS rentals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,10 +175,53 @@ def init_db():
             source TEXT,
             available_from TEXT,
             image_url TEXT,
-            parsed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            parsed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            delisted_at TIMESTAMP,
+            missed_runs INTEGER NOT NULL DEFAULT 0
         )
     ''')
     
+    # История цен: одна строка на каждое изменение цены (append-only)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            rental_id INTEGER NOT NULL,
+            price INTEGER,
+            seen_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (rental_id, seen_at)
+        ) WITHOUT ROWID
+    ''')
+    
+    _migrate_lifecycle(cursor)
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentals_missed_runs ON rentals(missed_runs)')
+    # /new и счётчик новых на /start: диапазон по first_seen
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentals_first_seen ON rentals(first_seen)')
+    # Пересчёт market_stats по событиям: только затронутые районы и комнаты
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentals_district ON rentals(district)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentals_rooms ON rentals(rooms)')
+    
+    # Материализованная статистика рынка (пересчитывается после парсинга)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS market_stats (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER,
+            price_min INTEGER,
+            price_max INTEGER,
+            price_p25 INTEGER,
+            price_median INTEGER,
+            price_p75 INTEGER,
+            sqm_count INTEGER,
+            sqm_p25 REAL,
+            sqm_median REAL,
+            sqm_p75 REAL,
+            computed_at TIMESTAMP,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+    ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS parse_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -43,31 +231,338 @@ def init_db():
         )
     ''')
     
+    # Кэш изображений: url -> файл в кэше (по sha256) и file_id Telegram
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT,
+            size INTEGER NOT NULL DEFAULT 0,
+            last_access TIMESTAMP,
+            file_id TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_cache_sha256 ON image_cache(sha256)')
+
+    # Координаты объявлений (точка: min = max) - R*Tree для поиска по радиусу
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS rentals_geo USING rtree(
+            rental_id, min_lat, max_lat, min_lon, max_lon
+        )
+    ''')
+    _backfill_geo(cursor)
+
+    # Словарь подсказок (районы, города, части Братиславы, слова заголовков)
+    # и его триграммный индекс для поиска с опечатками
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_terms (
+            id INTEGER PRIMARY KEY,
+            term TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            display TEXT NOT NULL,
+            freq INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (term, kind)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS term_trigrams (
+            trigram TEXT NOT NULL,
+            term_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, term_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM search_terms')
+    if not cursor.fetchone()[0]:
+        _rebuild_search_terms(cursor)
+
+    # Похожие объявления: top-k соседей, пересчитываются после парсинга
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rental_neighbors (
+            rental_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (rental_id, rank)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM rental_neighbors')
+    if not cursor.fetchone()[0]:
+        _rebuild_neighbors(cursor)
+
+    # Служебные значения: snapshot_version растёт при каждом изменении rentals
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    # Опубликованные снапшоты списка: строки RentalSummary по поколениям.
+    # Парсер пишет в rentals, бот листает готовое поколение (см. publish_snapshot)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rentals_snapshot (
+            generation INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            name TEXT,
+            price INTEGER,
+            rooms TEXT,
+            district TEXT,
+            PRIMARY KEY (generation, position)
+        ) WITHOUT ROWID
+    ''')
+    if _published_generation(cursor) == 0:
+        _publish_snapshot(cursor)
+    generation = _published_generation(cursor)
+    mapped = get_mapped_snapshot()
+    snapshot_rows = None
+    if mapped is None or mapped.generation != generation:
+        snapshot_rows = _snapshot_file_rows(cursor, generation)
+
+    # Лента изменений rentals: seq только растёт (AUTOINCREMENT не переиспользует
+    # номера после удаления), потребители хранят свою позицию в change_consumers
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rental_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            rental_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            fields TEXT,
+            changed_at TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            updated_at TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+    # Данные бота (см. persistence.py): user_data в JSON и состояния диалогов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bot_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bot_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    ''')
+
     conn.commit()
     conn.close()
+    if snapshot_rows is not None:
+        write_snapshot(snapshot_path(), generation, snapshot_rows)
     logger.info("✅ Database initialized")
 
 
-def save_rentals(rentals: List[Dict]) -> int:
+def _bump_snapshot_version(cursor) -> None:
+    """Новая версия данных: кэши, завязанные на версию, становятся неактуальны."""
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES ('snapshot_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    ''')
+
+
+def _record_changes(cursor, events: List[Tuple[int, str, Optional[Dict]]], changed_at: str) -> None:
+    """Дописывает события (rental_id, op, fields) в rental_changes - в той же транзакции, что и изменение."""
+    cursor.executemany('''
+        INSERT INTO rental_changes (rental_id, op, fields, changed_at) VALUES (?, ?, ?, ?)
+    ''', [
+        (rental_id, op, json.dumps(fields, ensure_ascii=False, separators=(',', ':')) if fields else None, changed_at)
+        for rental_id, op, fields in events
+    ])
+
+
+def _changed_fields(old: Tuple, new: Tuple) -> Dict:
+    """{поле: [было, стало]} по CHANGE_FIELDS; описание не копируется (только отметка)."""
+    changed = {}
+    for field, before, after in zip(CHANGE_FIELDS, old, new):
+        if before != after:
+            changed[field] = None if field == 'description' else [before, after]
+    return changed
+
+
+def _published_generation(cursor) -> int:
+    cursor.execute("SELECT value FROM meta WHERE key = 'published_generation'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _publish_snapshot(cursor) -> int:
+    """
+    Копирует rentals (без снятых с публикации - delisted_at) в новое
+    поколение rentals_snapshot и переключает
+    published_generation. Всё в одной транзакции: читатели видят либо
+    старое поколение, либо новое целиком. Поколения старше
+    SNAPSHOT_GENERATIONS удаляются.
+    """
+    generation = _published_generation(cursor) + 1
+    cursor.execute(f'''
+        INSERT INTO rentals_snapshot (generation, position, {SUMMARY_COLUMNS})
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY parsed_at DESC, id DESC), {SUMMARY_COLUMNS}
+        FROM rentals WHERE delisted_at IS NULL
+    ''', (generation,))
+    cursor.execute('''
+        INSERT INTO meta (key, value) VALUES ('published_generation', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (generation,))
+    cursor.execute('DELETE FROM rentals_snapshot WHERE generation <= ?',
+                   (generation - SNAPSHOT_GENERATIONS,))
+    return generation
+
+
+def _snapshot_file_rows(cursor, generation: int) -> List[Tuple]:
+    """Строки поколения для бинарного снапшота: (id, name, price, size, rooms, district, address)."""
+    cursor.execute('''
+        SELECT s.id, s.name, s.price, r.size, s.rooms, s.district, r.address
+        FROM rentals_snapshot s LEFT JOIN rentals r ON r.id = s.id
+        WHERE s.generation = ?
+        ORDER BY s.position
+    ''', (generation,))
+    return cursor.fetchall()
+
+
+def snapshot_path() -> Path:
+    """Файл бинарного снапшота рядом с БД."""
+    return Path(DB_PATH).with_name('rentals.snapshot')
+
+
+def get_mapped_snapshot() -> Optional[SnapshotFile]:
+    """
+    Текущий бинарный снапшот, отображённый в память (один на процесс,
+    перемапливается после публикации). None - файла нет или он не читается,
+    тогда читатели идут в rentals_snapshot.
+    """
+    try:
+        return _mapped_snapshot.current(snapshot_path())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Snapshot file unavailable: {e}")
+        return None
+
+
+def add_change_listener(callback: Callable[[List[Tuple], List[Tuple]], None]) -> None:
+    """
+    Подписка на изменения rentals в этом процессе: callback(removed, added)
+    со списками (district, rooms, price, address), вызывается после commit.
+    """
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def _notify_change_listeners(removed: List[Tuple], added: List[Tuple]) -> None:
+    if not (removed or added):
+        return
+    for callback in _change_listeners:
+        try:
+            callback(removed, added)
+        except Exception as e:
+            logger.error(f"Change listener failed: {e}")
+
+
+def get_facet_rows() -> List[Tuple[str, str, int, str]]:
+    """(district, rooms, price, address) опубликованных объявлений - начальная загрузка фасетов."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT district, rooms, price, address FROM rentals WHERE delisted_at IS NULL')
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def publish_snapshot() -> int:
+    """
+    Публикует текущее содержимое rentals для бота (в конце парсинга):
+    новое поколение в rentals_snapshot и бинарный снапшот для mmap.
+    Файл пишется после коммита - поколение в нём всегда есть и в БД.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    generation = _publish_snapshot(cursor)
+    rows = _snapshot_file_rows(cursor, generation)
+    conn.commit()
+    conn.close()
+    size = write_snapshot(snapshot_path(), generation, rows)
+    logger.info(f"📦 Published snapshot generation {generation} ({size} bytes mapped)")
+    return generation
+
+
+def get_snapshot_generation(pinned: Optional[int] = None) -> int:
+    """
+    Поколение для чтения: pinned, если оно ещё хранится, иначе текущее
+    опубликованное (0 - снапшота ещё нет). Текущее поколение берётся из
+    отображённого файла, без запроса к БД.
+    """
+    mapped = get_mapped_snapshot()
+    if mapped is not None and (pinned is None or pinned == mapped.generation):
+        return mapped.generation
+    
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    published = _published_generation(cursor)
+    conn.close()
+    if pinned is not None and published - SNAPSHOT_GENERATIONS < pinned <= published:
+        return pinned
+    return published
+
+
+def get_snapshot_rentals(generation: int) -> List[RentalSummary]:
+    """Список поколения generation в порядке публикации (новые сверху)."""
+    mapped = get_mapped_snapshot()
+    if mapped is not None and mapped.generation == generation:
+        return mapped.rentals()
+    
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = summary_row_factory
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {SUMMARY_COLUMNS} FROM rentals_snapshot
+        WHERE generation = ?
+        ORDER BY position
+    ''', (generation,))
+    rentals = cursor.fetchall()
+    conn.close()
+    
+    return rentals
+
+
+def save_rentals(rentals: List[Rental], sources: Optional[List[str]] = None) -> int:
     """
-    Сохраняет объявления в БД.
-    Обновляет существующие по URL, добавляет новые.
+    Сохраняет результат одного прогона парсера в БД.
+    
+    Существующие объявления (по URL) обновляются и получают новый last_seen,
+    новые добавляются с first_seen. В price_history пишется строка только
+    при первом появлении и при изменении цены. Объявления, которых не было
+    в этом прогоне, получают missed_runs + 1 и отметку delisted_at.
+    sources - источники, отработавшие в этом прогоне: пропуски считаются
+    только для них (по умолчанию - источники из rentals).
     Возвращает количество добавленных объявлений.
     """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    run_at = utc_now()
+    
+    # url -> (id, значения CHANGE_FIELDS, delisted_at) одним запросом вместо поиска на каждую строку
+    cursor.execute(f"SELECT url, id, {', '.join(CHANGE_FIELDS)}, delisted_at FROM rentals")
+    known = {row[0]: (row[1], row[2:-1], row[-1]) for row in cursor.fetchall()}
+    
+    # Дельты для подписчиков: (district, rooms, price) до и после
+    removed, added = [], []
+    # События ленты изменений: (rental_id, op, fields)
+    events = []
     added_count = 0
     updated_count = 0
+    price_changes = 0
     
     for rental in rentals:
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO rentals 
-                (name, price, district, address, rooms, size, description, 
-                 url, source, available_from, image_url, parsed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (
+            values = (
                 rental['name'],
                 rental['price'],
                 rental['district'],
@@ -75,23 +570,95 @@ def save_rentals(rentals: List[Dict]) -> int:
                 rental['rooms'],
                 rental['size'],
                 rental['description'],
-                rental['url'],
                 rental['source'],
                 rental['available_from'],
-                rental['image_url']
-            ))
+                rental['image_url'],
+            )
             
-            if cursor.rowcount > 0:
+            if rental['url'] in known:
+                rental_id, old_values, delisted_at = known[rental['url']]
+                old_price, old_district, old_address, old_rooms = old_values[1:5]
+                cursor.execute('''
+                    UPDATE rentals SET
+                        name = ?, price = ?, district = ?, address = ?, rooms = ?,
+                        size = ?, description = ?, source = ?, available_from = ?,
+                        image_url = ?, parsed_at = ?, last_seen = ?,
+                        delisted_at = NULL, missed_runs = 0
+                    WHERE id = ?
+                ''', values + (run_at, run_at, rental_id))
+                _index_location(cursor, rental_id, rental)
+                updated_count += 1
+                
+                changed = _changed_fields(old_values, values)
+                if delisted_at is not None:
+                    changed['delisted_at'] = [delisted_at, None]
+                if changed:
+                    events.append((rental_id, 'update', changed))
+                
+                old_facet = (old_district, old_rooms, old_price, old_address)
+                new_facet = (rental['district'], rental['rooms'], rental['price'], rental['address'])
+                if delisted_at is not None:
+                    # Снова в выдаче: из фасетов он ушёл при снятии
+                    added.append(new_facet)
+                elif new_facet != old_facet:
+                    removed.append(old_facet)
+                    added.append(new_facet)
+                
+                if rental['price'] == old_price:
+                    continue
+                price_changes += 1
+            else:
+                cursor.execute('''
+                    INSERT INTO rentals 
+                    (name, price, district, address, rooms, size, description, 
+                     source, available_from, image_url, url,
+                     parsed_at, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', values + (rental['url'], run_at, run_at, run_at))
+                rental_id = cursor.lastrowid
+                _index_location(cursor, rental_id, rental)
                 added_count += 1
-        except sqlite3.IntegrityError:
-            updated_count += 1
+                added.append((rental['district'], rental['rooms'], rental['price'], rental['address']))
+                events.append((rental_id, 'insert', {
+                    'district': rental['district'], 'rooms': rental['rooms'], 'price': rental['price'],
+                }))
+            
+            known[rental['url']] = (rental_id, values, None)
+            cursor.execute('''
+                INSERT OR REPLACE INTO price_history (rental_id, price, seen_at)
+                VALUES (?, ?, ?)
+            ''', (rental_id, rental['price'], run_at))
         except Exception as e:
             logger.error(f"Error saving rental {rental.get('name', 'Unknown')}: {e}")
     
+    # Всё, что не встретилось в этом прогоне, считается пропущенным
+    if sources is None:
+        sources = sorted({rental['source'] for rental in rentals})
+    placeholders = ','.join('?' * len(sources))
+    cursor.execute(f'''
+        UPDATE rentals
+        SET missed_runs = missed_runs + 1, delisted_at = COALESCE(delisted_at, ?)
+        WHERE last_seen < ? AND source IN ({placeholders})
+        RETURNING id, missed_runs, district, rooms, price, address
+    ''', (run_at, run_at, *sources))
+    missed = cursor.fetchall()
+    missed_count = len(missed)
+    # Снятие с публикации - событие только в первом пропущенном прогоне;
+    # снятые сразу пропадают из выдачи, а значит и из фасетов
+    delisted = [row for row in missed if row[1] == 1]
+    events.extend((row[0], 'update', {'delisted_at': [None, run_at]}) for row in delisted)
+    removed.extend(row[2:] for row in delisted)
+    
+    _record_changes(cursor, events, run_at)
+    _bump_snapshot_version(cursor)
     conn.commit()
     conn.close()
+    _notify_change_listeners(removed, added)
     
-    logger.info(f"📊 Saved: {added_count} new, {updated_count} updated rentals")
+    logger.info(
+        f"📊 Saved: {added_count} new, {updated_count} updated rentals "
+        f"({price_changes} price changes, {missed_count} not seen)"
+    )
     return added_count
 
 
@@ -110,76 +677,164 @@ def log_parse(count: int, status: str = "success"):
     logger.info(f"✅ Parse log: {count} rentals, status={status}")
 
 
-def get_all_rentals() -> List[Dict]:
-    """Получает все объявления из БД."""
+def get_all_rentals() -> List[RentalSummary]:
+    """Получает все опубликованные объявления из БД (короткие записи для списков)."""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn.row_factory = summary_row_factory
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM rentals ORDER BY parsed_at DESC')
-    rentals = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(f'SELECT {SUMMARY_COLUMNS} FROM rentals WHERE delisted_at IS NULL ORDER BY parsed_at DESC')
+    rentals = cursor.fetchall()
     
     conn.close()
     return rentals
 
 
-def search_rentals_db(search_type: str, value) -> List[Dict]:
+def get_rentals_by_ids(ids: Iterable[int]) -> List[RentalSummary]:
+    """
+    Короткие записи по id (избранное) в порядке ids - выборка по первичному
+    ключу вместо чтения всей таблицы. Несуществующие id пропускаются;
+    снятые с публикации остаются, пока их не удалит expire_rentals.
+    """
+    ids = list(dict.fromkeys(ids))
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = summary_row_factory
+    cursor = conn.cursor()
+    
+    found = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cursor.execute(f'SELECT {SUMMARY_COLUMNS} FROM rentals WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+        found.update((rental.id, rental) for rental in cursor.fetchall())
+    
+    conn.close()
+    return [found[rental_id] for rental_id in ids if rental_id in found]
+
+
+def count_new_rentals(since: str, after_id: int = 0) -> int:
+    """Сколько объявлений новее отметки (since, after_id) - см. get_new_rentals."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) FROM rentals
+        WHERE first_seen >= ? AND (first_seen > ? OR id > ?) AND delisted_at IS NULL
+    ''', (since, since, after_id))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+def get_new_rentals(
+    since: str, after_id: int = 0, limit: int = 200
+) -> Tuple[List[RentalSummary], Optional[Tuple[str, int]], bool]:
+    """
+    Объявления новее отметки (since, after_id), старые сверху - диапазон
+    по индексу first_seen, без просмотра всей таблицы.
+    
+    Один парсинг даёт многим объявлениям одинаковый first_seen, поэтому
+    отметка - пара (first_seen, id) последнего отданного: следующий вызов
+    продолжает ровно с него, даже если лимит разрезал такую группу.
+    Возвращает (объявления, отметка последнего или None, есть ли ещё).
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {SUMMARY_COLUMNS}, first_seen FROM rentals
+        WHERE first_seen >= ? AND (first_seen > ? OR id > ?) AND delisted_at IS NULL
+        ORDER BY first_seen, id
+        LIMIT ?
+    ''', (since, since, after_id, limit + 1))
+    rows = cursor.fetchall()
+    conn.close()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    rentals = [RentalSummary(*row[:-1]) for row in rows]
+    watermark = (rows[-1][-1], rentals[-1].id) if rows else None
+    return rentals, watermark, more
+
+
+def search_rentals_db(search_type: str, value) -> List[RentalSummary]:
     """Поиск объявлений в БД."""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn.row_factory = summary_row_factory
     cursor = conn.cursor()
     
     if search_type == 'price':
         min_price, max_price = value
-        cursor.execute('''
-            SELECT * FROM rentals 
-            WHERE price > 0 AND price >= ? AND price <= ?
+        cursor.execute(f'''
+            SELECT {SUMMARY_COLUMNS} FROM rentals 
+            WHERE price > 0 AND price >= ? AND price <= ? AND delisted_at IS NULL
             ORDER BY price ASC
         ''', (min_price, max_price))
     
     elif search_type == 'district':
         district = value.lower()
-        cursor.execute('''
-            SELECT * FROM rentals 
-            WHERE LOWER(district) LIKE ? OR LOWER(address) LIKE ?
+        cursor.execute(f'''
+            SELECT {SUMMARY_COLUMNS} FROM rentals 
+            WHERE (LOWER(district) LIKE ? OR LOWER(address) LIKE ?) AND delisted_at IS NULL
             ORDER BY parsed_at DESC
         ''', (f'%{district}%', f'%{district}%'))
     
     elif search_type == 'keyword':
         keyword = value.lower()
-        cursor.execute('''
-            SELECT * FROM rentals 
-            WHERE LOWER(name) LIKE ? OR LOWER(description) LIKE ?
+        cursor.execute(f'''
+            SELECT {SUMMARY_COLUMNS} FROM rentals 
+            WHERE (LOWER(name) LIKE ? OR LOWER(description) LIKE ?) AND delisted_at IS NULL
             ORDER BY parsed_at DESC
         ''', (f'%{keyword}%', f'%{keyword}%'))
     
     else:
-        cursor.execute('SELECT * FROM rentals ORDER BY parsed_at DESC')
+        cursor.execute(f'SELECT {SUMMARY_COLUMNS} FROM rentals WHERE delisted_at IS NULL ORDER BY parsed_at DESC')
     
-    rentals = [dict(row) for row in cursor.fetchall()]
+    rentals = cursor.fetchall()
     conn.close()
     
     return rentals
 
 
-def search_rentals_advanced(filters: Dict) -> List[Dict]:
+def advanced_query(filters: Dict, columns: str, after: Optional[Tuple] = None,
+                   with_sort_key: bool = False) -> Tuple[str, List]:
     """
-    Поиск с несколькими фильтрами одновременно.
+    SQL и параметры для фильтров search_rentals_advanced (соединению нужна
+    функция geo_distance).
     
-    filters = {
-        'min_price': 300,
-        'max_price': 800,
-        'district': 'Bratislava',
-        'keyword': 'balkon'
-    }
+    Порядок всегда однозначный - ключ сортировки и id. with_sort_key
+    добавляет ключ последней колонкой; after = (ключ, id) последней строки
+    предыдущей страницы - keyset-пагинация без OFFSET.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    near = filters.get('near')
+    if near:
+        sort_key, sort_params, direction = 'geo_distance(g.min_lat, g.min_lon, ?, ?)', list(near[:2]), 'ASC'
+    elif 'min_price' in filters:
+        sort_key, sort_params, direction = 'price', [], 'ASC'
+    else:
+        sort_key, sort_params, direction = 'parsed_at', [], 'DESC'
     
     # Строим SQL запрос динамически
-    query = 'SELECT * FROM rentals WHERE 1=1'
+    query = f'SELECT {columns} FROM rentals'
     params = []
+    if with_sort_key:
+        query = f'SELECT {columns}, {sort_key} FROM rentals'
+        params.extend(sort_params)
+    
+    # Фильтр по координатам: прямоугольник отбирается по R*Tree,
+    # радиус уточняется точным расстоянием
+    bbox = filters.get('bbox')
+    if near:
+        bbox = bounding_box(near[0], near[1], filters.get('radius_km', 3))
+    if bbox:
+        query += '''
+            JOIN rentals_geo g ON g.rental_id = rentals.id
+            WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+        '''
+        params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    else:
+        query += ' WHERE 1=1'
+    # Снятые с публикации (не найдены в последнем прогоне) не показываются
+    query += ' AND rentals.delisted_at IS NULL'
+    if near:
+        query += ' AND geo_distance(g.min_lat, g.min_lon, ?, ?) <= ?'
+        params.extend([near[0], near[1], filters.get('radius_km', 3)])
     
     # Фильтр по цене
     if 'min_price' in filters and filters['min_price'] > 0:
@@ -191,27 +846,200 @@ def search_rentals_advanced(filters: Dict) -> List[Dict]:
         params.append(filters['max_price'])
     
     # Фильтр по локации
+    # (LIKE сам не различает регистр ASCII; LOWER() в SQLite не понимает
+    # "Ž"/"Č", и LOWER(district) LIKE '%žilina%' не находил Žilinu)
     if 'district' in filters and filters['district']:
-        query += ' AND (LOWER(district) LIKE ? OR LOWER(address) LIKE ?)'
-        district_pattern = f"%{filters['district'].lower()}%"
+        query += ' AND (district LIKE ? OR address LIKE ?)'
+        district_pattern = f"%{filters['district']}%"
         params.extend([district_pattern, district_pattern])
     
+    # Фильтр по количеству комнат (значение как в колонке rooms: '2-izbový')
+    if filters.get('rooms'):
+        query += ' AND rooms = ?'
+        params.append(filters['rooms'])
+    
     # Фильтр по ключевому слову
     if 'keyword' in filters and filters['keyword']:
         query += ' AND (LOWER(name) LIKE ? OR LOWER(description) LIKE ?)'
         keyword_pattern = f"%{filters['keyword'].lower()}%"
         params.extend([keyword_pattern, keyword_pattern])
     
+    # Продолжение после строки (ключ, id) предыдущей страницы
+    if after is not None:
+        query += f" AND ({sort_key}, rentals.id) {'>' if direction == 'ASC' else '<'} (?, ?)"
+        params.extend(sort_params + list(after))
+    
     # Сортировка
-    query += ' ORDER BY price ASC' if 'min_price' in filters else ' ORDER BY parsed_at DESC'
+    query += f' ORDER BY {sort_key} {direction}, rentals.id {direction}'
+    params.extend(sort_params)
+    
+    return query, params
+
+
+def search_rentals_advanced(filters: Dict) -> List[RentalSummary]:
+    """
+    Поиск с несколькими фильтрами одновременно.
+    
+    filters = {
+        'min_price': 300,
+        'max_price': 800,
+        'district': 'Bratislava',
+        'keyword': 'balkon',
+        'rooms': '2-izbový',
+        'near': (48.1334, 17.1082),   # точка (lat, lon) ...
+        'radius_km': 3,               # ... и радиус; сортировка по расстоянию
+        'bbox': (48.10, 17.05, 48.20, 17.20),  # или прямоугольник min_lat, min_lon, max_lat, max_lon
+    }
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = summary_row_factory
+    conn.create_function('geo_distance', 4, distance_km, deterministic=True)
+    cursor = conn.cursor()
     
+    query, params = advanced_query(filters, SUMMARY_COLUMNS)
     cursor.execute(query, params)
-    rentals = [dict(row) for row in cursor.fetchall()]
+    rentals = cursor.fetchall()
     conn.close()
     
     return rentals
 
 
+def iter_rentals_advanced(filters: Dict, columns: Tuple[str, ...], limit: int,
+                          batch_size: int = 500) -> Iterator[Tuple]:
+    """
+    Те же фильтры, что search_rentals_advanced, но строки колонок columns
+    отдаются по мере чтения курсора (fetchmany), не больше limit, - память
+    не зависит от размера выборки. Соединение закрывается по исчерпании
+    или при close() генератора.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.create_function('geo_distance', 4, distance_km, deterministic=True)
+    try:
+        query, params = advanced_query(filters, ', '.join(f'rentals.{c}' for c in columns))
+        cursor = conn.execute(query + ' LIMIT ?', params + [limit])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def refresh_search_terms() -> int:
+    """Пересобирает словарь подсказок (после каждого парсинга)."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    count = _rebuild_search_terms(cursor)
+    conn.commit()
+    conn.close()
+    logger.info(f"🔤 Search terms rebuilt: {count} terms")
+    return count
+
+
+def suggest_terms(text: str, kinds: Optional[Tuple[str, ...]] = None,
+                  limit: int = 5) -> List[Tuple[str, str, int]]:
+    """
+    Ближайшие к вводу пользователя термины: [(написание, вид, опечаток)].
+    
+    Ввод без диакритики и с опечатками ("petrzalka", "ruzinof", "balkom").
+    Кандидаты отбираются одним запросом по индексу триграмм (сколько
+    триграмм общих), точное расстояние Левенштейна считается только для них.
+    kinds - 'district', 'town', 'place', 'word'.
+    """
+    term = normalize(text)
+    if not term:
+        return []
+    grams = sorted(trigrams(term))
+    
+    query = f'''
+        SELECT s.term, s.display, s.kind, s.freq, COUNT(*) AS shared
+        FROM term_trigrams g JOIN search_terms s ON s.id = g.term_id
+        WHERE g.trigram IN ({','.join('?' * len(grams))})
+    '''
+    params = list(grams)
+    if kinds:
+        query += f" AND s.kind IN ({','.join('?' * len(kinds))})"
+        params.extend(kinds)
+    query += ' GROUP BY s.id ORDER BY shared DESC, s.freq DESC LIMIT 50'
+    
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    candidates = cursor.fetchall()
+    conn.close()
+    
+    limit_edits = max_edits(term)
+    matches = []
+    for candidate, display, kind, freq, _ in candidates:
+        distance = levenshtein(term, candidate, limit_edits)
+        if distance <= limit_edits:
+            matches.append((distance, -freq, display, kind))
+    matches.sort()
+    return [(display, kind, distance) for distance, _, display, kind in matches[:limit]]
+
+
+def refresh_similar_rentals() -> int:
+    """Пересобирает индекс похожих объявлений (после каждого парсинга)."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    count = _rebuild_neighbors(cursor)
+    conn.commit()
+    conn.close()
+    logger.info(f"🔁 Similar rentals rebuilt for {count} rentals")
+    return count
+
+
+def get_similar_rentals(rental_id: int) -> List[RentalSummary]:
+    """Похожие объявления из rental_neighbors - один запрос по первичному ключу."""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = summary_row_factory
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {SUMMARY_COLUMNS}
+        FROM rental_neighbors n JOIN rentals ON rentals.id = n.neighbor_id
+        WHERE n.rental_id = ? AND rentals.delisted_at IS NULL
+        ORDER BY n.rank
+    ''', (rental_id,))
+    rentals = cursor.fetchall()
+    conn.close()
+    
+    return rentals
+
+
+def get_nearest_rentals(lat: float, lon: float, limit: int = 10,
+                        max_radius_km: float = 100) -> List[Tuple[RentalSummary, float]]:
+    """
+    Ближайшие к точке объявления с расстоянием в км.
+    
+    Окно поиска по R*Tree удваивается (2, 4, 8... км), пока не наберётся
+    limit объявлений, - в плотном городе читается только ближайший квадрат.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.create_function('geo_distance', 4, distance_km, deterministic=True)
+    cursor = conn.cursor()
+    
+    radius = 2.0
+    while True:
+        radius = min(radius, max_radius_km)
+        min_lat, min_lon, max_lat, max_lon = bounding_box(lat, lon, radius)
+        cursor.execute(f'''
+            SELECT {SUMMARY_COLUMNS}, geo_distance(g.min_lat, g.min_lon, ?, ?) AS distance
+            FROM rentals JOIN rentals_geo g ON g.rental_id = rentals.id
+            WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?
+              AND distance <= ? AND rentals.delisted_at IS NULL
+            ORDER BY distance
+            LIMIT ?
+        ''', (lat, lon, min_lat, max_lat, min_lon, max_lon, radius, limit))
+        rows = cursor.fetchall()
+        if len(rows) >= limit or radius >= max_radius_km:
+            break
+        radius *= 2
+    
+    conn.close()
+    return [(RentalSummary(*row[:-1]), row[-1]) for row in rows]
+
+
 def get_districts_db() -> List[str]:
     """Получает список всех районов из БД."""
     conn = sqlite3.connect(DB_PATH)
@@ -219,7 +1047,7 @@ def get_districts_db() -> List[str]:
     
     cursor.execute('''
         SELECT DISTINCT district FROM rentals 
-        WHERE district IS NOT NULL AND district != 'Slovensko'
+        WHERE district IS NOT NULL AND district != 'Slovensko' AND delisted_at IS NULL
         ORDER BY district
     ''')
     
@@ -230,7 +1058,11 @@ def get_districts_db() -> List[str]:
 
 
 def get_price_range_db() -> Tuple[int, int]:
-    """Получает диапазон цен из БД."""
+    """Получает диапазон цен из БД (из market_stats, если она уже посчитана)."""
+    stats = get_market_stats('all')
+    if stats:
+        return (stats['price_min'], stats['price_max'])
+    
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
@@ -247,10 +1079,172 @@ def get_price_range_db() -> Tuple[int, int]:
     return (0, 0)
 
 
-def get_rental_by_index(index: int) -> Optional[Dict]:
+def _percentile(values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией по отсортированному списку."""
+    pos = (len(values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def _market_groups(rows: Iterable[Tuple[str, str, int, str]],
+                   only: Optional[Set[Tuple[str, str]]] = None) -> Dict[Tuple[str, str], Tuple[List[int], List[float]]]:
+    """(district, rooms, price, size) -> {(scope, key): ([цены], [цены за м²])}; only - только эти группы."""
+    groups: Dict[Tuple[str, str], Tuple[List[int], List[float]]] = {}
+    for district, rooms, price, size in rows:
+        sqm = price / int(size) if size and size.isdigit() and int(size) > 0 else None
+        for group in (('all', ''), ('district', district), ('rooms', rooms)):
+            if group[1] is None or (only is not None and group not in only):
+                continue
+            prices, sqm_prices = groups.setdefault(group, ([], []))
+            prices.append(price)
+            if sqm is not None:
+                sqm_prices.append(sqm)
+    return groups
+
+
+def _market_stats_rows(groups: Dict[Tuple[str, str], Tuple[List[int], List[float]]],
+                       computed_at: str) -> List[Tuple]:
+    """Группы -> строки market_stats: count, min/max, квартили цены и цены за м²."""
+    rows = []
+    for (scope, key), (prices, sqm_prices) in groups.items():
+        prices.sort()
+        sqm_prices.sort()
+        sqm_quartiles = (
+            [round(_percentile(sqm_prices, q), 1) for q in (0.25, 0.5, 0.75)]
+            if sqm_prices else [None, None, None]
+        )
+        rows.append((
+            scope, key, len(prices), prices[0], prices[-1],
+            round(_percentile(prices, 0.25)),
+            round(_percentile(prices, 0.5)),
+            round(_percentile(prices, 0.75)),
+            len(sqm_prices), *sqm_quartiles, computed_at,
+        ))
+    return rows
+
+
+def refresh_market_stats() -> int:
+    """
+    Пересчитывает market_stats за один проход по rentals.
+    
+    Агрегаты считаются для всего рынка (scope='all'), по районам
+    (scope='district') и по количеству комнат (scope='rooms'):
+    count, min/max, p25/медиана/p75 цены и цены за м².
+    Возвращает количество записанных групп.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT district, rooms, price, size FROM rentals WHERE price > 0')
+    rows = _market_stats_rows(_market_groups(cursor), utc_now())
+    
+    cursor.execute('DELETE FROM market_stats')
+    cursor.executemany('''
+        INSERT INTO market_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    
+    logger.info(f"📈 Market stats refreshed: {len(rows)} groups")
+    return len(rows)
+
+
+def update_market_stats(changes: List[RentalChange]) -> int:
+    """
+    Обновляет market_stats по событиям ленты изменений: пересчитываются
+    только группы, которых коснулись события (район и комнаты до и после,
+    плюс 'all'), по индексам rentals(district) и rentals(rooms). Повторная
+    обработка тех же событий ничего не меняет. Возвращает число
+    пересчитанных групп.
+    """
+    groups: Set[Tuple[str, str]] = set()
+    updated_ids = set()
+    for change in changes:
+        fields = change.fields or {}
+        if change.op in ('insert', 'delete'):
+            groups.update({('district', fields.get('district')), ('rooms', fields.get('rooms'))})
+        elif MARKET_STATS_FIELDS & fields.keys():
+            updated_ids.add(change.rental_id)
+            for scope in ('district', 'rooms'):
+                groups.update((scope, value) for value in fields.get(scope, ()))
+    
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    # Изменилась цена или размер: группы - текущие район и комнаты объявления
+    ids = list(updated_ids)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cursor.execute(f'SELECT district, rooms FROM rentals WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+        for district, rooms in cursor.fetchall():
+            groups.update({('district', district), ('rooms', rooms)})
+    groups = {group for group in groups if group[1] is not None}
+    if not groups:
+        conn.close()
+        return 0
+    groups.add(('all', ''))
+    
+    computed = {}
+    for scope, key in groups:
+        if scope == 'all':
+            cursor.execute('SELECT district, rooms, price, size FROM rentals WHERE price > 0')
+        else:
+            cursor.execute(f'SELECT district, rooms, price, size FROM rentals WHERE {scope} = ? AND price > 0', (key,))
+        computed.update(_market_groups(cursor, only={(scope, key)}))
+    
+    # Группы, в которых не осталось объявлений с ценой, удаляются
+    cursor.executemany('DELETE FROM market_stats WHERE scope = ? AND key = ?', list(groups - computed.keys()))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO market_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _market_stats_rows(computed, utc_now()))
+    conn.commit()
+    conn.close()
+    
+    logger.info(f"📈 Market stats updated: {len(groups)} groups from {len(changes)} changes")
+    return len(groups)
+
+
+def get_market_stats(scope: str, key: str = '') -> Optional[Dict]:
+    """
+    Возвращает готовую статистику группы из market_stats.
+    scope: 'all', 'district' или 'rooms'.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT * FROM market_stats WHERE scope = ? AND key = ?
+    ''', (scope, key))
+    
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def get_rental_by_index(index: int) -> Optional[Rental]:
     """Получает объявление по индексу."""
     rentals = get_all_rentals()
-    return rentals[index] if 0 <= index < len(rentals) else None
+    return get_rental_by_id(rentals[index].id) if 0 <= index < len(rentals) else None
+
+
+def get_rental_by_id(rental_id: int) -> Optional[Rental]:
+    """Получает полное объявление (с описанием) по id."""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = rental_row_factory
+    cursor = conn.cursor()
+    
+    cursor.execute(f'SELECT {RENTAL_COLUMNS} FROM rentals WHERE id = ?', (rental_id,))
+    rental = cursor.fetchone()
+    
+    conn.close()
+    return rental
+
+
+def _delete_event(row: Tuple) -> Tuple[int, str, Dict]:
+    """(id, district, rooms, price, address, delisted_at) из DELETE ... RETURNING -> событие delete."""
+    rental_id, district, rooms, price = row[:4]
+    return rental_id, 'delete', {'district': district, 'rooms': rooms, 'price': price}
 
 
 def clear_old_rentals(days: int = 7):
@@ -261,16 +1255,190 @@ def clear_old_rentals(days: int = 7):
     cursor.execute('''
         DELETE FROM rentals 
         WHERE datetime(parsed_at) < datetime('now', '-' || ? || ' days')
+        RETURNING id, district, rooms, price, address, delisted_at
     ''', (days,))
     
-    deleted = cursor.rowcount
+    rows = cursor.fetchall()
+    # Снятые с публикации уже ушли из фасетов при снятии
+    removed = [row[1:5] for row in rows if row[5] is None]
+    deleted = len(rows)
+    _record_changes(cursor, [_delete_event(row) for row in rows], utc_now())
+    cursor.execute('''
+        DELETE FROM price_history
+        WHERE rental_id NOT IN (SELECT id FROM rentals)
+    ''')
+    cursor.execute('DELETE FROM rentals_geo WHERE rental_id NOT IN (SELECT id FROM rentals)')
+    if deleted:
+        _bump_snapshot_version(cursor)
     conn.commit()
     conn.close()
+    _notify_change_listeners(removed, [])
     
     logger.info(f"🗑️ Deleted {deleted} old rentals (older than {days} days)")
     return deleted
 
 
+def expire_rentals(max_missed_runs: int = 3, batch_size: int = 500) -> int:
+    """
+    Удаляет объявления, которых не было в N последних прогонах подряд.
+    
+    Удаление идёт пачками по индексу missed_runs, чтобы не держать
+    длинную блокировку на большой таблице. Вместе с объявлением
+    удаляется и его история цен.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    deleted = 0
+    while True:
+        cursor.execute('''
+            SELECT id FROM rentals WHERE missed_runs >= ? LIMIT ?
+        ''', (max_missed_runs, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            break
+        
+        placeholders = ','.join('?' * len(ids))
+        cursor.execute(f'DELETE FROM price_history WHERE rental_id IN ({placeholders})', ids)
+        cursor.execute(f'DELETE FROM rentals_geo WHERE rental_id IN ({placeholders})', ids)
+        cursor.execute(f'''
+            DELETE FROM rentals WHERE id IN ({placeholders})
+            RETURNING id, district, rooms, price, address, delisted_at
+        ''', ids)
+        rows = cursor.fetchall()
+        removed = [row[1:5] for row in rows if row[5] is None]
+        _record_changes(cursor, [_delete_event(row) for row in rows], utc_now())
+        _bump_snapshot_version(cursor)
+        conn.commit()
+        _notify_change_listeners(removed, [])
+        deleted += len(ids)
+    
+    conn.close()
+    
+    logger.info(f"🗑️ Expired {deleted} rentals (not seen in {max_missed_runs} runs)")
+    return deleted
+
+
+def get_change_head() -> int:
+    """Номер последнего события ленты изменений (0 - событий ещё не было)."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'rental_changes'")
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def read_changes(consumer: str, limit: int = 1000) -> List[RentalChange]:
+    """
+    Следующие события для потребителя consumer (после его позиции), не
+    больше limit. Позиция не двигается, пока потребитель не вызовет
+    ack_changes с seq последнего обработанного события - при сбое между
+    чтением и ack события придут ещё раз (at-least-once).
+    
+    Новый потребитель начинает с самого старого хранимого события; если
+    ему нужна вся таблица, он сначала читает rentals, затем
+    ack_changes(consumer, get_change_head()), снятой до чтения.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = change_row_factory
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {CHANGE_COLUMNS} FROM rental_changes
+        WHERE seq > COALESCE((SELECT position FROM change_consumers WHERE name = ?), 0)
+        ORDER BY seq LIMIT ?
+    ''', (consumer, limit))
+    changes = cursor.fetchall()
+    conn.close()
+    return changes
+
+
+def ack_changes(consumer: str, seq: int) -> None:
+    """Потребитель обработал события до seq включительно (позиция только растёт)."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO change_consumers (name, position, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            position = MAX(position, excluded.position), updated_at = excluded.updated_at
+    ''', (consumer, seq, utc_now()))
+    conn.commit()
+    conn.close()
+
+
+def get_change_positions() -> Dict[str, int]:
+    """Позиции всех потребителей ленты: {имя: seq последнего обработанного}."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, position FROM change_consumers')
+    positions = dict(cursor.fetchall())
+    conn.close()
+    return positions
+
+
+def compact_changes() -> int:
+    """
+    Удаляет события, которые обработали все зарегистрированные потребители
+    (без потребителей лента не чистится). Возвращает количество удалённых.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        DELETE FROM rental_changes
+        WHERE seq <= (SELECT MIN(position) FROM change_consumers)
+    ''')
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if deleted:
+        logger.info(f"🧹 Compacted {deleted} change events")
+    return deleted
+
+
+def get_price_history(rental_id: int) -> List[Tuple[str, int]]:
+    """Возвращает историю цен объявления: [(seen_at, price), ...]."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT seen_at, price FROM price_history
+        WHERE rental_id = ?
+        ORDER BY seen_at
+    ''', (rental_id,))
+    
+    history = cursor.fetchall()
+    conn.close()
+    return history
+
+
+def get_price_drops(limit: int = 20) -> List[Dict]:
+    """
+    Объявления, у которых последняя цена ниже предыдущей.
+    Возвращает строки rentals с дополнительным полем old_price.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT r.*, h.prev_price AS old_price
+        FROM (
+            SELECT rental_id, price,
+                   LAG(price) OVER (PARTITION BY rental_id ORDER BY seen_at) AS prev_price,
+                   ROW_NUMBER() OVER (PARTITION BY rental_id ORDER BY seen_at DESC) AS rn
+            FROM price_history
+        ) h
+        JOIN rentals r ON r.id = h.rental_id
+        WHERE h.rn = 1 AND h.price > 0 AND h.prev_price > h.price
+        ORDER BY (h.prev_price - h.price) DESC
+        LIMIT ?
+    ''', (limit,))
+    
+    drops = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return drops
+
+
 def get_last_parse_time() -> Optional[datetime]:
     """Получает время последнего парсинга."""
     conn = sqlite3.connect(DB_PATH)
@@ -290,11 +1458,11 @@ def get_last_parse_time() -> Optional[datetime]:
 
 
 def get_rental_count() -> int:
-    """Возвращает общее количество объявлений в БД."""
+    """Возвращает количество опубликованных объявлений в БД."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    cursor.execute('SELECT COUNT(*) FROM rentals')
+    cursor.execute('SELECT COUNT(*) FROM rentals WHERE delisted_at IS NULL')
     count = cursor.fetchone()[0]
     
     conn.close()
@@ -0,0 +1,72 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from itertools import islice
+from typing import IO, Dict, Iterable, Tuple
+
+import database
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Колонки выгрузки (порядок = порядок в CSV и ключи в JSONL)
+EXPORT_COLUMNS = (
+    'id', 'name', 'price', 'district', 'address', 'rooms', 'size',
+    'available_from', 'url', 'first_seen', 'last_seen',
+)
+
+# Больше строк в одну выгрузку не попадает
+EXPORT_MAX_ROWS = 5000
+
+
+def write_export(rows: Iterable[Tuple], fmt: str, fileobj: IO[bytes]) -> int:
+    """
+    Пишет строки в fileobj как gzip CSV или JSON Lines, по одной строке
+    за раз. Возвращает количество строк.
+    """
+    count = 0
+    # mtime=0: одинаковые данные дают побайтно одинаковый архив
+    with gzip.GzipFile(fileobj=fileobj, mode='wb', mtime=0) as archive:
+        # utf-8-sig: Excel открывает CSV с диакритикой без мастера импорта
+        text = io.TextIOWrapper(archive, encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='')
+        if fmt == 'csv':
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                text.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                text.write('\n')
+                count += 1
+        text.flush()
+        text.detach()
+    return count
+
+
+def export_rentals(filters: Dict, fmt: str,
+                   max_rows: int = EXPORT_MAX_ROWS) -> Tuple[IO[bytes], int, bool]:
+    """
+    Выгрузка search_rentals_advanced(filters) во временный файл на диске.
+
+    Строки идут из курсора SQLite прямо в gzip-поток, память не зависит от
+    размера выборки. Возвращает (файл, перемотанный в начало, количество
+    строк, обрезана ли выгрузка по max_rows); файл закрывает вызывающий.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    # На одну строку больше лимита - чтобы узнать, что выборка обрезана
+    rows = database.iter_rentals_advanced(filters, EXPORT_COLUMNS, limit=max_rows + 1)
+    fileobj = tempfile.TemporaryFile()
+    try:
+        count = write_export(islice(rows, max_rows), fmt, fileobj)
+        truncated = next(rows, None) is not None
+    except BaseException:
+        fileobj.close()
+        raise
+    finally:
+        rows.close()
+    fileobj.seek(0)
+    return fileobj, count, truncated
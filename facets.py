@@ -0,0 +1,215 @@
+import string
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import database
+
+# Границы ценовых корзин для подсказок (последняя корзина - "и дороже")
+PRICE_BUCKETS = (0, 400, 600, 800, 1000, 1500)
+
+# Значения фильтров "без ограничения" - как в search_rentals_advanced
+NO_MAX_PRICE = 50000
+
+FacetRow = Tuple[str, str, int, str]  # (district, rooms, price, address)
+# Строки с подходящим адресом: match(адрес) -> (district, rooms, price)
+AddressRows = Callable[[Callable[[str], bool]], Iterable[Tuple[str, str, int]]]
+
+# Сколько разных значений фильтра района держать в кэше совпадений
+NEEDLE_CACHE_SIZE = 256
+
+# Регистр сравнивается как в LIKE SQLite: без учёта только для ASCII
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _fold(text: Optional[str]) -> str:
+    return (text or '').translate(_ASCII_LOWER)
+
+
+class FacetIndex:
+    """
+    Счётчики объявлений по району, комнатам и цене в памяти.
+
+    Для каждой ячейки (район, комнаты) хранится отсортированный список
+    цен: число объявлений в диапазоне цен - два bisect, поэтому "сколько
+    найдёт этот фильтр" считается за O(ячеек * log n) без запроса к БД.
+
+    Фильтр района, как и в search_rentals_advanced, ищет подстроку и в
+    районе, и в адресе. Адрес в ключ ячейки не входит: для каждого
+    значения фильтра один раз собирается список ячеек - подходящие по
+    району целиком плюс цены объявлений, найденных только по адресу, - и
+    кэшируется до следующей загрузки или дельты.
+    Обновляется дельтами из save_rentals / удаления (add_change_listener).
+
+    Если есть бинарный снапшот (mmap_snapshot.py), ячейки - срезы его
+    отображённой памяти: процессы не держат свои копии цен, а новое
+    поколение подхватывается перемапливанием вместо дельт.
+    """
+
+    def __init__(self):
+        self._prices: Dict[Tuple[str, str], Sequence[int]] = defaultdict(list)
+        self._addresses: Dict[str, List[Tuple[str, str, int]]] = defaultdict(list)
+        self._address_rows: AddressRows = self._rows_with_address
+        self._matches: Dict[str, List[Tuple[str, str, Sequence[int]]]] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.generation: Optional[int] = None  # поколение снапшота, если ячейки из mmap
+
+    def load(self, rows: Iterable[FacetRow]) -> None:
+        prices = defaultdict(list)
+        addresses = defaultdict(list)
+        for district, rooms, price, address in rows:
+            prices[(district, rooms)].append(price or 0)
+            addresses[address].append((district, rooms, price or 0))
+        for values in prices.values():
+            values.sort()
+        with self._lock:
+            self._prices = prices
+            self._addresses = addresses
+            self._address_rows = self._rows_with_address
+            self._matches = {}
+            self.loaded = True
+            self.generation = None
+
+    def load_cells(self, cells: Dict[Tuple[str, str], Sequence[int]], generation: int,
+                   address_rows: AddressRows) -> None:
+        """
+        Ячейки из снапшота: (район, комнаты) -> уже отсортированные цены;
+        address_rows - строки снапшота с подходящим адресом.
+        """
+        with self._lock:
+            self._prices = dict(cells)
+            self._addresses = defaultdict(list)
+            self._address_rows = address_rows
+            self._matches = {}
+            self.loaded = True
+            self.generation = generation
+
+    def apply(self, removed: Iterable[FacetRow], added: Iterable[FacetRow]) -> None:
+        if self.generation is not None:
+            return  # изменения придут новым поколением снапшота
+        with self._lock:
+            for district, rooms, price, address in removed:
+                values = self._prices.get((district, rooms))
+                if values:
+                    i = bisect_left(values, price or 0)
+                    if i < len(values) and values[i] == (price or 0):
+                        values.pop(i)
+                rows = self._addresses.get(address)
+                if rows and (district, rooms, price or 0) in rows:
+                    rows.remove((district, rooms, price or 0))
+            for district, rooms, price, address in added:
+                insort(self._prices[(district, rooms)], price or 0)
+                self._addresses[address].append((district, rooms, price or 0))
+            self._matches = {}
+
+    def _rows_with_address(self, match: Callable[[str], bool]) -> Iterable[Tuple[str, str, int]]:
+        for address, rows in self._addresses.items():
+            if match(address):
+                yield from rows
+
+    @staticmethod
+    def _in_range(values: Sequence[int], min_price: int, max_price: int) -> int:
+        # price >= min_price (если задан), 0 < price <= max_price (если задан)
+        lo = min_price if min_price > 0 else None
+        hi = max_price if max_price < NO_MAX_PRICE else None
+        if hi is not None:
+            lo = max(lo or 0, 1)
+        start = bisect_left(values, lo) if lo is not None else 0
+        end = bisect_right(values, hi) if hi is not None else len(values)
+        return max(end - start, 0)
+
+    def _matching(self, district: str) -> List[Tuple[str, str, Sequence[int]]]:
+        """Ячейки под фильтр района (подстрока в районе или адресе), с кэшем."""
+        needle = _fold(district)
+        cells = self._matches.get(needle)
+        if cells is not None:
+            return cells
+        by_district = {cell_district: needle in _fold(cell_district) for cell_district, _ in self._prices}
+        cells = [(cell_district, cell_rooms, values)
+                 for (cell_district, cell_rooms), values in self._prices.items() if by_district[cell_district]]
+        # Найденные только по адресу: их цены - отдельные ячейки того же района
+        extra = defaultdict(list)
+        for row_district, row_rooms, price in self._address_rows(lambda address: needle in _fold(address)):
+            if not by_district[row_district]:
+                extra[(row_district, row_rooms)].append(price)
+        cells += [(row_district, row_rooms, sorted(values)) for (row_district, row_rooms), values in extra.items()]
+        if len(self._matches) >= NEEDLE_CACHE_SIZE:
+            self._matches.pop(next(iter(self._matches)))
+        self._matches[needle] = cells
+        return cells
+
+    def _cells(self, district: Optional[str], rooms: Optional[str]):
+        if district:
+            cells = self._matching(district)
+        else:
+            cells = ((cell_district, cell_rooms, values)
+                     for (cell_district, cell_rooms), values in self._prices.items())
+        for cell_district, cell_rooms, values in cells:
+            if rooms and cell_rooms != rooms:
+                continue
+            yield cell_district, cell_rooms, values
+
+    def count(self, district: Optional[str] = None, rooms: Optional[str] = None,
+              min_price: int = 0, max_price: int = NO_MAX_PRICE) -> int:
+        with self._lock:
+            return sum(self._in_range(values, min_price, max_price)
+                       for _, _, values in self._cells(district, rooms))
+
+    def counts_by(self, facet: str, district: Optional[str] = None, rooms: Optional[str] = None,
+                  min_price: int = 0, max_price: int = NO_MAX_PRICE) -> Counter:
+        """Счётчики по 'district' или 'rooms' при остальных фильтрах."""
+        result = Counter()
+        with self._lock:
+            for cell_district, cell_rooms, values in self._cells(district, rooms):
+                n = self._in_range(values, min_price, max_price)
+                if n:
+                    result[cell_district if facet == 'district' else cell_rooms] += n
+        return result
+
+    def price_histogram(self, district: Optional[str] = None,
+                        rooms: Optional[str] = None) -> List[Tuple[int, Optional[int], int]]:
+        """[(от, до или None, количество)] по PRICE_BUCKETS, без цены "dohodou"."""
+        edges = list(PRICE_BUCKETS[1:]) + [None]
+        histogram = [[lo, hi, 0] for lo, hi in zip(PRICE_BUCKETS, edges)]
+        with self._lock:
+            for _, _, values in self._cells(district, rooms):
+                for bucket in histogram:
+                    lo, hi = bucket[0], bucket[1]
+                    start = bisect_left(values, max(lo, 1))
+                    end = bisect_left(values, hi) if hi is not None else len(values)
+                    bucket[2] += max(end - start, 0)
+        return [tuple(bucket) for bucket in histogram]
+
+
+def filter_args(filters: Dict, exclude: Optional[str] = None) -> Dict:
+    """Фильтры бота (multi_filters) -> аргументы count / counts_by; exclude - без этого фасета."""
+    args = {
+        'district': filters.get('district'),
+        'rooms': filters.get('rooms'),
+        'min_price': filters.get('min_price', 0),
+        'max_price': filters.get('max_price', NO_MAX_PRICE),
+    }
+    if exclude:
+        args[exclude] = None
+    return args
+
+
+FACETS = FacetIndex()
+
+
+def get_facets() -> FacetIndex:
+    """
+    Индекс фасетов: по отображённому снапшоту (перечитывается при новом
+    поколении), без него - из БД с подпиской на изменения.
+    """
+    mapped = database.get_mapped_snapshot()
+    if mapped is not None:
+        if FACETS.generation != mapped.generation:
+            FACETS.load_cells(mapped.price_cells(), mapped.generation, mapped.rows_with_address)
+        return FACETS
+    if not FACETS.loaded:
+        FACETS.load(database.get_facet_rows())
+        database.add_change_listener(FACETS.apply)
+    return FACETS
@@ -0,0 +1,45 @@
+import re
+from typing import List, Set
+
+from geo import fold
+
+# Слова короче не попадают в словарь подсказок
+MIN_WORD_LENGTH = 4
+
+_WORD_RE = re.compile(r'[^\W\d_]+')
+
+
+def normalize(text: str) -> str:
+    """Ключ поиска: без диакритики, нижний регистр, одиночные пробелы."""
+    return ' '.join(fold(text).split())
+
+
+def trigrams(term: str) -> Set[str]:
+    """Триграммы с краевыми пробелами, как в pg_trgm: 'byt' -> '  b', ' by', 'byt', 'yt '."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def title_words(title: str) -> List[str]:
+    """Слова заголовка для словаря (без чисел и коротких служебных слов)."""
+    return [w for w in _WORD_RE.findall(title or '') if len(w) >= MIN_WORD_LENGTH]
+
+
+def max_edits(term: str) -> int:
+    """Допустимое число опечаток: 1 для коротких слов, 2 для средних, 3 для длинных."""
+    return 1 if len(term) <= 5 else 2 if len(term) <= 10 else 3
+
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна; при превышении limit возвращает limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
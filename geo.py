@@ -0,0 +1,220 @@
+import math
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+# Офлайн-справочник координат (lat, lon). Точность - центр города / части
+# города, этого достаточно для поиска "в радиусе N км".
+
+TOWNS: Dict[str, Tuple[float, float]] = {
+    'Bratislava': (48.1486, 17.1077),
+    'Košice': (48.7164, 21.2611),
+    'Prešov': (48.9985, 21.2339),
+    'Žilina': (49.2231, 18.7394),
+    'Nitra': (48.3069, 18.0864),
+    'Banská Bystrica': (48.7395, 19.1535),
+    'Trnava': (48.3774, 17.5872),
+    'Trenčín': (48.8945, 18.0444),
+    'Martin': (49.0636, 18.9214),
+    'Poprad': (49.0566, 20.2976),
+    'Prievidza': (48.7747, 18.6276),
+    'Zvolen': (48.5762, 19.1371),
+    'Považská Bystrica': (49.1211, 18.4214),
+    'Michalovce': (48.7543, 21.9195),
+    'Nové Zámky': (47.9859, 18.1619),
+    'Spišská Nová Ves': (48.9446, 20.5615),
+    'Komárno': (47.7631, 18.1290),
+    'Levice': (48.2173, 18.6076),
+    'Humenné': (48.9371, 21.9063),
+    'Bardejov': (49.2918, 21.2727),
+    'Liptovský Mikuláš': (49.0811, 19.6116),
+    'Ružomberok': (49.0748, 19.3004),
+    'Piešťany': (48.5918, 17.8276),
+    'Topoľčany': (48.5570, 18.1752),
+    'Trebišov': (48.6290, 21.7198),
+    'Lučenec': (48.3314, 19.6671),
+    'Čadca': (49.4380, 18.7890),
+    'Dubnica nad Váhom': (48.9597, 18.1714),
+    'Nová Dubnica': (48.9350, 18.1460),
+    'Rimavská Sobota': (48.3826, 20.0168),
+    'Partizánske': (48.6275, 18.3732),
+    'Šaľa': (48.1514, 17.8770),
+    'Dunajská Streda': (47.9929, 17.6182),
+    'Vranov nad Topľou': (48.8891, 21.6858),
+    'Brezno': (48.8059, 19.6390),
+    'Senica': (48.6794, 17.3665),
+    'Nové Mesto nad Váhom': (48.7577, 17.8316),
+    'Pezinok': (48.2892, 17.2668),
+    'Senec': (48.2191, 17.3997),
+    'Malacky': (48.4364, 17.0219),
+    'Stupava': (48.2750, 17.0317),
+    'Galanta': (48.1903, 17.7264),
+    'Sereď': (48.2864, 17.7350),
+    'Hlohovec': (48.4311, 17.8032),
+    'Skalica': (48.8449, 17.2268),
+    'Myjava': (48.7580, 17.5680),
+    'Dolný Kubín': (49.2098, 19.2963),
+    'Tvrdošín': (49.3370, 19.5560),
+    'Námestovo': (49.4070, 19.4800),
+    'Ilava': (48.9990, 18.2330),
+    'Púchov': (49.1240, 18.3260),
+    'Bytča': (49.2230, 18.5580),
+    'Kysucké Nové Mesto': (49.3000, 18.7860),
+    'Bánovce nad Bebravou': (48.7190, 18.2580),
+    'Handlová': (48.7270, 18.7610),
+    'Žiar nad Hronom': (48.5910, 18.8530),
+    'Banská Štiavnica': (48.4490, 18.9100),
+    'Detva': (48.5600, 19.4200),
+    'Krupina': (48.3540, 19.0650),
+    'Veľký Krtíš': (48.2100, 19.3480),
+    'Turčianske Teplice': (48.8620, 18.8600),
+    'Zlaté Moravce': (48.3850, 18.3970),
+    'Vráble': (48.2430, 18.3080),
+    'Šurany': (48.0860, 18.1860),
+    'Štúrovo': (47.7990, 18.7170),
+    'Šahy': (48.0710, 18.9490),
+    'Kolárovo': (47.9170, 17.9850),
+    'Hurbanovo': (47.8700, 18.1960),
+    'Šamorín': (48.0270, 17.3110),
+    'Bernolákovo': (48.2000, 17.3000),
+    'Ivanka pri Dunaji': (48.1870, 17.2560),
+    'Kežmarok': (49.1357, 20.4292),
+    'Levoča': (49.0250, 20.5880),
+    'Stará Ľubovňa': (49.2986, 20.6860),
+    'Sabinov': (49.1030, 21.0980),
+    'Svidník': (49.3060, 21.5690),
+    'Stropkov': (49.2020, 21.6510),
+    'Snina': (48.9880, 22.1510),
+    'Sobrance': (48.7440, 22.1810),
+    'Medzilaborce': (49.2720, 21.9040),
+    'Rožňava': (48.6610, 20.5320),
+    'Revúca': (48.6830, 20.1170),
+    'Poltár': (48.4300, 19.7940),
+    'Gelnica': (48.8550, 20.9370),
+    'Moldava nad Bodvou': (48.6140, 20.9990),
+}
+
+# Части Братиславы и ориентиры: название -> (lat, lon, шаблон по тексту
+# без диакритики; шаблоны ловят и падежи: "v Petržalke", "na Račianskej").
+BRATISLAVA_PLACES: Dict[str, Tuple[float, float, str]] = {
+    'Staré Mesto': (48.1447, 17.1077, r'\bstar\w*\s+mest'),
+    'Ružinov': (48.1530, 17.1600, r'\bruzinov'),
+    'Prievoz': (48.1500, 17.1500, r'\bprievoz'),
+    'Vrakuňa': (48.1310, 17.2260, r'\bvrakun'),
+    'Podunajské Biskupice': (48.1250, 17.2100, r'\bpodunajsk\w*\s+biskupic'),
+    'Nové Mesto': (48.1700, 17.1250, r'\bnov\w*\s+mest[oea]\b(?!\s+nad)'),
+    'Rača': (48.2050, 17.1500, r'\brac[aiue]\b'),
+    'Vajnory': (48.2080, 17.2000, r'\bvajnor'),
+    'Karlova Ves': (48.1550, 17.0600, r'\bkarlov\w*\s+ves|\bkarlovk'),
+    'Dúbravka': (48.1840, 17.0400, r'\bdubravk'),
+    'Lamač': (48.1950, 17.0500, r'\blamac'),
+    'Devínska Nová Ves': (48.2100, 16.9800, r'\bdevinsk\w*\s+nov'),
+    'Devín': (48.1750, 16.9850, r'\bdevin[ea]?\b'),
+    'Záhorská Bystrica': (48.2380, 17.0420, r'\bzahorsk\w*\s+bystric'),
+    'Petržalka': (48.1150, 17.1100, r'\bpetrzal'),
+    'Jarovce': (48.0700, 17.1100, r'\bjarov'),
+    'Rusovce': (48.0530, 17.1470, r'\brusov'),
+    'Čunovo': (48.0320, 17.2000, r'\bcunov'),
+    'Aupark': (48.1334, 17.1082, r'\baupark'),
+    'Eurovea': (48.1405, 17.1230, r'\beurove'),
+    'Nivy': (48.1470, 17.1300, r'\bniv(y|ach)\b'),
+    'Avion': (48.1680, 17.1890, r'\bavion'),
+    'Hlavná stanica': (48.1586, 17.1060, r'\bhlavn\w*\s+stanic'),
+    'Mlynská dolina': (48.1510, 17.0700, r'\bmlynsk\w*\s+dolin'),
+}
+
+# PSČ Братиславы -> часть города (сначала 5 цифр, потом первые 3)
+BRATISLAVA_POSTCODES: Dict[str, str] = {
+    '811': 'Staré Mesto',
+    '821': 'Ružinov', '82106': 'Podunajské Biskupice', '82107': 'Vrakuňa',
+    '831': 'Nové Mesto', '83106': 'Rača', '83107': 'Vajnory',
+    '841': 'Karlova Ves', '84101': 'Dúbravka', '84102': 'Dúbravka', '84103': 'Lamač',
+    '84106': 'Záhorská Bystrica', '84107': 'Devínska Nová Ves',
+    '84108': 'Devínska Nová Ves', '84110': 'Devín',
+    '851': 'Petržalka', '85110': 'Jarovce',
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+_ADDRESS_RE = re.compile(r'^(?P<town>.*?)[,\s]*(?P<psc>\d{3}\s?\d{2})?\s*$')
+
+
+def fold(text: str) -> str:
+    """Нижний регистр без диакритики: 'Petržalka' -> 'petrzalka'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+_TOWNS_FOLDED = {fold(name): coords for name, coords in TOWNS.items()}
+_PLACE_PATTERNS = [
+    (re.compile(pattern), (lat, lon))
+    for lat, lon, pattern in BRATISLAVA_PLACES.values()
+]
+
+
+def _match_place(text: str) -> Optional[Tuple[float, float]]:
+    folded = fold(text)
+    for pattern, coords in _PLACE_PATTERNS:
+        if pattern.search(folded):
+            return coords
+    return None
+
+
+def parse_address(address: str) -> Tuple[str, str]:
+    """Поле локации bazos "Bratislava851 06" -> ('Bratislava', '85106')."""
+    match = _ADDRESS_RE.match((address or '').strip())
+    if not match:
+        return '', ''
+    return match.group('town').strip(), (match.group('psc') or '').replace(' ', '')
+
+
+def geocode(address: str, title: str = '', description: str = '') -> Optional[Tuple[float, float]]:
+    """
+    Координаты объявления по полю локации ("Bratislava851 06") и тексту.
+
+    Для Братиславы: часть города из заголовка, затем по PSČ, затем из
+    описания; для остальных - центр города. None - место не распознано.
+    """
+    town, psc = parse_address(address)
+    town = re.sub(r'\bn\.\s*', 'nad ', fold(town))  # "Nové Mesto n.Váhom"
+
+    if town == 'bratislava' or (not town and psc[:1] == '8'):
+        by_title = _match_place(title)
+        if by_title:
+            return by_title
+        part = BRATISLAVA_POSTCODES.get(psc) or BRATISLAVA_POSTCODES.get(psc[:3])
+        if part:
+            return BRATISLAVA_PLACES[part][:2]
+        return _match_place(description) or TOWNS['Bratislava']
+
+    return _TOWNS_FOLDED.get(town)
+
+
+def find_place(name: str) -> Optional[Tuple[str, float, float]]:
+    """Место по названию от пользователя ("aupark", "Petržalke", "Trnava")."""
+    folded = fold(name).strip()
+    if not folded:
+        return None
+    for place, (lat, lon, pattern) in BRATISLAVA_PLACES.items():
+        if re.search(pattern, folded) or fold(place) == folded:
+            return place, lat, lon
+    for town, (lat, lon) in TOWNS.items():
+        if fold(town) == folded:
+            return town, lat, lon
+    return None
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) квадрата вокруг точки - для R*Tree."""
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple, Union
+
+import database
+
+# requests импортируется при первой загрузке картинок (не при старте бота)
+if TYPE_CHECKING:
+    import requests
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent / 'image_cache'
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+DOWNLOAD_CONCURRENCY = 4
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+
+def _cache_path(sha256: str) -> Path:
+    """Путь к файлу в кэше: image_cache/ab/abcdef....jpg"""
+    return CACHE_DIR / sha256[:2] / f"{sha256}.jpg"
+
+
+def _download(session: 'requests.Session', url: str) -> Optional[Tuple[str, int]]:
+    """Скачивает изображение и кладёт его в кэш. Возвращает (sha256, size)."""
+    try:
+        resp = session.get(url, timeout=15)
+        if resp.status_code != 200 or not resp.content:
+            logger.warning(f"Image HTTP {resp.status_code}: {url}")
+            return None
+        if len(resp.content) > MAX_IMAGE_BYTES:
+            logger.warning(f"Image too large ({len(resp.content)} B): {url}")
+            return None
+
+        sha256 = hashlib.sha256(resp.content).hexdigest()
+        path = _cache_path(sha256)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_bytes(resp.content)
+            tmp_path.replace(path)
+        return sha256, len(resp.content)
+    except Exception as e:
+        logger.error(f"Error downloading image {url}: {e}")
+        return None
+
+
+async def prefetch_images(urls: Iterable[str], headers: Optional[Dict] = None,
+                          concurrency: int = DOWNLOAD_CONCURRENCY) -> int:
+    """
+    Скачивает в кэш изображения, которых там ещё нет.
+
+    Одновременно выполняется не больше concurrency загрузок, сами загрузки
+    идут в потоках, чтобы не блокировать event loop бота.
+    Возвращает количество скачанных изображений.
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if not urls:
+        return 0
+
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT url FROM image_cache WHERE sha256 IS NOT NULL OR file_id IS NOT NULL')
+    cached = {row[0] for row in cursor.fetchall()}
+    conn.close()
+
+    missing = [u for u in urls if u not in cached]
+    if not missing:
+        return 0
+
+    import requests
+
+    session = requests.Session()
+    session.headers.update(headers or {})
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url: str):
+        async with semaphore:
+            return url, await asyncio.to_thread(_download, session, url)
+
+    results = await asyncio.gather(*(fetch(u) for u in missing))
+    session.close()
+
+    now = database.utc_now()
+    rows = [(url, res[0], res[1], now) for url, res in results if res]
+
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO image_cache (url, sha256, size, last_access)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            sha256 = excluded.sha256, size = excluded.size, last_access = excluded.last_access
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+    logger.info(f"🖼️ Downloaded {len(rows)}/{len(missing)} images")
+    evict_images()
+    return len(rows)
+
+
+def evict_images(max_bytes: int = MAX_CACHE_BYTES) -> int:
+    """
+    Удаляет из кэша давно не использованные файлы, пока кэш больше max_bytes.
+
+    Строки с file_id остаются: Telegram хранит фото у себя, локальный файл
+    для них больше не нужен. Возвращает количество удалённых файлов.
+    """
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+
+    # Один файл может соответствовать нескольким URL - считаем по sha256
+    cursor.execute('''
+        SELECT sha256, MAX(size), MAX(last_access), MAX(file_id IS NOT NULL)
+        FROM image_cache
+        WHERE sha256 IS NOT NULL
+        GROUP BY sha256
+    ''')
+    files = cursor.fetchall()
+    total = sum(size for _, size, _, _ in files)
+
+    evicted = 0
+    # Сначала файлы, уже загруженные в Telegram, затем по давности доступа
+    for sha256, size, _, _ in sorted(files, key=lambda f: (-f[3], f[2] or '')):
+        if total <= max_bytes:
+            break
+        _cache_path(sha256).unlink(missing_ok=True)
+        cursor.execute('DELETE FROM image_cache WHERE sha256 = ? AND file_id IS NULL', (sha256,))
+        cursor.execute('UPDATE image_cache SET sha256 = NULL, size = 0 WHERE sha256 = ?', (sha256,))
+        total -= size
+        evicted += 1
+
+    conn.commit()
+    conn.close()
+
+    if evicted:
+        logger.info(f"🗑️ Evicted {evicted} images from cache")
+    return evicted
+
+
+def get_cached_photo(url: Optional[str]) -> Optional[Union[str, Path]]:
+    """
+    Возвращает то, что можно отправить в Telegram без скачивания:
+    file_id (повторная отправка без загрузки) или путь к файлу в кэше.
+    """
+    if not url:
+        return None
+
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT sha256, file_id FROM image_cache WHERE url = ?', (url,))
+    row = cursor.fetchone()
+
+    photo = None
+    if row:
+        sha256, file_id = row
+        if file_id:
+            photo = file_id
+        elif sha256 and _cache_path(sha256).exists():
+            photo = _cache_path(sha256)
+            cursor.execute('UPDATE image_cache SET last_access = ? WHERE url = ?',
+                           (database.utc_now(), url))
+            conn.commit()
+
+    conn.close()
+    return photo
+
+
+def remember_file_id(url: str, file_id: str) -> None:
+    """Сохраняет file_id после первой загрузки фото в Telegram."""
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE image_cache SET file_id = ? WHERE url = ?', (file_id, url))
+    conn.commit()
+    conn.close()
+
@@ -0,0 +1,224 @@
+"""
+Inline-режим: "@bot 2-izb petrzalka 700" из любого чата.
+
+Строка запроса разбирается в тот же словарь filters, что у
+search_rentals_advanced:
+
+    2-izb, 2izb, 2i, gars     -> rooms ('2-izbový', 'garsónka')
+    700, do 700, <700         -> max_price
+    od 500, >500              -> min_price
+    500-800                   -> min_price и max_price
+    3km                       -> radius_km (вместе с частью Братиславы)
+    petrzalka, kosice         -> near (часть Братиславы) или district
+    остальные слова           -> keyword
+
+Telegram шлёт запрос на каждое нажатие клавиши, поэтому результаты
+кэшируются по нормализованной строке с коротким TTL, одинаковые
+запросы в работе объединяются, а ожидание ограничено бюджетом.
+"""
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+
+from database import iter_rentals_advanced, suggest_terms
+from fuzzy import normalize
+from geo import find_place
+
+logger = logging.getLogger(__name__)
+
+INLINE_PAGE_SIZE = 20          # Telegram показывает не больше 50 результатов за ответ
+INLINE_MAX_RESULTS = 100       # дальше пользователь листает слишком долго - лучше уточнить запрос
+INLINE_CACHE_TTL = 30.0
+INLINE_DEBOUNCE = 0.4          # пауза после нажатия: пока пользователь печатает, поиск не идёт
+INLINE_BUDGET = 1.5            # дольше ответ не ждём, результат всё равно попадёт в кэш
+
+INLINE_COLUMNS = ('id', 'name', 'price', 'district', 'rooms', 'size', 'url', 'image_url')
+
+# Цены меньше - скорее номер или количество, а не евро в месяц
+MIN_PRICE_TOKEN = 50
+
+_ROOMS_RE = re.compile(r'^([1-6])-?(?:izb\w*|i)$')
+_STUDIO_RE = re.compile(r'^(?:gars|garz)\w*$')
+_RANGE_RE = re.compile(r'^(\d{2,5})-(\d{2,5})(?:€|e|eur)?$')
+_PRICE_RE = re.compile(r'^([<>])?(\d{1,5})(?:€|e|eur)?$')
+_RADIUS_RE = re.compile(r'^(\d+(?:[.,]\d+)?)km$')
+_PRICE_WORDS = {'do': 'max_price', 'max': 'max_price', 'od': 'min_price', 'min': 'min_price'}
+_LOCATION_KINDS = ('district', 'town', 'place')
+
+
+def _split_query(text: str) -> Tuple[Dict, List[str]]:
+    """Токены с фиксированным синтаксисом -> filters; остальные слова - отдельно."""
+    filters: Dict = {}
+    words: List[str] = []
+    price_field = None
+    for token in normalize(text).split():
+        if token in _PRICE_WORDS:
+            price_field = _PRICE_WORDS[token]
+            continue
+        field, price_field = price_field, None
+
+        match = _PRICE_RE.match(token)
+        if match:
+            price = int(match.group(2))
+            if price >= MIN_PRICE_TOKEN:
+                filters[field or ('min_price' if match.group(1) == '>' else 'max_price')] = price
+            continue
+        match = _RANGE_RE.match(token)
+        if match:
+            low, high = sorted(int(group) for group in match.groups())
+            filters['min_price'], filters['max_price'] = low, high
+            continue
+        match = _ROOMS_RE.match(token)
+        if match:
+            filters['rooms'] = f"{match.group(1)}-izbový"
+            continue
+        if _STUDIO_RE.match(token):
+            filters['rooms'] = 'garsónka'
+            continue
+        match = _RADIUS_RE.match(token)
+        if match:
+            filters['radius_km'] = float(match.group(1).replace(',', '.'))
+            continue
+        words.append(token)
+    return filters, words
+
+
+def _resolve_location(words: List[str], filters: Dict) -> List[str]:
+    """
+    Первая локалита среди слов (сначала пары слов - "stare mesto",
+    "banska bystrica", потом одиночные). Возвращает оставшиеся слова.
+    """
+    for size in (2, 1):
+        for start in range(len(words) - size + 1):
+            phrase = ' '.join(words[start:start + size])
+            if len(phrase) < 3:
+                continue
+            suggestions = suggest_terms(phrase, _LOCATION_KINDS, 1)
+            if not suggestions:
+                continue
+            name, kind, _ = suggestions[0]
+            place = find_place(name) if kind == 'place' else None
+            if place:
+                filters['near'] = [place[1], place[2]]
+                filters['near_name'] = name
+                filters.setdefault('radius_km', 2)
+            else:
+                filters['district'] = name
+            return words[:start] + words[start + size:]
+    return words
+
+
+def parse_inline_query(text: str) -> Dict:
+    """Строка inline-запроса -> filters для search_rentals_advanced."""
+    filters, words = _split_query(text)
+    words = _resolve_location(words, filters)
+    if 'near' not in filters:
+        filters.pop('radius_km', None)
+    if words:
+        filters['keyword'] = ' '.join(words)
+    return filters
+
+
+def search_inline(text: str, limit: int = INLINE_MAX_RESULTS) -> List[Tuple]:
+    """Разбор и поиск (в потоке): строки колонок INLINE_COLUMNS."""
+    rows = iter_rentals_advanced(parse_inline_query(text), INLINE_COLUMNS, limit=limit)
+    try:
+        return list(rows)
+    finally:
+        rows.close()
+
+
+class InlineResultCache:
+    """Результаты по нормализованной строке запроса: LRU с TTL."""
+
+    def __init__(self, ttl: float = INLINE_CACHE_TTL, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, Tuple[float, List[Tuple]]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[List[Tuple]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, rows: List[Tuple]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class InlineSearch:
+    """
+    Кэш плюс объединение одинаковых запросов в работе: несколько
+    пользователей (или повтор того же запроса) ждут один поиск.
+    """
+
+    def __init__(self, cache: Optional[InlineResultCache] = None):
+        self.cache = cache or InlineResultCache()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def cached(self, text: str) -> Optional[List[Tuple]]:
+        return self.cache.get(normalize(text))
+
+    async def results(self, text: str, budget: float = INLINE_BUDGET) -> Optional[List[Tuple]]:
+        """Строки результата или None, если поиск не уложился в budget секунд."""
+        key = normalize(text)
+        rows = self.cache.get(key)
+        if rows is not None:
+            return rows
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(search_inline, text))
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self._pending[key] = task
+        try:
+            # shield: по таймауту поиск не отменяется и заполнит кэш для следующего нажатия
+            return await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            return None
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        self._pending.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error(f"Inline search failed: {task.exception()}")
+            return
+        self.cache.put(key, task.result())
+
+
+def rental_article(row: Tuple) -> InlineQueryResultArticle:
+    """Строка INLINE_COLUMNS -> результат inline-запроса."""
+    rental_id, name, price, district, rooms, size, url, image_url = row
+    price_text = f"€{price}/mesiac" if price and price > 0 else "Cena dohodou"
+    size_text = f"{size} m²" if size and any(c.isdigit() for c in size) else None
+    description = " · ".join(part for part in (price_text, rooms, district, size_text) if part)
+    text = (
+        f"🏢 <b>{html.escape(name)}</b>\n\n"
+        f"📍 {html.escape(district or '')}\n"
+        f"💰 {price_text}\n"
+        f"🛏️ {html.escape(rooms or '')}"
+        + (f" · 📐 {html.escape(size_text)}" if size_text else "")
+    )
+    return InlineQueryResultArticle(
+        id=str(rental_id),
+        title=name,
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode="HTML"),
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔗 Otvoriť na bazos.sk", url=url)]]),
+        url=url,
+        thumbnail_url=image_url or None,
+    )
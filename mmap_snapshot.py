@@ -0,0 +1,259 @@
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from models import RentalSummary
+
+# Бинарный снапшот опубликованного поколения (см. database.publish_snapshot).
+#
+# Все числа little-endian, секции выровнены по 8 байт:
+#   заголовок   HEADER
+#   id          int64  x count      (порядок - как в /browse, новые сверху)
+#   price       int32  x count
+#   size        uint16 x count      (м², 0 - не указано)
+#   rooms       uint16 x count      (код строки комнат)
+#   district    uint16 x count      (код строки района)
+#   address     uint32 x count      (код строки адреса)
+#   cell_price  int32  x count      (цены, отсортированные по (район, комнаты, цена))
+#   cells       CELL   x cells      (район, комнаты, начало, конец в cell_price)
+#   offsets     uint32 x (count + districts + rooms + addresses + 1)
+#   blob        UTF-8: названия объявлений, затем районы, комнаты, адреса
+#
+# Строки и ячейки читаются из буфера по смещениям при обращении: процесс
+# не держит своих копий таблиц, всё лежит в общих страницах page cache.
+#
+# Файл только для чтения: новое поколение пишется во временный файл и
+# подменяет старый через os.replace, процессы перемапливают его по inode.
+
+MAGIC = b'RSNP'
+FORMAT_VERSION = 3
+# magic, версия, поколение, count, districts, rooms, addresses, cells
+HEADER = struct.Struct('<4sHxxQIIIII')
+CELL = struct.Struct('<HHII')
+
+SnapshotRow = Tuple[int, str, int, str, str, str, str]  # (id, name, price, size, rooms, district, address)
+
+_NUMBER_RE = re.compile(r'\d+')
+
+
+def _size_m2(size: str) -> int:
+    match = _NUMBER_RE.search(size or '')
+    return min(int(match.group()), 0xFFFF) if match else 0
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(count: int, districts: int, rooms: int, addresses: int, cells: int) -> Dict[str, int]:
+    """Смещения секций; одна функция для записи и чтения."""
+    sizes = [
+        ('ids', 8 * count), ('prices', 4 * count), ('sizes', 2 * count),
+        ('rooms', 2 * count), ('districts', 2 * count), ('addresses', 4 * count), ('cell_prices', 4 * count),
+        ('cells', CELL.size * cells), ('offsets', 4 * (count + districts + rooms + addresses + 1)),
+    ]
+    layout, offset = {}, _align(HEADER.size)
+    for name, size in sizes:
+        layout[name] = offset
+        offset = _align(offset + size)
+    layout['blob'] = offset
+    return layout
+
+
+def write_snapshot(path: Path, generation: int, rows: Iterable[SnapshotRow]) -> int:
+    """Пишет снапшот поколения generation и атомарно подменяет файл. Возвращает размер."""
+    rows = list(rows)
+    district_codes: Dict[str, int] = {}
+    rooms_codes: Dict[str, int] = {}
+    address_codes: Dict[str, int] = {}
+    ids, prices, sizes = array('q'), array('i'), array('H')
+    rooms_column, district_column, address_column = array('H'), array('H'), array('I')
+    for rental_id, _, price, size, rooms, district, address in rows:
+        ids.append(rental_id)
+        prices.append(price or 0)
+        sizes.append(_size_m2(size))
+        rooms_column.append(rooms_codes.setdefault(rooms or '', len(rooms_codes)))
+        district_column.append(district_codes.setdefault(district or '', len(district_codes)))
+        address_column.append(address_codes.setdefault(address or '', len(address_codes)))
+
+    # Ячейки (район, комнаты): отсортированные цены подряд - счётчики
+    # фасетов считаются bisect'ом прямо по отображённой памяти. Адрес в
+    # ячейку не входит - поиск по адресу идёт по колонке address
+    order = sorted(range(len(rows)), key=lambda i: (district_column[i], rooms_column[i], prices[i]))
+    cell_prices = array('i', (prices[i] for i in order))
+    cells = []
+    for position, i in enumerate(order):
+        key = (district_column[i], rooms_column[i])
+        if cells and tuple(cells[-1][:2]) == key:
+            cells[-1][3] = position + 1
+        else:
+            cells.append([*key, position, position + 1])
+
+    strings = ([row[1] or '' for row in rows] + list(district_codes)
+               + list(rooms_codes) + list(address_codes))
+    blob = bytearray()
+    offsets = array('I', [0])
+    for text in strings:
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+
+    if sys.byteorder == 'big':
+        for column in (ids, prices, sizes, rooms_column, district_column, address_column, cell_prices, offsets):
+            column.byteswap()
+
+    layout = _layout(len(rows), len(district_codes), len(rooms_codes), len(address_codes), len(cells))
+    buffer = bytearray(layout['blob'] + len(blob))
+    HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, generation,
+                     len(rows), len(district_codes), len(rooms_codes), len(address_codes), len(cells))
+    for name, column in (('ids', ids), ('prices', prices), ('sizes', sizes), ('rooms', rooms_column),
+                         ('districts', district_column), ('addresses', address_column),
+                         ('cell_prices', cell_prices),
+                         ('offsets', offsets)):
+        data = column.tobytes()
+        buffer[layout[name]:layout[name] + len(data)] = data
+    for n, cell in enumerate(cells):
+        CELL.pack_into(buffer, layout['cells'] + n * CELL.size, *cell)
+    buffer[layout['blob']:] = blob
+
+    path = Path(path)
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(buffer)
+    os.replace(temp_path, path)
+    return len(buffer)
+
+
+class SnapshotFile:
+    """
+    Отображённый в память снапшот одного поколения.
+
+    Колонки - memoryview поверх mmap без копирования: все процессы читают
+    одну копию страниц из page cache. Строки (районы, комнаты, адреса) и
+    ячейки декодируются из буфера при обращении, а не заранее - объём
+    памяти процесса не растёт с числом объявлений. Объект неизменяем;
+    после подмены файла старое отображение живёт, пока на него есть ссылки.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, self.count, districts, rooms, addresses, cells = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path}: not a rentals snapshot v{FORMAT_VERSION}")
+        if sys.byteorder != 'little':
+            raise ValueError("memory-mapped snapshot needs a little-endian host")
+
+        layout = _layout(self.count, districts, rooms, addresses, cells)
+        view = memoryview(self._mmap)
+        count = self.count
+
+        def column(name: str, fmt: str, length: int = count) -> memoryview:
+            size = struct.calcsize(fmt)
+            return view[layout[name]:layout[name] + size * length].cast(fmt)
+
+        self.ids = column('ids', 'q')
+        self.prices = column('prices', 'i')
+        self.sizes = column('sizes', 'H')
+        self.rooms_codes = column('rooms', 'H')
+        self.district_codes = column('districts', 'H')
+        self.address_codes = column('addresses', 'I')
+        self.cell_prices = column('cell_prices', 'i')
+        self._offsets = column('offsets', 'I', count + districts + rooms + addresses + 1)
+        self._blob = view[layout['blob']:]
+        self._view = view
+        self._cells_offset = layout['cells']
+        self._cell_count = cells
+        # Начало строк каждой таблицы в offsets
+        self._districts = count
+        self._rooms = count + districts
+        self._addresses = count + districts + rooms
+        self._address_count = addresses
+
+    def _string(self, n: int) -> str:
+        return str(self._blob[self._offsets[n]:self._offsets[n + 1]], 'utf-8')
+
+    def __len__(self) -> int:
+        return self.count
+
+    def district(self, code: int) -> str:
+        return self._string(self._districts + code)
+
+    def rooms(self, code: int) -> str:
+        return self._string(self._rooms + code)
+
+    def address(self, code: int) -> str:
+        return self._string(self._addresses + code)
+
+    def name(self, i: int) -> str:
+        return self._string(i)
+
+    def summary(self, i: int) -> RentalSummary:
+        return RentalSummary(self.ids[i], self._string(i), self.prices[i],
+                             self.rooms(self.rooms_codes[i]), self.district(self.district_codes[i]))
+
+    def rentals(self) -> List[RentalSummary]:
+        """Весь список поколения (для /browse)."""
+        # Районов и комнат мало: каждую строку декодируем один раз за вызов
+        districts, rooms = {}, {}
+        result = []
+        for i in range(self.count):
+            district_code, rooms_code = self.district_codes[i], self.rooms_codes[i]
+            if district_code not in districts:
+                districts[district_code] = self.district(district_code)
+            if rooms_code not in rooms:
+                rooms[rooms_code] = self.rooms(rooms_code)
+            result.append(RentalSummary(self.ids[i], self._string(i), self.prices[i],
+                                        rooms[rooms_code], districts[district_code]))
+        return result
+
+    def cells(self) -> Iterator[Tuple[int, int, int, int]]:
+        """Записи ячеек (код района, код комнат, начало, конец в cell_prices)."""
+        for n in range(self._cell_count):
+            yield CELL.unpack_from(self._view, self._cells_offset + n * CELL.size)
+
+    def price_cells(self) -> Dict[Tuple[str, str], Sequence[int]]:
+        """(район, комнаты) -> отсортированные цены (срез memoryview, без копии)."""
+        return {
+            (self.district(district), self.rooms(rooms)): self.cell_prices[start:end]
+            for district, rooms, start, end in self.cells()
+        }
+
+    def rows_with_address(self, match: Callable[[str], bool]) -> Iterator[Tuple[str, str, int]]:
+        """(район, комнаты, цена) объявлений, чей адрес подходит под match."""
+        codes = {code for code in range(self._address_count) if match(self.address(code))}
+        if not codes:
+            return
+        for i, code in enumerate(self.address_codes):
+            if code in codes:
+                yield self.district(self.district_codes[i]), self.rooms(self.rooms_codes[i]), self.prices[i]
+
+
+class MappedSnapshot:
+    """
+    Текущий снапшот процесса. current() сверяет inode и mtime файла и
+    перемапливает его, если парсер опубликовал новое поколение.
+    """
+
+    def __init__(self):
+        self._file: Optional[SnapshotFile] = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def current(self, path: Path) -> Optional[SnapshotFile]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stamp != self._stamp:
+                self._file = SnapshotFile(path)
+                self._stamp = stamp
+            return self._file
@@ -0,0 +1,95 @@
+import json
+from dataclasses import dataclass, fields
+from typing import Dict, Optional
+
+
+class _ItemAccess:
+    """Доступ record['field'] / record.get('field') как у старых dict."""
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+
+@dataclass(slots=True)
+class Rental(_ItemAccess):
+    """
+    Объявление о сдаче квартиры.
+
+    Без __dict__ на каждый экземпляр: поля хранятся в слотах.
+    Доступ rental['price'] оставлен, чтобы шаблоны бота не менялись.
+    """
+    name: str
+    price: int
+    district: str
+    address: str
+    rooms: str
+    size: str
+    description: str
+    url: str
+    source: str
+    available_from: str
+    image_url: Optional[str] = None
+    id: Optional[int] = None
+    parsed_at: Optional[str] = None
+    first_seen: Optional[str] = None
+    last_seen: Optional[str] = None
+    delisted_at: Optional[str] = None
+    missed_runs: int = 0
+
+
+@dataclass(slots=True)
+class RentalSummary(_ItemAccess):
+    """
+    Короткая запись для списков: только то, что рисуется на кнопках.
+    Полное объявление (описание, адрес, фото) читается по id в деталях.
+    """
+    id: int
+    name: str
+    price: int
+    rooms: str
+    district: str
+
+
+@dataclass(slots=True)
+class RentalChange(_ItemAccess):
+    """
+    Событие ленты изменений rentals (таблица rental_changes).
+
+    op: 'insert', 'update' или 'delete'. fields: для update - изменённые
+    поля {поле: [было, стало]}, для insert и delete - district, rooms,
+    price объявления.
+    """
+    seq: int
+    rental_id: int
+    op: str
+    fields: Optional[Dict]
+    changed_at: str
+
+
+# Колонки в порядке полей Rental: SELECT {RENTAL_COLUMNS} -> Rental(*row)
+RENTAL_COLUMNS = ', '.join(f.name for f in fields(Rental))
+SUMMARY_COLUMNS = ', '.join(f.name for f in fields(RentalSummary))
+CHANGE_COLUMNS = ', '.join(f.name for f in fields(RentalChange))
+
+
+def rental_row_factory(cursor, row) -> Rental:
+    """row_factory для запросов вида SELECT {RENTAL_COLUMNS} FROM rentals."""
+    return Rental(*row)
+
+
+def summary_row_factory(cursor, row) -> RentalSummary:
+    """row_factory для запросов вида SELECT {SUMMARY_COLUMNS} FROM rentals."""
+    return RentalSummary(*row)
+
+
+def change_row_factory(cursor, row) -> RentalChange:
+    """row_factory для SELECT {CHANGE_COLUMNS} FROM rental_changes (fields - JSON)."""
+    seq, rental_id, op, changed, changed_at = row
+    return RentalChange(seq, rental_id, op, json.loads(changed) if changed else None, changed_at)
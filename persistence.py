@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Ключи user_data, которые переживают перезапуск. Остальное (списки
+# объявлений для пагинации, результаты поиска) - временный кэш.
+PERSISTED_USER_KEYS = (
+    'favorites', 'multi_filters', 'search_filters', 'filter_step', 'advanced_step',
+    'browse_generation', 'seen_until', 'seen_id', 'filter_choices', 'rental_photo',
+)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранит user_data и состояния диалогов в таблицах rentals.db.
+
+    - user_data читается лениво: строка пользователя загружается при первом
+      его обновлении после запуска, а не вся таблица при старте;
+    - изменения копятся в памяти и пишутся одной транзакцией раз в
+      flush_interval секунд в отдельном потоке (write-behind);
+    - пишутся только пользователи, чьи данные действительно изменились.
+    Избранное хранится как список id объявлений.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, flush_interval: float = 10.0,
+                 update_interval: float = 30.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._loaded_users: Set[int] = set()
+        self._loading_users: Dict[int, asyncio.Lock] = {}
+        self._written_users: Dict[int, str] = {}
+        # None - строку нужно удалить
+        self._dirty_users: Dict[int, Optional[str]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Optional[int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path or database.DB_PATH)
+
+    # --- user_data ---
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Ничего не грузим при старте - см. refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        # Следующее обновление того же пользователя ждёт идущую загрузку:
+        # иначе оно пошло бы с пустым user_data и записало его поверх строки
+        lock = self._loading_users.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            if user_id in self._loaded_users:
+                return
+            row = await asyncio.to_thread(self._load_user, user_id)
+            if row:
+                self._written_users[user_id] = row
+                for key, value in json.loads(row).items():
+                    user_data.setdefault(key, value)
+            self._loaded_users.add(user_id)
+            self._loading_users.pop(user_id, None)
+
+    def _load_user(self, user_id: int) -> Optional[str]:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT data FROM bot_user_data WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        persisted = {key: data[key] for key in PERSISTED_USER_KEYS if key in data}
+        encoded = json.dumps(persisted, ensure_ascii=False, sort_keys=True)
+        if self._written_users.get(user_id) == encoded:
+            return
+        self._written_users[user_id] = encoded
+        self._dirty_users[user_id] = encoded
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._written_users.pop(user_id, None)
+        self._dirty_users[user_id] = None
+        self._schedule_flush()
+
+    # --- диалоги ---
+
+    async def get_conversations(self, name: str) -> Dict:
+        # Активных диалогов немного - их нужно знать ConversationHandler сразу
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, state FROM bot_conversations WHERE name = ?', (name,))
+        conversations = {tuple(json.loads(key)): state for key, state in cursor.fetchall()}
+        conn.close()
+        return conversations
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_flush()
+
+    # --- запись ---
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self._write_dirty()
+
+    async def _write_dirty(self) -> None:
+        users, self._dirty_users = self._dirty_users, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        if users or conversations:
+            await asyncio.to_thread(self._write, users, conversations)
+
+    def _write(self, users: Dict[int, Optional[str]],
+               conversations: Dict[Tuple[str, str], Optional[int]]) -> None:
+        now = database.utc_now()
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.executemany('''
+            INSERT INTO bot_user_data (user_id, data, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+        ''', [(user_id, data, now) for user_id, data in users.items() if data is not None])
+        cursor.executemany('DELETE FROM bot_user_data WHERE user_id = ?',
+                           [(user_id,) for user_id, data in users.items() if data is None])
+
+        cursor.executemany('''
+            INSERT OR REPLACE INTO bot_conversations (name, key, state) VALUES (?, ?, ?)
+        ''', [(name, key, state) for (name, key), state in conversations.items() if state is not None])
+        cursor.executemany('DELETE FROM bot_conversations WHERE name = ? AND key = ?',
+                           [(name, key) for (name, key), state in conversations.items() if state is None])
+
+        conn.commit()
+        conn.close()
+        logger.info(f"💾 Persistence flushed: {len(users)} users, {len(conversations)} conversations")
+
+    async def flush(self) -> None:
+        """Вызывается при остановке бота: дописывает всё, что ещё в памяти."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_dirty()
+
+    # --- не используются (store_data выключен) ---
+
+    async def get_chat_data(self) -> Dict:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+# Готовая страница списка: текст сообщения и клавиатура
+RenderedPage = Tuple[str, InlineKeyboardMarkup]
+
+
+class RenderCache:
+    """
+    LRU-кэш отрисованных страниц списков.
+
+    Ключ - (поколение снапшота, вид списка, страница). Опубликованное
+    поколение не меняется, поэтому страницу не нужно сбрасывать: страницы
+    поколений, которые уже никто не листает, вытесняются по размеру.
+    InlineKeyboardMarkup неизменяем, одну разметку можно отдавать всем.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._pages: 'OrderedDict[Hashable, RenderedPage]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[RenderedPage]:
+        page = self._pages.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+        self._pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(self, key: Hashable, page: RenderedPage) -> None:
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._pages)
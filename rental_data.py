@@ -1,212 +1,115 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
+import asyncio
 from typing import List, Dict, Optional, Tuple
-from urllib.parse import urljoin
 import logging
-from database import save_rentals, log_parse, get_all_rentals, search_rentals_db, search_rentals_advanced, get_districts_db, get_price_range_db, get_rental_count
+from images import prefetch_images
+from models import Rental, RentalSummary
+from sources import HEADERS, ADAPTERS, get_enabled_adapters
+from database import save_rentals, log_parse, expire_rentals, refresh_market_stats, update_market_stats, refresh_search_terms, refresh_similar_rentals, publish_snapshot, read_changes, ack_changes, get_change_head, get_change_positions, compact_changes, get_all_rentals, search_rentals_db, search_rentals_advanced, get_districts_db, get_price_range_db, get_rental_by_id
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://reality.bazos.sk"
-HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'}
+# Производные данные - потребители ленты изменений (rental_changes).
+# market_stats обновляется по самим событиям (только затронутые группы);
+# этапы DERIVED_DATA пересобираются целиком, если с прошлого раза были события
+MARKET_STATS_CONSUMER = 'market_stats'
+DERIVED_DATA = {
+    'search_terms': refresh_search_terms,
+    'similarity': refresh_similar_rentals,
+}
 
-REALTOR_KEYWORDS = [
-    'real', 's.r.o', 'r.k.', 'remax', 'century', 'broker', 
-    'sprostredkov', 'maklér', 'makler', 'agency', 'agentúr',
-    'herrys', 'lexxus', 'expat', 'bonreality', 'provízi', 
-    'v zastúpení', 'vo výhradnom', 'exkluzívne', 'impulz real',
-    'adomis', 'foryou', 'ponúkame vám', 'legend.sk', 'zara reality'
-]
 
+def scrape_bazos(max_pages: int = 20) -> List[Rental]:
+    """Парсит reality.bazos.sk (адаптер BazosAdapter)."""
+    return ADAPTERS['bazos.sk'].scrape(max_pages)
 
-def is_realtor(text: str) -> bool:
-    if not text:
-        return False
-    t = text.lower()
-    return any(k.lower() in t for k in REALTOR_KEYWORDS)
 
-
-def extract_price(text: str) -> int:
-    if not text:
-        return 0
-    text = re.sub(r'\s+', '', text)
-    m = re.search(r'(\d+)', text)
-    if m:
-        p = int(m.group(1))
-        return p if 100 <= p <= 50000 else 0
-    return 0
-
-
-def extract_rooms(text: str) -> str:
-    if not text:
-        return "neuvedené"
-    t = text.lower()
-    if 'garsón' in t or 'garson' in t:
-        return "garsónka"
-    m = re.search(r'(\d)[,.]?5?\s*-?\s*izb', t)
-    return f"{m.group(1)}-izbový" if m else "neuvedené"
-
-
-def extract_size(text: str) -> str:
-    m = re.search(r'(\d+)\s*m[²2]', text or '')
-    return m.group(1) if m else "neuvedené"
-
-
-def extract_district(text: str) -> str:
-    if not text:
-        return "Slovensko"
-    t = text.lower()
-    districts = {
-        'bratislava': 'Bratislava', 'košice': 'Košice', 'kosice': 'Košice',
-        'žilina': 'Žilina', 'prešov': 'Prešov', 'nitra': 'Nitra',
-        'trnava': 'Trnava', 'trenčín': 'Trenčín', 'martin': 'Martin',
-        'poprad': 'Poprad', 'zvolen': 'Zvolen', 'petržalka': 'Petržalka',
-        'ružinov': 'Ružinov', 'michalovce': 'Michalovce',
-    }
-    for k, v in districts.items():
-        if k in t:
-            return v
-    return "Slovensko"
-
-
-def scrape_bazos(max_pages: int = 20) -> List[Dict]:
-    all_rentals = []
-    seen = set()
-    session = requests.Session()
-    session.headers.update(HEADERS)
-    
-    # ПРАВИЛЬНЫЙ URL: /prenajmu/byt/ (не /prenajom/byt/)
-    base_url = "https://reality.bazos.sk/prenajmu/byt/"
+async def scrape_all_sources() -> Tuple[List[Rental], List[str]]:
+    """
+    Запускает все включённые адаптеры параллельно (каждый в своём потоке).
+    Ошибка одного источника не мешает остальным.
+    Возвращает (объявления, имена успешно отработавших источников).
+    """
+    adapters = get_enabled_adapters()
+    results = await asyncio.gather(
+        *(asyncio.to_thread(adapter.scrape) for adapter in adapters),
+        return_exceptions=True
+    )
     
-    logger.info(f"Starting scraper, base URL: {base_url}")
+    rentals = []
+    succeeded = []
+    for adapter, result in zip(adapters, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ Source {adapter.name} failed: {result}")
+            continue
+        rentals.extend(result)
+        if result:
+            succeeded.append(adapter.name)
     
-    for page in range(max_pages):
-        # Пагинация: /prenajmu/byt/, /prenajmu/byt/20/, /prenajmu/byt/40/
-        url = base_url if page == 0 else f"{base_url}{page * 20}/"
-        
-        logger.info(f"Page {page + 1}: {url}")
-        
-        try:
-            resp = session.get(url, timeout=15)
-            resp.encoding = 'utf-8'
-            
-            if resp.status_code != 200:
-                logger.error(f"HTTP {resp.status_code}, stopping")
-                break
-            
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            listings = soup.find_all('div', class_='inzeraty')
-            
-            if not listings:
-                logger.info("No listings found, stopping")
-                break
-            
-            count = 0
-            for listing in listings:
-                h2 = listing.find('h2', class_='nadpis')
-                if not h2:
-                    continue
-                
-                link = h2.find('a')
-                if not link:
-                    continue
-                
-                href = link.get('href', '')
-                title = link.get_text(strip=True)
-                
-                if not href or not title:
-                    continue
-                
-                full_url = urljoin(BASE_URL, href)
-                if full_url in seen:
-                    continue
-                
-                # Цена
-                price = 0
-                price_div = listing.find('div', class_='inzeratycena')
-                if price_div:
-                    price = extract_price(price_div.get_text())
-                
-                # Описание
-                desc = ""
-                popis = listing.find('div', class_='popis')
-                if popis:
-                    desc = popis.get_text(strip=True)
-                
-                # Локация
-                loc = ""
-                lok_div = listing.find('div', class_='inzeratylok')
-                if lok_div:
-                    loc = lok_div.get_text(strip=True).replace('\n', ', ')
-                
-                full_text = f"{title} {desc} {loc}"
-                
-                # Фильтр риелторов
-                if is_realtor(full_text):
-                    continue
-                
-                # Изображение
-                img_url = None
-                img = listing.find('img', class_='obrazek')
-                if img:
-                    img_url = img.get('src')
-                
-                rental = {
-                    'name': title,
-                    'price': price,
-                    'district': extract_district(full_text),
-                    'address': loc or "Slovensko",
-                    'rooms': extract_rooms(full_text),
-                    'size': extract_size(full_text),
-                    'description': desc[:800] if desc else title,
-                    'url': full_url,
-                    'source': 'bazos.sk',
-                    'available_from': 'Ihneď',
-                    'image_url': img_url,
-                }
-                
-                seen.add(full_url)
-                all_rentals.append(rental)
-                count += 1
-            
-            logger.info(f"  -> Added {count}, total: {len(all_rentals)}")
-            
-            if count == 0:
-                logger.info("No new listings, stopping")
-                break
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            logger.error(f"Error: {e}")
-            break
+    return rentals, succeeded
+
+
+def consume_market_stats(batch_size: int = 1000) -> int:
+    """
+    Применяет новые события ленты к market_stats. Позиция подтверждается
+    после обновления пачки: при сбое пачка придёт ещё раз, и повторный
+    пересчёт тех же групп даст тот же результат. Возвращает число событий.
+    """
+    if MARKET_STATS_CONSUMER not in get_change_positions():
+        # Новый потребитель: старые события могли быть уже удалены -
+        # сначала полный пересчёт, дальше только дельты
+        head = get_change_head()
+        refresh_market_stats()
+        ack_changes(MARKET_STATS_CONSUMER, head)
+        return 0
     
-    logger.info(f"DONE: {len(all_rentals)} rentals")
-    return all_rentals
+    processed = 0
+    while True:
+        changes = read_changes(MARKET_STATS_CONSUMER, batch_size)
+        if not changes:
+            return processed
+        update_market_stats(changes)
+        ack_changes(MARKET_STATS_CONSUMER, changes[-1].seq)
+        processed += len(changes)
 
 
-def get_rentals(force_refresh: bool = False) -> List[Dict]:
+def refresh_derived_data() -> List[str]:
+    """
+    Обновляет market_stats по событиям и пересобирает этапы DERIVED_DATA,
+    у которых есть новые события. Возвращает имена обновлённых этапов.
+    """
+    refreshed = [MARKET_STATS_CONSUMER] if consume_market_stats() else []
+    for consumer, rebuild in DERIVED_DATA.items():
+        if not read_changes(consumer, limit=1):
+            continue
+        # Позиция снимается до пересчёта: события, записанные во время него,
+        # достанутся следующему прогону
+        head = get_change_head()
+        rebuild()
+        ack_changes(consumer, head)
+        refreshed.append(consumer)
+    compact_changes()
+    return refreshed
+
+
+def get_rentals(force_refresh: bool = False) -> List[RentalSummary]:
     """Получает объявления из БД (парсинг происходит по расписанию из бота)."""
     return get_all_rentals()
 
 
-def search_rentals(search_type: str, value) -> List[Dict]:
+def search_rentals(search_type: str, value) -> List[RentalSummary]:
     """Поиск в БД вместо прямого парсинга."""
     return search_rentals_db(search_type, value)
 
 
-def search_rentals_combined(filters: Dict) -> List[Dict]:
+def search_rentals_combined(filters: Dict) -> List[RentalSummary]:
     """Поиск с несколькими фильтрами одновременно."""
     return search_rentals_advanced(filters)
 
 
-def get_rental_details(index: int) -> Optional[Dict]:
-    """Получает деталь объявления из БД."""
-    rentals = get_all_rentals()
-    return rentals[index] if 0 <= index < len(rentals) else None
+def get_rental_details(rental_id: int) -> Optional[Rental]:
+    """Получает полное объявление из БД по id."""
+    return get_rental_by_id(rental_id)
 
 
 def get_districts() -> List[str]:
@@ -226,17 +129,23 @@ async def background_parse_rentals():
     """
     logger.info("🔄 Starting scheduled parse...")
     try:
-        rentals = scrape_bazos(max_pages=15)
+        rentals, sources = await scrape_all_sources()
+        # Запись в БД - в потоке, чтобы не блокировать обработку обновлений
         if rentals:
-            save_rentals(rentals)
-            log_parse(len(rentals), "success")
+            await asyncio.to_thread(save_rentals, rentals, sources=sources)
+            await asyncio.to_thread(expire_rentals)
+            await asyncio.to_thread(refresh_derived_data)
+            # Бот переключается на новые данные только здесь, целым поколением
+            await asyncio.to_thread(publish_snapshot)
+            await asyncio.to_thread(log_parse, len(rentals), "success")
             logger.info(f"✅ Successfully parsed and saved {len(rentals)} rentals")
+            await prefetch_images((r.image_url for r in rentals), headers=HEADERS)
         else:
-            log_parse(0, "no_new_rentals")
+            await asyncio.to_thread(log_parse, 0, "no_new_rentals")
             logger.warning("⚠️ No rentals found during parse")
     except Exception as e:
         logger.error(f"❌ Error during scheduled parse: {e}")
-        log_parse(0, "error")
+        await asyncio.to_thread(log_parse, 0, "error")
 
 
 if __name__ == "__main__":
@@ -251,9 +160,9 @@ if __name__ == "__main__":
     if rentals:
         print("\nSaving to database...")
         save_rentals(rentals)
+        refresh_market_stats()
         log_parse(len(rentals), "test")
         
-        from database import get_all_rentals, get_price_range_db, get_districts_db
         all_rentals = get_all_rentals()
         print(f"\nTotal in DB: {len(all_rentals)} rentals")
         print(f"Price: €{get_price_range_db()[0]} - €{get_price_range_db()[1]}")
@@ -262,4 +171,4 @@ if __name__ == "__main__":
         for i, r in enumerate(all_rentals[:5], 1):
             print(f"\n{i}. {r['name'][:55]}...")
             print(f"   €{r['price']} | {r['rooms']} | {r['district']}")
-            print(f"   {r['url']}")
+            print(f"   id={r['id']}")
@@ -0,0 +1,160 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fuzzy import normalize
+from geo import distance_km
+
+# Сколько соседей хранится для каждого объявления
+TOP_K = 5
+
+# Вклад признаков в итоговую оценку (сумма = 1)
+TEXT_WEIGHT = 0.45
+PRICE_WEIGHT = 0.2
+PLACE_WEIGHT = 0.2
+SIZE_WEIGHT = 0.1
+ROOMS_WEIGHT = 0.05
+
+# Слова, которые есть больше чем в этой доле объявлений ("byt", "prenajom"),
+# не различают объявления - они не попадают в вектора и в кандидаты
+MAX_DOCUMENT_FREQUENCY = 0.5
+MIN_TOKEN_LENGTH = 3
+
+# Полная оценка считается только для короткого списка кандидатов:
+# лучшие по тексту + ближайшие по цене в том же районе. Кандидаты по
+# тексту ищутся по QUERY_TERMS самым весомым (редким) словам объявления.
+QUERY_TERMS = 15
+TEXT_CANDIDATES = 40
+DISTRICT_CANDIDATES = 20
+
+# Цены отличаются вдвое / площадь в полтора раза - сходство по признаку 0
+PRICE_RATIO_LIMIT = math.log(2)
+SIZE_RATIO_LIMIT = math.log(1.5)
+# Дальше этого расстояния место уже не считается "рядом"
+PLACE_RADIUS_KM = 10.0
+
+_TOKEN_RE = re.compile(r'[a-z]+')
+_NUMBER_RE = re.compile(r'\d+')
+
+
+class Listing(NamedTuple):
+    """Признаки объявления для индекса похожих."""
+    id: int
+    text: str
+    district: str
+    price: int
+    size: str
+    rooms: str
+    coords: Optional[Tuple[float, float]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова без диакритики длиной от MIN_TOKEN_LENGTH."""
+    return [t for t in _TOKEN_RE.findall(normalize(text)) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def tfidf_vectors(texts: List[str]) -> List[Dict[str, float]]:
+    """
+    Разреженные TF-IDF вектора (слово -> вес), нормированные по L2.
+
+    tf сублинейный (1 + log), idf сглаженный, как в sklearn; слишком
+    частые слова отбрасываются (MAX_DOCUMENT_FREQUENCY).
+    """
+    counts = [Counter(tokenize(text)) for text in texts]
+    document_frequency = Counter(term for count in counts for term in count)
+    n = len(texts)
+    max_df = max(MAX_DOCUMENT_FREQUENCY * n, 1)
+    idf = {
+        term: math.log((1 + n) / (1 + df)) + 1
+        for term, df in document_frequency.items() if df <= max_df
+    }
+
+    vectors = []
+    for count in counts:
+        vector = {term: (1 + math.log(tf)) * idf[term] for term, tf in count.items() if term in idf}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        vectors.append({term: w / norm for term, w in vector.items()} if norm else {})
+    return vectors
+
+
+def _ratio_similarity(a: Optional[float], b: Optional[float], limit: float) -> float:
+    # 1 - одинаковые, 0 - отношение больше exp(limit); 0.5 - значение неизвестно
+    if not a or not b:
+        return 0.5
+    return max(0.0, 1 - abs(math.log(a / b)) / limit)
+
+
+def _size(size: str) -> Optional[int]:
+    match = _NUMBER_RE.search(size or '')
+    return int(match.group()) if match else None
+
+
+def _place_similarity(a: Listing, b: Listing) -> float:
+    if a.coords and b.coords:
+        return max(0.0, 1 - distance_km(*a.coords, *b.coords) / PLACE_RADIUS_KM)
+    if not a.district or a.district == 'Slovensko':
+        return 0.0
+    return 1.0 if a.district == b.district else 0.0
+
+
+def build_neighbors(listings: List[Listing], k: int = TOP_K) -> List[Tuple[int, int, int, float]]:
+    """
+    Top-k похожих для каждого объявления: [(rental_id, rank, neighbor_id, score)].
+
+    Кандидаты по тексту - через инвертированный индекс по самым весомым
+    словам объявления, без перебора всех пар. Для короткого списка
+    (TEXT_CANDIDATES лучших по тексту и DISTRICT_CANDIDATES ближайших по
+    цене из того же района) считается точный косинус TF-IDF и к нему
+    добавляется сходство цены, площади, места и числа комнат.
+    """
+    vectors = tfidf_vectors([listing.text for listing in listings])
+    sizes = [_size(listing.size) for listing in listings]
+
+    postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    for i, vector in enumerate(vectors):
+        for term, weight in vector.items():
+            postings[term].append((i, weight))
+    # Район -> (цены по возрастанию, индексы объявлений)
+    by_district: Dict[str, Tuple[List[int], List[int]]] = {}
+    for i in sorted(range(len(listings)), key=lambda i: listings[i].price):
+        district = listings[i].district
+        if district and district != 'Slovensko':
+            prices, indexes = by_district.setdefault(district, ([], []))
+            prices.append(listings[i].price)
+            indexes.append(i)
+
+    rows = []
+    for i, listing in enumerate(listings):
+        vector = vectors[i]
+        partial: Dict[int, float] = defaultdict(float)
+        for term in heapq.nlargest(QUERY_TERMS, vector, key=vector.get):
+            for j, other_weight in postings[term]:
+                partial[j] += vector[term] * other_weight
+        candidates = set(heapq.nlargest(TEXT_CANDIDATES + 1, partial, key=partial.get))
+        if listing.district in by_district:
+            prices, indexes = by_district[listing.district]
+            position = bisect_left(prices, listing.price)
+            half = DISTRICT_CANDIDATES // 2
+            candidates.update(indexes[max(position - half, 0):position + half + 1])
+        candidates.discard(i)
+
+        scored = []
+        for j in candidates:
+            other = listings[j]
+            # Косинус = скалярное произведение нормированных векторов
+            cosine = sum(weight * vectors[j].get(term, 0.0) for term, weight in vector.items())
+            score = (
+                TEXT_WEIGHT * cosine
+                + PRICE_WEIGHT * _ratio_similarity(listing.price, other.price, PRICE_RATIO_LIMIT)
+                + PLACE_WEIGHT * _place_similarity(listing, other)
+                + SIZE_WEIGHT * _ratio_similarity(sizes[i], sizes[j], SIZE_RATIO_LIMIT)
+                + ROOMS_WEIGHT * (listing.rooms == other.rooms and listing.rooms != 'neuvedené')
+            )
+            scored.append((score, -other.id))
+
+        for rank, (score, neg_id) in enumerate(heapq.nlargest(k, scored), 1):
+            rows.append((listing.id, rank, -neg_id, round(score, 4)))
+    return rows
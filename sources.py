@@ -0,0 +1,344 @@
+import logging
+import os
+import re
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import astuple
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from models import Rental
+
+# requests, bs4 и пул процессов импортируются при первом парсинге: бот
+# импортирует этот модуль при старте, а парсер запускается позже
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# Количество процессов для разбора HTML (0 - разбирать в текущем процессе)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '0'))
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'}
+
+REALTOR_KEYWORDS = [
+    'real', 's.r.o', 'r.k.', 'remax', 'century', 'broker',
+    'sprostredkov', 'maklér', 'makler', 'agency', 'agentúr',
+    'herrys', 'lexxus', 'expat', 'bonreality', 'provízi',
+    'v zastúpení', 'vo výhradnom', 'exkluzívne', 'impulz real',
+    'adomis', 'foryou', 'ponúkame vám', 'legend.sk', 'zara reality'
+]
+
+
+def is_realtor(text: str) -> bool:
+    if not text:
+        return False
+    t = text.lower()
+    return any(k.lower() in t for k in REALTOR_KEYWORDS)
+
+
+def extract_price(text: str) -> int:
+    if not text:
+        return 0
+    text = re.sub(r'\s+', '', text)
+    m = re.search(r'(\d+)', text)
+    if m:
+        p = int(m.group(1))
+        return p if 100 <= p <= 50000 else 0
+    return 0
+
+
+def extract_rooms(text: str) -> str:
+    if not text:
+        return "neuvedené"
+    t = text.lower()
+    if 'garsón' in t or 'garson' in t:
+        return "garsónka"
+    m = re.search(r'(\d)[,.]?5?\s*-?\s*izb', t)
+    return f"{m.group(1)}-izbový" if m else "neuvedené"
+
+
+def extract_size(text: str) -> str:
+    m = re.search(r'(\d+)\s*m[²2]', text or '')
+    return m.group(1) if m else "neuvedené"
+
+
+def extract_district(text: str) -> str:
+    if not text:
+        return "Slovensko"
+    t = text.lower()
+    districts = {
+        'bratislava': 'Bratislava', 'košice': 'Košice', 'kosice': 'Košice',
+        'žilina': 'Žilina', 'prešov': 'Prešov', 'nitra': 'Nitra',
+        'trnava': 'Trnava', 'trenčín': 'Trenčín', 'martin': 'Martin',
+        'poprad': 'Poprad', 'zvolen': 'Zvolen', 'petržalka': 'Petržalka',
+        'ružinov': 'Ružinov', 'michalovce': 'Michalovce',
+    }
+    for k, v in districts.items():
+        if k in t:
+            return v
+    return "Slovensko"
+
+
+class SourceAdapter(ABC):
+    """
+    Адаптер одного сайта с объявлениями.
+
+    Подкласс описывает три шага:
+    fetch_plan()     - какие страницы скачивать и в каком порядке,
+    parse_listings() - сырые поля объявлений из HTML одной страницы,
+    normalize()      - сырые поля -> Rental (или None, если объявление отсеяно).
+    Общий цикл скачивания, дедупликации и паузы между запросами - в scrape().
+    Адаптер без любого из трёх шагов не создаётся (TypeError при создании).
+    """
+    name = ''
+    enabled = True
+    max_pages = 15
+    # Пауза между запросами к одному сайту (лимит запросов на источник)
+    request_delay = 1.0
+    timeout = 15
+
+    @abstractmethod
+    def fetch_plan(self, max_pages: int) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def parse_listings(self, html: str) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def normalize(self, raw: Dict) -> Optional[Rental]:
+        ...
+
+    def parse_page(self, html: str) -> List[Rental]:
+        """HTML одной страницы -> отфильтрованные объявления."""
+        rentals = []
+        for raw in self.parse_listings(html):
+            rental = self.normalize(raw)
+            if rental:
+                rentals.append(rental)
+        return rentals
+
+    def submit_content(self, content: bytes) -> 'Future':
+        """
+        Отдаёт сырые байты страницы на разбор и сразу возвращает Future:
+        в пуле процессов, если он включён (PARSE_WORKERS > 0), иначе
+        страница разбирается в текущем потоке и Future уже готов.
+        """
+        from concurrent.futures import Future
+
+        executor = get_parse_executor()
+        if executor is not None:
+            return executor.submit(_parse_worker, self.name, content)
+        future = Future()
+        try:
+            future.set_result([astuple(r) for r in self.parse_page(content.decode('utf-8', errors='replace'))])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _collect(self, pending: 'Deque[Tuple[int, Future]]', seen: set,
+                 rentals: List[Rental], wait: bool) -> bool:
+        """
+        Забирает разобранные страницы строго по порядку (только готовые
+        или, при wait, все). Дедупликация по URL. False - страница без
+        новых объявлений или с ошибкой: дальше скачивать не нужно.
+        """
+        while pending and (wait or pending[0][1].done()):
+            page, future = pending.popleft()
+            try:
+                page_rentals = [Rental(*row) for row in future.result()]
+            except Exception as e:
+                logger.error(f"[{self.name}] Page {page + 1} parse error: {e}")
+                return False
+
+            new_rentals = [r for r in page_rentals if r.url not in seen]
+            seen.update(r.url for r in new_rentals)
+            rentals.extend(new_rentals)
+            logger.info(f"[{self.name}]   -> Page {page + 1}: added {len(new_rentals)}, total: {len(rentals)}")
+
+            if not new_rentals:
+                logger.info(f"[{self.name}] No new listings, stopping")
+                return False
+        return True
+
+    def scrape(self, max_pages: Optional[int] = None) -> List[Rental]:
+        """
+        Скачивает и разбирает страницы по fetch_plan(). Скачивание не ждёт
+        разбора: пока идёт пауза и запрос следующей страницы, предыдущие
+        разбираются в пуле процессов параллельно.
+        """
+        import requests
+
+        all_rentals = []
+        seen = set()
+        pending = deque()
+        session = requests.Session()
+        session.headers.update(HEADERS)
+
+        for page, url in enumerate(self.fetch_plan(max_pages or self.max_pages)):
+            if not self._collect(pending, seen, all_rentals, wait=False):
+                break
+            if page:
+                time.sleep(self.request_delay)
+
+            logger.info(f"[{self.name}] Page {page + 1}: {url}")
+
+            try:
+                resp = session.get(url, timeout=self.timeout)
+            except Exception as e:
+                logger.error(f"[{self.name}] Error: {e}")
+                break
+
+            if resp.status_code != 200:
+                logger.error(f"[{self.name}] HTTP {resp.status_code}, stopping")
+                break
+
+            pending.append((page, self.submit_content(resp.content)))
+
+        self._collect(pending, seen, all_rentals, wait=True)
+        # Страницы после остановки уже не нужны
+        for _, future in pending:
+            future.cancel()
+        session.close()
+        logger.info(f"[{self.name}] DONE: {len(all_rentals)} rentals")
+        return all_rentals
+
+
+class BazosAdapter(SourceAdapter):
+    """reality.bazos.sk - prenájom bytov."""
+    name = 'bazos.sk'
+    base_url = "https://reality.bazos.sk"
+    # ПРАВИЛЬНЫЙ URL: /prenajmu/byt/ (не /prenajom/byt/)
+    list_url = "https://reality.bazos.sk/prenajmu/byt/"
+
+    def fetch_plan(self, max_pages: int) -> Iterator[str]:
+        # Пагинация: /prenajmu/byt/, /prenajmu/byt/20/, /prenajmu/byt/40/
+        for page in range(max_pages):
+            yield self.list_url if page == 0 else f"{self.list_url}{page * 20}/"
+
+    def parse_listings(self, html: str) -> List[Dict]:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, 'html.parser')
+        raw_listings = []
+
+        for listing in soup.find_all('div', class_='inzeraty'):
+            h2 = listing.find('h2', class_='nadpis')
+            link = h2.find('a') if h2 else None
+            if not link:
+                continue
+
+            price_div = listing.find('div', class_='inzeratycena')
+            popis = listing.find('div', class_='popis')
+            lok_div = listing.find('div', class_='inzeratylok')
+            img = listing.find('img', class_='obrazek')
+
+            raw_listings.append({
+                'title': link.get_text(strip=True),
+                'href': link.get('href', ''),
+                'price': price_div.get_text() if price_div else '',
+                'description': popis.get_text(strip=True) if popis else '',
+                'location': lok_div.get_text(strip=True).replace('\n', ', ') if lok_div else '',
+                'image_url': img.get('src') if img else None,
+            })
+
+        return raw_listings
+
+    def normalize(self, raw: Dict) -> Optional[Rental]:
+        title, desc, loc = raw['title'], raw['description'], raw['location']
+        if not raw['href'] or not title:
+            return None
+
+        full_text = f"{title} {desc} {loc}"
+
+        # Фильтр риелторов
+        if is_realtor(full_text):
+            return None
+
+        return Rental(
+            name=title,
+            price=extract_price(raw['price']),
+            district=extract_district(full_text),
+            address=loc or "Slovensko",
+            rooms=extract_rooms(full_text),
+            size=extract_size(full_text),
+            description=desc[:800] if desc else title,
+            url=urljoin(self.base_url, raw['href']),
+            source=self.name,
+            available_from='Ihneď',
+            image_url=raw['image_url'],
+        )
+
+
+# Зарегистрированные источники: имя -> адаптер
+ADAPTERS: Dict[str, SourceAdapter] = {
+    adapter.name: adapter for adapter in (BazosAdapter(),)
+}
+
+
+def get_enabled_adapters() -> List[SourceAdapter]:
+    return [adapter for adapter in ADAPTERS.values() if adapter.enabled]
+
+
+_parse_executor: Optional['ProcessPoolExecutor'] = None
+
+
+def _warm_up_worker() -> None:
+    """Инициализация процесса пула: импорт и прогрев парсера один раз."""
+    from bs4 import BeautifulSoup
+
+    BeautifulSoup('<div class="inzeraty"><h2 class="nadpis"></h2></div>', 'html.parser')
+
+
+def _parse_worker(source: str, content: bytes) -> List[Tuple]:
+    """Разбор страницы в процессе пула. Возвращает компактные кортежи полей Rental."""
+    rentals = ADAPTERS[source].parse_page(content.decode('utf-8', errors='replace'))
+    return [astuple(rental) for rental in rentals]
+
+
+def get_parse_executor(workers: Optional[int] = None) -> Optional['ProcessPoolExecutor']:
+    """
+    Пул процессов для разбора HTML. Создаётся один раз при первом
+    использовании и переиспользуется между прогонами парсера.
+    """
+    global _parse_executor
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers <= 0:
+        return None
+    if _parse_executor is None:
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        _parse_executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context('spawn'),
+            initializer=_warm_up_worker,
+        )
+        logger.info(f"🧵 Parse pool started: {workers} workers")
+    return _parse_executor
+
+
+def shutdown_parse_executor() -> None:
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(cancel_futures=True)
+        _parse_executor = None
+
+
+if __name__ == "__main__":
+    # Офлайн-проверка адаптера на сохранённой странице:
+    #   python sources.py bazos.sk bazos_page.html
+    source, path = sys.argv[1], sys.argv[2]
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+
+    adapter = ADAPTERS[source]
+    raw_listings = adapter.parse_listings(html)
+    rentals = adapter.parse_page(html)
+    print(f"{path}: {len(raw_listings)} listings, {len(rentals)} after realtor filter")
+    for r in rentals:
+        print(f"  €{r.price:<6} | {r.rooms:<10} | {r.district:<10} | {r.name[:50]}")
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import bot
+import database
+
+
+class FakeMessage:
+    def __init__(self, text: str = ''):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(user_id: int, text: str = '') -> SimpleNamespace:
+    message = FakeMessage(text)
+    return SimpleNamespace(message=message, effective_message=message,
+                           effective_user=SimpleNamespace(id=user_id), callback_query=None)
+
+
+def test_fresh_data_refusal_is_free(monkeypatch):
+    monkeypatch.setattr(bot, 'USER_BUCKET', bot.TokenBucket(rate=0.001, capacity=bot.REFRESH_COST))
+    monkeypatch.setattr(bot, 'get_last_parse_time', lambda: datetime.fromisoformat(database.utc_now()))
+    for _ in range(3):
+        update = fake_update(1)
+        asyncio.run(bot.refresh(update, SimpleNamespace(user_data={})))
+        assert 'aktualizované pred' in update.message.replies[0]
+    assert bot.USER_BUCKET.take(1, bot.REFRESH_COST) == 0
+
+
+def test_identical_advanced_searches_run_once(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def search(filters):
+        with lock:
+            calls.append(filters)
+        time.sleep(0.2)
+        return []
+
+    monkeypatch.setattr(bot, 'search_rentals_combined', search)
+    monkeypatch.setattr(bot, 'suggest_terms', lambda *args: [])
+
+    async def run():
+        updates = [fake_update(user_id, 'balkón') for user_id in (1, 2)]
+        contexts = [SimpleNamespace(user_data={'advanced_step': 3, 'search_filters': {'max_price': 800}})
+                    for _ in updates]
+        await asyncio.gather(*(bot.advanced_search_handler(u, c) for u, c in zip(updates, contexts)))
+
+    asyncio.run(run())
+    assert calls == [{'max_price': 800, 'keyword': 'balkón'}]
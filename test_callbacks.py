@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from callbacks import DISTRICT, MAX_CALLBACK_BYTES, PAGE, RENTAL, CallbackRouter, decode, encode
+from persistence import PERSISTED_USER_KEYS
+
+
+class FakeMessage:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeQuery:
+    def __init__(self, data: str, message_id: int = 1):
+        self.data = data
+        self.message = FakeMessage(message_id)
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text=None, **kwargs):
+        self.edits.append(text)
+
+
+def press(data: str, user_data: dict, message_id: int = 1) -> FakeQuery:
+    query = FakeQuery(data, message_id)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=1), message=None)
+    asyncio.run(bot.button_callback(update, SimpleNamespace(user_data=user_data)))
+    return query
+
+
+def test_round_trip():
+    data = encode(RENTAL, 25675, 48)
+    assert data == '1r.jt7.1c'
+    assert decode(data) == (RENTAL, (25675, 48))
+    assert decode(encode(PAGE, 0, 0)) == (PAGE, (0, 0))
+    assert len(encode(RENTAL, 2 ** 63, 2 ** 63).encode()) <= MAX_CALLBACK_BYTES
+
+
+@pytest.mark.parametrize('data', [None, '', 'rental_5', 'page_2', '2r.1.1', '1r1', '1r.zz!'])
+def test_foreign_data_is_rejected(data):
+    assert decode(data) is None
+
+
+def test_router_sends_unknown_and_malformed_to_stale():
+    seen = []
+
+    async def stale(update, context):
+        seen.append(update.callback_query.data)
+
+    router = CallbackRouter(stale)
+
+    @router.route(RENTAL, args=2)
+    async def rental(update, context, rental_id, generation):
+        seen.append((rental_id, generation))
+
+    for data in (encode(RENTAL, 5, 1), encode(RENTAL, 5), encode(PAGE, 1, 1), 'rental_5'):
+        asyncio.run(router.dispatch(SimpleNamespace(callback_query=SimpleNamespace(data=data)), None))
+    assert seen == [(5, 1), encode(RENTAL, 5), encode(PAGE, 1, 1), 'rental_5']
+
+
+def test_filter_choice_from_shown_list(db):
+    user_data = {'filter_choices': {'message_id': 7, 'district': ['Bratislava', 'Košice']}}
+    query = press(encode(DISTRICT, 1), user_data, message_id=7)
+    assert user_data['multi_filters'] == {'district': 'Košice'}
+    assert not query.message.replies
+
+
+@pytest.mark.parametrize('user_data, message_id', [
+    ({}, 7),                                                               # список не сохранён
+    ({'filter_choices': {'message_id': 7, 'district': ['Bratislava']}}, 7),  # номер вне списка
+    ({'filter_choices': {'message_id': 8, 'district': ['Bratislava', 'Košice']}}, 7),  # старое сообщение
+])
+def test_stale_filter_choice_is_reported(user_data, message_id):
+    query = press(encode(DISTRICT, 1), user_data, message_id=message_id)
+    assert 'multi_filters' not in user_data
+    assert query.message.replies and 'staršej verzie' in query.message.replies[0]
+
+
+def test_filter_choices_survive_restart():
+    assert 'filter_choices' in PERSISTED_USER_KEYS
@@ -0,0 +1,84 @@
+import sqlite3
+from dataclasses import replace
+
+import database
+from models import Rental
+from rental_data import MARKET_STATS_CONSUMER, consume_market_stats
+
+
+def save_modified_run() -> None:
+    """Прогон парсера: у двух объявлений новая цена, одно новое, остальные пропали."""
+    ids = [row.id for row in database.get_all_rentals()[:5]]
+    rentals = [database.get_rental_by_id(rental_id) for rental_id in ids]
+    rentals[0] = replace(rentals[0], price=rentals[0].price + 111)
+    rentals[1] = replace(rentals[1], price=999, size='40')
+    rentals.append(Rental(
+        name='Nový 2-izbový byt', price=750, district='Nitra', address='Nitra', rooms='2-izbový',
+        size='55', description='Nový inzerát', url='https://reality.bazos.sk/inzerat/1/test.php',
+        source='bazos.sk', available_from='Ihneď', image_url=None,
+    ))
+    database.save_rentals(rentals, sources=['bazos.sk'])
+
+
+def market_stats(db) -> list:
+    conn = sqlite3.connect(db)
+    rows = conn.execute('SELECT * FROM market_stats ORDER BY scope, key').fetchall()
+    conn.close()
+    return [row[:-1] for row in rows]  # без computed_at
+
+
+def test_redelivery_until_ack(db):
+    save_modified_run()
+    first = database.read_changes('test', limit=3)
+    assert len(first) == 3
+    assert database.read_changes('test', limit=3) == first
+    database.ack_changes('test', first[1].seq)
+    assert database.read_changes('test', limit=1)[0] == first[2]
+
+
+def test_position_only_moves_forward(db):
+    save_modified_run()
+    head = database.get_change_head()
+    database.ack_changes('test', head)
+    database.ack_changes('test', 1)
+    assert database.get_change_positions()['test'] == head
+    assert database.read_changes('test') == []
+
+
+def test_compaction_respects_slowest_consumer(db):
+    save_modified_run()
+    changes = database.read_changes('slow')
+    head = database.get_change_head()
+    database.ack_changes('fast', head)
+    database.ack_changes('slow', changes[2].seq)
+
+    assert database.compact_changes() == 3
+    assert database.read_changes('slow') == changes[3:]
+    assert database.read_changes('fast') == []
+
+    database.ack_changes('slow', head)
+    assert database.compact_changes() == len(changes) - 3
+    assert database.compact_changes() == 0
+
+
+def test_market_stats_from_changes_match_full_rebuild(db):
+    consume_market_stats()  # новый потребитель: полный пересчёт
+    save_modified_run()
+    database.expire_rentals(max_missed_runs=1)
+
+    assert consume_market_stats() > 0
+    incremental = market_stats(db)
+    assert consume_market_stats() == 0
+
+    database.refresh_market_stats()
+    assert incremental == market_stats(db)
+
+
+def test_market_stats_redelivery_is_idempotent(db):
+    consume_market_stats()
+    save_modified_run()
+    changes = database.read_changes(MARKET_STATS_CONSUMER)
+    database.update_market_stats(changes)
+    once = market_stats(db)
+    database.update_market_stats(changes)
+    assert market_stats(db) == once
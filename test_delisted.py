@@ -0,0 +1,43 @@
+import database
+import rental_data
+from facets import FacetIndex
+
+
+def published_ids() -> dict:
+    """id из каждого пути чтения: список, снапшот, поиск, фасеты."""
+    facets = FacetIndex()
+    facets.load(database.get_facet_rows())
+    generation = database.get_snapshot_generation()
+    return {
+        'browse': {rental.id for rental in rental_data.get_rentals()},
+        'snapshot': {rental.id for rental in database.get_snapshot_rentals(generation)},
+        'advanced': {rental.id for rental in database.search_rentals_advanced({})},
+        'keyword': {rental.id for rental in database.search_rentals_db('keyword', 'byt')},
+        'facets': facets.count(),
+        'count': database.get_rental_count(),
+    }
+
+
+def test_delisted_rental_disappears_at_once(db):
+    facets = FacetIndex()
+    facets.load(database.get_facet_rows())
+    database.add_change_listener(facets.apply)
+    rentals = [database.get_rental_by_id(rental.id) for rental in database.get_all_rentals()]
+    before = published_ids()
+    assert before['facets'] == len(before['browse']) == len(rentals)
+
+    # Прогон парсера без трёх объявлений: один пропуск - уже не в выдаче
+    gone = {rental.id for rental in rentals[:3]}
+    database.save_rentals(rentals[3:], sources=['bazos.sk'])
+    database.publish_snapshot()
+    after = published_ids()
+    for path in ('browse', 'snapshot', 'advanced', 'keyword'):
+        assert not after[path] & gone, path
+        assert after[path] == before[path] - gone, path
+    assert after['facets'] == facets.count() == after['count'] == len(rentals) - 3
+
+    # Объявление вернулось - снова в выдаче и в фасетах
+    database.save_rentals(rentals, sources=['bazos.sk'])
+    database.publish_snapshot()
+    assert published_ids() == before
+    assert facets.count() == len(rentals)
@@ -0,0 +1,76 @@
+import itertools
+
+import database
+import facets
+from facets import FacetIndex, filter_args
+from mmap_snapshot import SnapshotFile, write_snapshot
+
+
+def facet_index() -> FacetIndex:
+    index = FacetIndex()
+    index.load(database.get_facet_rows())
+    return index
+
+
+def test_facet_counts_match_search(db):
+    index = facet_index()
+    districts = sorted(index.counts_by('district')) + ['Nitra', 'Pezinok', 'bratislava', 'Stare Mesto']
+    rooms = [None] + sorted(index.counts_by('rooms'))
+    prices = [{}, {'min_price': 500}, {'max_price': 700}, {'min_price': 400, 'max_price': 900}]
+    for district, room, price in itertools.product([None] + districts, rooms, prices):
+        filters = {**price}
+        if district:
+            filters['district'] = district
+        if room:
+            filters['rooms'] = room
+        assert index.count(**filter_args(filters)) == len(database.search_rentals_advanced(filters)), filters
+
+
+def test_district_matches_address(db):
+    # В копии БД есть объявление с районом Prešov и адресом "Nitra949 01"
+    assert facet_index().count(district='Nitra') == len(database.search_rentals_advanced({'district': 'Nitra'}))
+
+
+def test_deltas_keep_counts_in_sync(db):
+    index = facet_index()
+    database.add_change_listener(index.apply)
+    database.expire_rentals(max_missed_runs=0)
+    assert index.count() == len(database.search_rentals_advanced({})) == 0
+
+
+def test_snapshot_facets_match_search(db):
+    mapped = database.get_mapped_snapshot()
+    assert mapped is not None
+    index = FacetIndex()
+    index.load_cells(mapped.price_cells(), mapped.generation, mapped.rows_with_address)
+    for district in sorted(index.counts_by('district')) + ['Nitra', 'Pezinok']:
+        for filters in ({'district': district}, {'district': district, 'max_price': 700}):
+            assert index.count(**filter_args(filters)) == len(database.search_rentals_advanced(filters)), filters
+
+
+def test_count_cost_does_not_grow_with_addresses(monkeypatch, tmp_path):
+    folded = []
+    fold = facets._fold
+    monkeypatch.setattr(facets, '_fold', lambda text: folded.append(text) or fold(text))
+    for n in (10, 1000):
+        rows = [(f'Bratislava {i % 2}', '2-izbový', 400 + i, f'Ulica {i}') for i in range(n)]
+        write_snapshot(tmp_path / 'rentals.snapshot', n, [
+            (i, 'Byt', price, '50', rooms, district, address)
+            for i, (district, rooms, price, address) in enumerate(rows)
+        ])
+        mapped = SnapshotFile(tmp_path / 'rentals.snapshot')
+        assert len(list(mapped.cells())) == 2
+
+        in_memory, from_snapshot = FacetIndex(), FacetIndex()
+        in_memory.load(rows)
+        from_snapshot.load_cells(mapped.price_cells(), mapped.generation, mapped.rows_with_address)
+        for index in (in_memory, from_snapshot):
+            assert len(index._prices) == 2
+            expected = sum(1 for row in rows if row[3].startswith('Ulica 7') and row[2] <= 900)
+            # Первый запрос с этим фильтром собирает совпадения, следующие - из кэша
+            assert index.count(district='ulica 7', max_price=900) == expected
+            folded.clear()
+            assert index.count(district='ulica 7', max_price=900) == expected
+            assert index.counts_by('district', district='ulica 7')
+            index.count()
+            assert folded == ['ulica 7', 'ulica 7']
@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot
+import database
+
+
+def test_rentals_by_ids_keeps_order_and_skips_missing(db):
+    ids = [rental.id for rental in database.get_all_rentals()[:3]]
+    favorites = [ids[2], 999999, ids[0], ids[2]]
+    assert [rental.id for rental in database.get_rentals_by_ids(favorites)] == [ids[2], ids[0]]
+    assert database.get_rentals_by_ids([]) == []
+
+
+def test_favorites_prunes_deleted_rentals(db):
+    ids = [rental.id for rental in database.get_all_rentals()[:2]]
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append((text, kwargs['reply_markup']))
+
+    context = SimpleNamespace(user_data={'favorites': [ids[1], 999999, ids[0]]})
+    asyncio.run(bot.favorites(SimpleNamespace(message=SimpleNamespace(reply_text=reply_text)), context))
+    assert context.user_data['favorites'] == [ids[1], ids[0]]
+    text, markup = replies[0]
+    assert 'Máte 2 uložených' in text
+    assert len(markup.inline_keyboard) == 3  # два объявления и "Vymazať všetky"
@@ -0,0 +1,25 @@
+import sqlite3
+
+import database
+
+
+def test_paging_shows_every_new_rental_once(db):
+    # Один прогон парсера: у всех объявлений одинаковый first_seen
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE rentals SET first_seen = '2026-01-02 03:04:05'")
+    conn.commit()
+    conn.close()
+    since, after_id = '2026-01-01 00:00:00', 0
+    total = database.count_new_rentals(since, after_id)
+    assert total > 7
+
+    shown = []
+    while True:
+        rentals, watermark, more = database.get_new_rentals(since, after_id, limit=7)
+        shown += [rental.id for rental in rentals]
+        assert database.count_new_rentals(since, after_id) == len(rentals) + database.count_new_rentals(*watermark)
+        since, after_id = watermark
+        if not more:
+            break
+    assert len(shown) == len(set(shown)) == total
+    assert database.get_new_rentals(since, after_id) == ([], None, False)
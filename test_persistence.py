@@ -0,0 +1,41 @@
+import asyncio
+import json
+import threading
+
+from persistence import SQLitePersistence
+
+
+def test_concurrent_refreshes_wait_for_one_load(db, monkeypatch):
+    persistence = SQLitePersistence(flush_interval=0)
+    persistence._write({42: json.dumps({'favorites': [1, 2]})}, {})
+
+    loads = []
+    started = threading.Event()
+    release = threading.Event()
+    load_user = persistence._load_user
+
+    def slow_load(user_id):
+        loads.append(user_id)
+        started.set()
+        release.wait(5)
+        return load_user(user_id)
+
+    monkeypatch.setattr(persistence, '_load_user', slow_load)
+
+    async def run():
+        user_data = {}
+        first = asyncio.create_task(persistence.refresh_user_data(42, user_data))
+        await asyncio.to_thread(started.wait, 5)
+        # Второе обновление пришло, пока первое ещё читает строку
+        second = asyncio.create_task(persistence.refresh_user_data(42, user_data))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        release.set()
+        await asyncio.gather(first, second)
+        await persistence.update_user_data(42, user_data)
+        return user_data
+
+    user_data = asyncio.run(run())
+    assert loads == [42]
+    assert user_data == {'favorites': [1, 2]}
+    assert not persistence._dirty_users  # данные не изменились - перезаписи нет
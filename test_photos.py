@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import BadRequest
+
+import bot
+
+
+class FakeBot:
+    def __init__(self, editable: bool = True):
+        self.editable = editable
+        self.calls = []
+
+    async def edit_message_media(self, media, chat_id, message_id):
+        self.calls.append(('edit', message_id, media.media))
+        if not self.editable:
+            raise BadRequest('Message to edit not found')
+        return photo_message(message_id)
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls.append(('delete', message_id))
+
+
+class FakeMessage:
+    def __init__(self, fake_bot: FakeBot, message_id: int = 10):
+        self.bot = fake_bot
+        self.message_id = message_id
+        self.chat_id = 1
+
+    async def reply_photo(self, photo):
+        self.bot.calls.append(('send', photo))
+        return photo_message(100 + len(self.bot.calls))
+
+
+def photo_message(message_id: int) -> SimpleNamespace:
+    return SimpleNamespace(message_id=message_id, photo=[SimpleNamespace(file_id='file')])
+
+
+def show(context, query, rental_id: int) -> None:
+    rental = {'id': rental_id, 'image_url': f'https://example.com/{rental_id}.jpg'}
+    asyncio.run(bot.send_rental_photo(query, context, rental))
+
+
+def test_one_photo_message_per_card(monkeypatch):
+    monkeypatch.setattr(bot, 'get_cached_photo', lambda url: url and f'id-{url[-5]}')
+    fake_bot = FakeBot()
+    context = SimpleNamespace(bot=fake_bot, user_data={})
+    card = SimpleNamespace(message=FakeMessage(fake_bot))
+
+    show(context, card, 1)
+    show(context, card, 1)  # то же объявление ("Назад" из похожих) - фото уже стоит
+    show(context, card, 2)
+    assert fake_bot.calls == [('send', 'id-1'), ('edit', 101, 'id-2')]
+
+    asyncio.run(bot.delete_rental_photo(card, context))
+    assert fake_bot.calls[-1] == ('delete', 101)
+    assert context.user_data['rental_photo'] is None
+
+
+def test_photo_from_other_card_or_deleted_is_sent_again(monkeypatch):
+    monkeypatch.setattr(bot, 'get_cached_photo', lambda url: f'id-{url[-5]}')
+    fake_bot = FakeBot(editable=False)
+    context = SimpleNamespace(bot=fake_bot, user_data={})
+
+    show(context, SimpleNamespace(message=FakeMessage(fake_bot)), 1)
+    show(context, SimpleNamespace(message=FakeMessage(fake_bot, message_id=11)), 2)
+    assert [call[0] for call in fake_bot.calls] == ['send', 'send']
+
+    show(context, SimpleNamespace(message=FakeMessage(fake_bot, message_id=11)), 3)
+    assert [call[0] for call in fake_bot.calls] == ['send', 'send', 'edit', 'send']
+    assert context.user_data['rental_photo']['rental_id'] == 3
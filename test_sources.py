@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from sources import ADAPTERS, BazosAdapter, SourceAdapter, extract_price, extract_rooms, is_realtor
+
+FIXTURES = Path(__file__).parent
+
+
+@pytest.fixture(params=['bazos_page.html', 'debug_bazos.html'])
+def page(request) -> str:
+    return (FIXTURES / request.param).read_text(encoding='utf-8')
+
+
+def test_registered():
+    assert isinstance(ADAPTERS['bazos.sk'], BazosAdapter)
+
+
+def test_parse_counts(page):
+    adapter = ADAPTERS['bazos.sk']
+    assert len(adapter.parse_listings(page)) == 20
+    assert len(adapter.parse_page(page)) == 11
+
+
+def test_realtors_filtered(page):
+    adapter = ADAPTERS['bazos.sk']
+    raw = adapter.parse_listings(page)
+    realtor_urls = {r['href'] for r in raw if is_realtor(f"{r['title']} {r['description']} {r['location']}")}
+    assert len(realtor_urls) == 9
+    parsed_urls = {rental.url for rental in adapter.parse_page(page)}
+    assert not {adapter.base_url + href for href in realtor_urls} & parsed_urls
+    assert all(not is_realtor(f"{r.name} {r.description} {r.address}") for r in adapter.parse_page(page))
+
+
+def test_parsed_fields(page):
+    rentals = {rental.url: rental for rental in ADAPTERS['bazos.sk'].parse_page(page)}
+
+    flat = rentals['https://reality.bazos.sk/inzerat/186790310/15-izbovy-byt-na-prenajom.php']
+    assert (flat.price, flat.rooms, flat.district, flat.source) == (500, '1-izbový', 'Košice', 'bazos.sk')
+    assert flat.image_url.startswith('https://www.bazos.sk/img/')
+
+    flat = rentals['https://reality.bazos.sk/inzerat/186590593/2-izbovy-byt-51-m2-loggia-juzna-trpri-auparku.php']
+    assert (flat.price, flat.rooms, flat.district, flat.size) == (0, '2-izbový', 'Košice', '51')
+    assert flat.address.startswith('Košice')
+
+    assert all(url.startswith('https://reality.bazos.sk/inzerat/') for url in rentals)
+
+
+def test_extract_helpers():
+    assert extract_price('650 €') == 650
+    assert extract_price('1 200 €') == 1200
+    assert extract_price('85 000 €') == 0  # продажа, а не аренда
+    assert extract_price('Dohodou') == 0
+    assert extract_rooms('Prenájom 3 izbový byt') == '3-izbový'
+    assert extract_rooms('Garsónka Ružinov') == 'garsónka'
+
+
+def test_incomplete_adapter_fails_on_creation():
+    class HalfAdapter(SourceAdapter):
+        name = 'half'
+
+        def fetch_plan(self, max_pages):
+            yield 'https://example.com/'
+
+    with pytest.raises(TypeError, match='normalize'):
+        HalfAdapter()
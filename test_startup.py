@@ -0,0 +1,33 @@
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+# Стек парсера подгружается только при первом парсинге (sources.py)
+LAZY_MODULES = ('requests', 'bs4', 'lxml')
+
+LINE_RE = re.compile(r'import time:\s+\d+ \|\s+\d+ \| *(\S+)')
+
+
+def imported_at_startup(code: str) -> set:
+    """Модули верхнего уровня, импортированные code, по выводу -X importtime."""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    return {match.group(1).split('.')[0] for match in LINE_RE.finditer(stderr)}
+
+
+def test_bot_import_does_not_load_scraper_stack():
+    imported = imported_at_startup('import bot')
+    assert 'bot' in imported
+    assert not set(LAZY_MODULES) & imported
+
+
+def test_scraper_stack_loads_on_first_parse():
+    imported = imported_at_startup(
+        "import sources; sources.ADAPTERS['bazos.sk'].parse_page(open('bazos_page.html', encoding='utf-8').read())"
+    )
+    assert 'bs4' in imported
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _ordering_key(update: object) -> Optional[int]:
+    """Чат (или пользователь без чата), внутри которого важен порядок обновлений."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Разные чаты обрабатываются одновременно (не больше workers штук),
+    обновления одного чата - строго по очереди, поэтому состояния
+    ConversationHandler не перепутываются. Обновление, ждущее свой чат,
+    не занимает место обработчика: сначала берётся блокировка чата,
+    потом слот из workers. max_pending ограничивает общее число
+    принятых, но ещё не обработанных обновлений.
+    """
+
+    def __init__(self, workers: int, max_pending: int = 256):
+        super().__init__(max_concurrent_updates=max(workers, max_pending))
+        self.workers = workers
+        self._worker_slots = asyncio.Semaphore(workers)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _ordering_key(update)
+        if key is None:
+            async with self._worker_slots:
+                await coroutine
+            return
+
+        lock = self._chat_locks.setdefault(key, asyncio.Lock())
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock, self._worker_slots:
+                await coroutine
+        finally:
+            # Блокировки неактивных чатов не копятся в памяти
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass